@@ -21,7 +21,9 @@ def main():
     args = ap.parse_args()
 
     sc = yaml.safe_load(args.scenario.read_text(encoding="utf-8"))
-    action = MAP.get(sc["failure"]["type"], {"actionId": "aws:fis:cpu-stress"})
+    # multi-fault scenarios export their first fault
+    failure = sc.get("failure") or sc["failures"][0]
+    action = MAP.get(failure["type"], {"actionId": "aws:fis:cpu-stress"})
     tpl = {
         "description": f"RB {sc['id']}",
         "targets": {},
@@ -21,11 +21,13 @@ def main():
     args = ap.parse_args()
 
     sc = yaml.safe_load(args.scenario.read_text(encoding="utf-8"))
+    # multi-fault scenarios export their first fault
+    failure = sc.get("failure") or sc["failures"][0]
     spec = {
         "tool": "gremlin",
         "scenario_id": sc["id"],
-        "failure": sc["failure"],
-        "attack": MAP.get(sc["failure"]["type"], {"attackType": "cpu"})
+        "failure": failure,
+        "attack": MAP.get(failure["type"], {"attackType": "cpu"})
     }
     args.outdir.mkdir(parents=True, exist_ok=True)
     out = args.outdir / f"gremlin_{sc['id']}.json"
@@ -19,8 +19,10 @@ def main():
     args = ap.parse_args()
 
     sc = yaml.safe_load(args.scenario.read_text(encoding="utf-8"))
-    exp = MAP.get(sc["failure"]["type"], "pod-delete")
-    dur = int(sc["failure"]["duration_s"])
+    # multi-fault scenarios export their first fault
+    failure = sc.get("failure") or sc["failures"][0]
+    exp = MAP.get(failure["type"], "pod-delete")
+    dur = int(failure["duration_s"])
     name = f"rb-{sc['id']}"
     doc = {
         "apiVersion": "litmuschaos.io/v1alpha1",
@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 import argparse
+import sys
 from pathlib import Path
-import pandas as pd
-import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from detectors import CHUNK_ROWS, Cusum, detect_file  # noqa: E402
+from traceio import read_trace  # noqa: E402
+from telemetry import profiled  # noqa: E402
 
 
 def main():
@@ -16,32 +20,23 @@ def main():
                     help="Allowance parameter (in std dev units)")
     ap.add_argument("--threshold", "-t", type=float, default=5.0,
                     help="Decision threshold (in std dev units)")
+    ap.add_argument("--mu", type=float,
+                    help="In-control mean (default: mean of the whole input, read in an extra pass)")
+    ap.add_argument("--sigma", type=float,
+                    help="In-control std dev (default: std dev of the whole input)")
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS,
+                    help="Rows streamed through the detector at once")
+    ap.add_argument("--profile", type=Path, metavar="MANIFEST",
+                    help="Append this stage's time, memory and throughput to a JSON run manifest")
     args = ap.parse_args()
 
-    df = pd.read_csv(args.inp, parse_dates=["ts"])
-    v = df[args.metric].astype(float).to_numpy()
-    mu = np.mean(v)
-    sigma = np.std(v, ddof=0)
-    if sigma == 0:
-        sigma = 1.0
-
-    z = (v - mu) / sigma
-    n = len(z)
-    s_hi = np.zeros(n)
-    s_lo = np.zeros(n)
-    pred = np.zeros(n, dtype=int)
-
-    for i in range(1, n):
-        s_hi[i] = max(0, s_hi[i - 1] + z[i] - args.drift)
-        s_lo[i] = max(0, s_lo[i - 1] - z[i] - args.drift)
-        if s_hi[i] > args.threshold or s_lo[i] > args.threshold:
-            pred[i] = 1
-            s_hi[i] = 0
-            s_lo[i] = 0
-
-    out = df.assign(pred=pred)[["ts", "t_s", "pred"]]
-    args.out.parent.mkdir(parents=True, exist_ok=True)
-    out.to_csv(args.out, index=False)
+    with profiled(args.profile, "baseline:cusum") as stage:
+        if args.mu is None or args.sigma is None:
+            ref = Cusum.fit(read_trace(args.inp, [args.metric])[args.metric], args.drift, args.threshold)
+            args.mu = ref.mu if args.mu is None else args.mu
+            args.sigma = ref.sigma if args.sigma is None else args.sigma
+        det = Cusum(args.mu, args.sigma, args.drift, args.threshold)
+        stage.rows = detect_file(det, args.inp, args.out, args.metric, args.chunk_rows)
 
 
 if __name__ == "__main__":
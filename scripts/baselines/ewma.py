@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 import argparse
+import sys
 from pathlib import Path
-import pandas as pd
-import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from detectors import CHUNK_ROWS, Ewma, detect_file  # noqa: E402
+from telemetry import profiled  # noqa: E402
 
 
 def main():
@@ -14,17 +17,14 @@ def main():
     ap.add_argument("--metric", "-m", type=str, default="latency_ms")
     ap.add_argument("--span", type=int, default=30)
     ap.add_argument("--threshold", "-t", type=float, default=3.0)
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS,
+                    help="Rows streamed through the detector at once")
+    ap.add_argument("--profile", type=Path, metavar="MANIFEST",
+                    help="Append this stage's time, memory and throughput to a JSON run manifest")
     args = ap.parse_args()
 
-    df = pd.read_csv(args.inp, parse_dates=["ts"])
-    v = df[args.metric].astype(float)
-    ewma = v.ewm(span=args.span, adjust=False).mean()
-    residual = v - ewma
-    rolling_std = residual.rolling(args.span, min_periods=max(2, args.span // 4)).std(ddof=0).replace(0, np.nan)
-    pred = (residual.abs() > args.threshold * rolling_std).astype(int).fillna(0)
-    out = df.assign(pred=pred)[["ts", "t_s", "pred"]]
-    args.out.parent.mkdir(parents=True, exist_ok=True)
-    out.to_csv(args.out, index=False)
+    with profiled(args.profile, "baseline:ewma") as stage:
+        stage.rows = detect_file(Ewma(args.span, args.threshold), args.inp, args.out, args.metric, args.chunk_rows)
 
 
 if __name__ == "__main__":
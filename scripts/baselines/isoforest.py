@@ -1,26 +1,72 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 import argparse
+import sys
 from pathlib import Path
-import pandas as pd
-from sklearn.ensemble import IsolationForest
+import numpy as np
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from detectors import CHUNK_ROWS  # noqa: E402
+from iforest import FEATURES, fit_model, score_file, training_rows  # noqa: E402
+from telemetry import profiled  # noqa: E402
+
+
+def load_yaml(p: Path) -> dict:
+    return yaml.safe_load(p.read_text(encoding="utf-8"))
+
+
+def max_samples_arg(s: str):
+    if s == "auto":
+        return s
+    return float(s) if "." in s else int(s)
+
 
 def main():
-    ap = argparse.ArgumentParser()
+    ap = argparse.ArgumentParser(description="IsolationForest anomaly detector")
     ap.add_argument("--inp", "-i", type=Path, required=True)
     ap.add_argument("--out", "-o", type=Path, required=True)
-    ap.add_argument("--features", "-f", nargs="+", default=["latency_ms","error_rate_pct"])
+    ap.add_argument("--features", "-f", nargs="+", default=FEATURES)
     ap.add_argument("--contam", "-c", type=float, default=0.02)
     ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--fit", choices=["all", "warmup", "window"], default="all",
+                    help="Train on the whole trace (default), the scenario warmup, or --train-start/--train-end")
+    ap.add_argument("--scenario", "-s", type=Path, help="Scenario whose dataset.warmup_s bounds --fit warmup")
+    ap.add_argument("--train-start", type=float, default=0.0, help="First t_s of the --fit window training rows")
+    ap.add_argument("--train-end", type=float, help="End t_s (exclusive) of the --fit window training rows")
+    ap.add_argument("--n-estimators", type=int, default=100)
+    ap.add_argument("--max-samples", type=max_samples_arg, default="auto",
+                    help="Rows subsampled per tree: 'auto' (min(256, n)), a count, or a fraction")
+    ap.add_argument("--n-jobs", "-j", type=int, default=1, help="Processes for fitting and scoring (-1: all cores)")
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Rows scored per batch")
+    ap.add_argument("--no-cache", action="store_true", help="Always refit and do not store the model")
+    ap.add_argument("--profile", type=Path, metavar="MANIFEST",
+                    help="Append this stage's time, memory and throughput to a JSON run manifest")
     args = ap.parse_args()
 
-    df = pd.read_csv(args.inp, parse_dates=["ts"])
-    X = df[args.features].astype(float).fillna(method="ffill").fillna(method="bfill")
-    model = IsolationForest(contamination=args.contam, random_state=args.seed)
-    pred = (model.fit_predict(X) == -1).astype(int)
-    out = df.assign(pred=pred)[["ts", "t_s", "pred"]]
-    args.out.parent.mkdir(parents=True, exist_ok=True)
-    out.to_csv(args.out, index=False)
+    start, end = 0.0, np.inf
+    if args.fit == "warmup":
+        if not args.scenario:
+            ap.error("--fit warmup needs --scenario")
+        end = float(load_yaml(args.scenario)["dataset"].get("warmup_s", 0))
+    elif args.fit == "window":
+        if args.train_end is None:
+            ap.error("--fit window needs --train-end")
+        start, end = args.train_start, args.train_end
+    with profiled(args.profile, "baseline:isoforest") as stage:
+        X, first = training_rows(args.inp, args.features, start, end, args.chunk_rows)
+        if not len(X):
+            raise SystemExit(f"{args.inp}: no training rows with {start:g} <= t_s < {end:g}")
+
+        params = {"contamination": args.contam, "random_state": args.seed, "n_estimators": args.n_estimators,
+                  "max_samples": args.max_samples}
+        meta = {"scenario": f"isoforest {args.inp.name}"}
+        model, reused = fit_model(X, params, args.n_jobs, meta, not args.no_cache)
+        if reused:
+            print(f"Reused cached model {reused[:12]}")
+            stage.info["cached"] = True
+        stage.rows = score_file(model, args.inp, args.out, args.features, first, args.chunk_rows)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from detectors import CHUNK_ROWS, Mad, detect_file  # noqa: E402
+from telemetry import profiled  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Rolling median/MAD (robust z-score) anomaly detector")
+    ap.add_argument("--inp", "-i", type=Path, required=True)
+    ap.add_argument("--out", "-o", type=Path, required=True)
+    ap.add_argument("--metric", "-m", type=str, default="latency_ms")
+    ap.add_argument("--window", "-w", type=int, default=60)
+    ap.add_argument("--k", "-k", type=float, default=3.5,
+                    help="Alarm beyond this many robust std devs (1.4826 * MAD) from the rolling median")
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Rows streamed through the detector at once")
+    ap.add_argument("--profile", type=Path, metavar="MANIFEST",
+                    help="Append this stage's time, memory and throughput to a JSON run manifest")
+    args = ap.parse_args()
+
+    with profiled(args.profile, "baseline:mad") as stage:
+        stage.rows = detect_file(Mad(args.window, args.k), args.inp, args.out, args.metric, args.chunk_rows)
+
+
+if __name__ == "__main__":
+    main()
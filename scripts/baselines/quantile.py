@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from detectors import CHUNK_ROWS, Quantile, detect_file  # noqa: E402
+from telemetry import profiled  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Rolling quantile threshold anomaly detector")
+    ap.add_argument("--inp", "-i", type=Path, required=True)
+    ap.add_argument("--out", "-o", type=Path, required=True)
+    ap.add_argument("--metric", "-m", type=str, default="latency_ms")
+    ap.add_argument("--window", "-w", type=int, default=300)
+    ap.add_argument("--q", "-q", type=float, default=0.99,
+                    help="Alarm above this quantile of the preceding window")
+    ap.add_argument("--lower-q", type=float,
+                    help="Also alarm below this quantile (e.g. 0.01 for throughput drops)")
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Rows streamed through the detector at once")
+    ap.add_argument("--profile", type=Path, metavar="MANIFEST",
+                    help="Append this stage's time, memory and throughput to a JSON run manifest")
+    args = ap.parse_args()
+
+    with profiled(args.profile, "baseline:quantile") as stage:
+        det = Quantile(args.window, args.q, args.lower_q)
+        stage.rows = detect_file(det, args.inp, args.out, args.metric, args.chunk_rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 import argparse
+import sys
 from pathlib import Path
 import yaml
-import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from detectors import CHUNK_ROWS, Threshold, detect_file, slo_threshold  # noqa: E402
+from telemetry import profiled  # noqa: E402
 
 def load_yaml(p: Path) -> dict:
     return yaml.safe_load(p.read_text(encoding="utf-8"))
@@ -15,21 +19,17 @@ def main():
     ap.add_argument("--metric", "-m", type=str, default="latency_ms")
     ap.add_argument("--threshold", "-t", type=float, default=-1.0)
     ap.add_argument("--scenario", "-s", type=Path)
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Rows streamed through the detector at once")
+    ap.add_argument("--profile", type=Path, metavar="MANIFEST",
+                    help="Append this stage's time, memory and throughput to a JSON run manifest")
     args = ap.parse_args()
 
     thr = args.threshold
-    if thr <= 0 and args.scenario:
-        sc = load_yaml(args.scenario)
-        slo = sc.get("evaluation", {}).get("slo", {})
-        key = f"{args.metric}_p99"
-        thr = float(slo.get(key, 0)) or float(slo.get(args.metric, 0)) or 250.0
-    elif thr <= 0:
-        thr = 250.0
+    if thr <= 0:
+        thr = slo_threshold(load_yaml(args.scenario) if args.scenario else None, args.metric)
 
-    df = pd.read_csv(args.inp, parse_dates=["ts"])
-    df["pred"] = (df[args.metric] > thr).astype(int)
-    args.out.parent.mkdir(parents=True, exist_ok=True)
-    df[["ts", "t_s", "pred"]].to_csv(args.out, index=False)
+    with profiled(args.profile, "baseline:threshold") as stage:
+        stage.rows = detect_file(Threshold(thr), args.inp, args.out, args.metric, args.chunk_rows)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
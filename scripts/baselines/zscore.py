@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 import argparse
+import sys
 from pathlib import Path
-import pandas as pd
-import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from detectors import CHUNK_ROWS, ZScore, detect_file  # noqa: E402
+from telemetry import profiled  # noqa: E402
 
 def main():
     ap = argparse.ArgumentParser()
@@ -12,17 +15,13 @@ def main():
     ap.add_argument("--metric", "-m", type=str, default="latency_ms")
     ap.add_argument("--window", "-w", type=int, default=60)
     ap.add_argument("--k", "-k", type=float, default=3.0)
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Rows streamed through the detector at once")
+    ap.add_argument("--profile", type=Path, metavar="MANIFEST",
+                    help="Append this stage's time, memory and throughput to a JSON run manifest")
     args = ap.parse_args()
 
-    df = pd.read_csv(args.inp, parse_dates=["ts"])
-    v = df[args.metric].astype(float)
-    roll_mean = v.rolling(args.window, min_periods=max(2, args.window // 4)).mean()
-    roll_std = v.rolling(args.window, min_periods=max(2, args.window // 4)).std(ddof=0).replace(0, np.nan)
-    z = (v - roll_mean) / roll_std
-    pred = (z.abs() > args.k).astype(int).fillna(0)
-    out = df.assign(pred=pred)[["ts", "t_s", "pred"]]
-    args.out.parent.mkdir(parents=True, exist_ok=True)
-    out.to_csv(args.out, index=False)
+    with profiled(args.profile, "baseline:zscore") as stage:
+        stage.rows = detect_file(ZScore(args.window, args.k), args.inp, args.out, args.metric, args.chunk_rows)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
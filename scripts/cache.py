@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Content-addressed cache of generated datasets.
+
+An entry is a directory named after the SHA-256 of everything generation depends on
+(see ``generate.generation_inputs``). It holds the produced files plus ``meta.json``,
+whose mtime is refreshed on every hit and drives least-recently-used eviction once
+the cache grows past its size bound.
+
+Entry files are read-only and a hit hardlinks them to their destinations, falling
+back to a copy across filesystems. A fetched output therefore shares its inode with
+the cache entry: replace it (``TraceWriter`` unlinks before writing) rather than
+editing it in place.
+
+Location: ``$RESBENCH_CACHE_DIR`` (default ``.cache/datasets`` in the repository).
+Size bound: ``$RESBENCH_CACHE_MAX_MB`` (default 2048).
+
+Fitted baseline models use the same entry layout under ``$RESBENCH_MODEL_CACHE_DIR``
+(default ``.cache/models``), keyed by their training data and hyperparameters.
+"""
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_MAX_MB = 2048
+META = "meta.json"
+
+
+def cache_dir() -> Path:
+    return Path(os.environ.get("RESBENCH_CACHE_DIR", ROOT / ".cache" / "datasets"))
+
+
+def model_cache_dir() -> Path:
+    return Path(os.environ.get("RESBENCH_MODEL_CACHE_DIR", ROOT / ".cache" / "models"))
+
+
+def max_bytes() -> int:
+    return int(float(os.environ.get("RESBENCH_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 2**20)
+
+
+def content_key(obj: dict) -> str:
+    blob = json.dumps(obj, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def file_digest(p: Path) -> str:
+    h = hashlib.sha256()
+    with p.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def fetch(key: str, outputs: dict[str, Path], root: Path | None = None) -> dict | None:
+    """Hardlink (or copy) the cached files named in ``outputs`` (name -> destination) out of entry ``key``.
+
+    Returns the entry's metadata, or None, leaving the destinations untouched, unless
+    every file is cached.
+    """
+    entry = (root or cache_dir()) / key
+    src = {name: entry / name for name in outputs}
+    if not (entry / META).exists() or not all(p.exists() for p in src.values()):
+        return None
+    for name, dest in outputs.items():
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        dest.unlink(missing_ok=True)
+        try:
+            os.link(src[name], dest)
+        except OSError:
+            # another filesystem, or one without hardlinks
+            shutil.copyfile(src[name], dest)
+    os.utime(entry / META)
+    return json.loads((entry / META).read_text(encoding="utf-8"))
+
+
+def store(key: str, files: dict[str, Path], meta: dict | None = None, root: Path | None = None,
+          limit: int | None = None) -> None:
+    """Add read-only copies of ``files`` (name -> source path) as entry ``key``, then evict down to ``limit`` bytes."""
+    root = root or cache_dir()
+    root.mkdir(parents=True, exist_ok=True)
+    entry = root / key
+    if entry.exists():
+        os.utime(entry / META)
+        return
+    tmp = Path(tempfile.mkdtemp(prefix=f".{key[:12]}-", dir=root))
+    try:
+        for name, src in files.items():
+            shutil.copyfile(src, tmp / name)
+            os.chmod(tmp / name, 0o444)
+        info = {"key": key, "created": time.time(), "files": sorted(files), **(meta or {})}
+        (tmp / META).write_text(json.dumps(info, indent=2), encoding="utf-8")
+        os.replace(tmp, entry)
+    except OSError:
+        # a concurrent writer stored the same entry first
+        shutil.rmtree(tmp, ignore_errors=True)
+    evict(max_bytes() if limit is None else limit, root)
+
+
+def entries(root: Path | None = None) -> list[dict]:
+    """Cache entries, least recently used first."""
+    root = root or cache_dir()
+    rows = []
+    if not root.exists():
+        return rows
+    for entry in root.iterdir():
+        meta_p = entry / META
+        if not entry.is_dir() or entry.name.startswith(".") or not meta_p.exists():
+            continue
+        meta = json.loads(meta_p.read_text(encoding="utf-8"))
+        size = sum(p.stat().st_size for p in entry.iterdir() if p.is_file())
+        rows.append({"key": entry.name, "path": entry, "bytes": size,
+                     "last_used": meta_p.stat().st_mtime, "scenario": meta.get("scenario", "")})
+    return sorted(rows, key=lambda r: r["last_used"])
+
+
+def evict(limit: int, root: Path | None = None) -> list[dict]:
+    """Remove least recently used entries until the cache holds at most ``limit`` bytes."""
+    rows = entries(root)
+    total = sum(r["bytes"] for r in rows)
+    removed = []
+    for r in rows:
+        if total <= limit:
+            break
+        shutil.rmtree(r["path"], ignore_errors=True)
+        total -= r["bytes"]
+        removed.append(r)
+    return removed
+
+
+def main(argv: list[str] | None = None):
+    ap = argparse.ArgumentParser(prog="resbench cache", description="Inspect and prune the dataset cache")
+    ap.add_argument("--dir", type=Path, help="Cache directory (default: $RESBENCH_CACHE_DIR or .cache/datasets)")
+    ap.add_argument("--models", action="store_true",
+                    help="Act on the fitted-model cache ($RESBENCH_MODEL_CACHE_DIR or .cache/models) instead")
+    sp = ap.add_subparsers(dest="action", required=True)
+    sp.add_parser("list", help="List entries, least recently used first")
+    pr = sp.add_parser("prune", help="Evict least recently used entries down to a size bound")
+    pr.add_argument("--max-mb", type=float, help="Size bound in MiB (default: $RESBENCH_CACHE_MAX_MB or 2048)")
+    sp.add_parser("clear", help="Remove every entry")
+    args = ap.parse_args(argv)
+
+    root = args.dir or (model_cache_dir() if args.models else cache_dir())
+    if args.action == "list":
+        rows = entries(root)
+        for r in rows:
+            used = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(r["last_used"]))
+            print(f"{r['key'][:16]}  {r['bytes'] / 2**20:10.2f} MiB  {used}  {r['scenario']}")
+        total = sum(r["bytes"] for r in rows)
+        print(f"{len(rows)} entries, {total / 2**20:.2f} MiB in {root} (bound {max_bytes() / 2**20:.0f} MiB)")
+    elif args.action == "prune":
+        limit = max_bytes() if args.max_mb is None else int(args.max_mb * 2**20)
+        removed = evict(limit, root)
+        print(f"Evicted {len(removed)} entries ({sum(r['bytes'] for r in removed) / 2**20:.2f} MiB)")
+    else:
+        removed = evict(0, root)
+        print(f"Removed {len(removed)} entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,80 @@
 #!/usr/bin/env python3
+"""``resbench``: every subcommand runs in this process by calling the stage modules."""
 from __future__ import annotations
 import argparse
-import subprocess  # nosec B404
-import sys
 import os
+import sys
 from pathlib import Path
 
 ROOT = Path(__file__).resolve().parents[1]
+# the stage modules import each other as top-level siblings, also under the ``resbench`` entry point
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from defaults import ALGOS  # noqa: E402
 
 
-def run(*cmd: str):
-    r = subprocess.run(list(cmd), cwd=ROOT)  # nosec B603
-    sys.exit(r.returncode) if r.returncode else None
+def opt(flag: str, value) -> list[str]:
+    """``[flag, *value]`` for a given option, nothing for one left unset."""
+    if value is None:
+        return []
+    return [flag, *map(str, value)] if isinstance(value, list) else [flag, str(value)]
 
 
-def main():
+def main(argv: list[str] | None = None):
     ap = argparse.ArgumentParser(prog="resbench")
     sp = ap.add_subparsers(dest="cmd", required=True)
 
     g = sp.add_parser("gen")
     g.add_argument("--scenario", "-s", required=True)
     g.add_argument("--out", "-o", required=True)
+    g.add_argument("--profile", metavar="MANIFEST", help="Append the stage's timings to a JSON run manifest")
 
     b = sp.add_parser("baseline")
-    b.add_argument("--algo", choices=["threshold", "zscore"], default="threshold")
+    b.add_argument("--algo", choices=ALGOS, default="threshold")
     b.add_argument("--inp", "-i", required=True)
     b.add_argument("--out", "-o", required=True)
-    b.add_argument("--scenario", "-s")
+    b.add_argument("--scenario", "-s", help="Sets the static threshold and the isoforest warmup")
     b.add_argument("--metric", "-m", default="latency_ms")
+    b.add_argument("--params", help="YAML of per-baseline parameters, e.g. isoforest: {fit: warmup}")
+    b.add_argument("--profile", metavar="MANIFEST", help="Append the stage's timings to a JSON run manifest")
+
+    t = sp.add_parser("detect", help="All baselines on all metrics in one pass, with ensemble votes")
+    t.add_argument("--inp", "-i", required=True)
+    t.add_argument("--out", "-o", required=True)
+    t.add_argument("--scenario", "-s")
+    t.add_argument("--metrics", nargs="+")
+    t.add_argument("--detectors", nargs="+")
+    t.add_argument("--params")
+    t.add_argument("--ensembles", nargs="*")
+    t.add_argument("--weights", nargs="+")
 
     e = sp.add_parser("eval")
-    e.add_argument("--scenario", "-s", required=True)
-    e.add_argument("--data", "-d", required=True)
+    e.add_argument("--scenario", "-s")
+    e.add_argument("--data", "-d")
     e.add_argument("--pred", "-p")
     e.add_argument("--out", "-o")
+    e.add_argument("--manifest", "-m", help="Score every run of a YAML manifest into one table")
+    e.add_argument("--profile", metavar="MANIFEST", help="Append the stage's timings to a JSON run manifest")
+
+    w = sp.add_parser("sweep", help="Grid-search baseline parameters against ground truth")
+    w.add_argument("--scenario", "-s")
+    w.add_argument("--data", "-d")
+    w.add_argument("--manifest", "-m")
+    w.add_argument("--detectors", nargs="+")
+    w.add_argument("--grid")
+    w.add_argument("--workers", "-j", type=int, default=1)
+    w.add_argument("--out", "-o", default="eval/reports/sweep")
+
+    u = sp.add_parser("suite", help="Scenarios x detectors x seeds as an incremental, parallel task graph")
+    u.add_argument("--scenarios", "-s", nargs="+")
+    u.add_argument("--detectors", "-d", nargs="+")
+    u.add_argument("--seeds", nargs="+")
+    u.add_argument("--params")
+    u.add_argument("--scenario-metric", nargs="+")
+    u.add_argument("--out", "-o", default="eval/suite")
+    u.add_argument("--workers", "-j", type=int)
+    u.add_argument("--force", action="store_true")
+    u.add_argument("--no-plot", action="store_true")
+    u.add_argument("--dry-run", "-n", action="store_true")
 
     r = sp.add_parser("report")
     r.add_argument("--reports", "-r", default="eval/reports")
@@ -41,47 +82,90 @@ def main():
     r.add_argument("--title", "-t", default="ResilienceBench Report")
 
     p = sp.add_parser("plot")
-    p.add_argument("--scenario", "-s", required=True)
-    p.add_argument("--data", "-d", required=True)
-    p.add_argument("--out", "-o", required=True)
+    p.add_argument("--scenario", "-s")
+    p.add_argument("--data", "-d")
+    p.add_argument("--out", "-o")
+    p.add_argument("--decimate", choices=["minmax", "lttb", "none"])
+    p.add_argument("--points", type=int)
+    p.add_argument("--manifest", "-m", help="Plot every trace of a YAML manifest on parallel workers")
+    p.add_argument("--out-dir")
+    p.add_argument("--workers", "-j", type=int)
+    p.add_argument("--profile", metavar="MANIFEST", help="Append the stage's timings to a JSON run manifest")
+
+    c = sp.add_parser("cache", help="Inspect and prune the dataset cache")
+    c.add_argument("action", choices=["list", "prune", "clear"])
+    c.add_argument("--max-mb", type=float)
+    c.add_argument("--dir")
+    c.add_argument("--models", action="store_true", help="Use the fitted-model cache")
 
     a = sp.add_parser("all")
     a.add_argument("--scenario", "-s", required=True)
     a.add_argument("--prefix", default="eval/samples/sample")
+    a.add_argument("--algo", choices=ALGOS, default="threshold")
+    a.add_argument("--metric", "-m", default="latency_ms")
+    a.add_argument("--params", help="YAML of per-baseline parameters, e.g. isoforest: {fit: warmup}")
+    a.add_argument("--profile", action="store_true", help="Record stage timings in eval/reports/<scenario>_run.json")
 
-    args = ap.parse_args()
+    args = ap.parse_args(argv)
+    # paths are relative to the repository root, wherever resbench is started from
+    os.chdir(ROOT)
 
     if args.cmd == "gen":
-        run(sys.executable, "scripts/generate.py", "--scenario", args.scenario, "--out", args.out)
+        from generate import main as gen
+        gen(["--scenario", args.scenario, "--out", args.out, *opt("--profile", args.profile)])
     elif args.cmd == "baseline":
-        script = "scripts/baselines/threshold.py" if args.algo == "threshold" else "scripts/baselines/zscore.py"
-        cmd = [sys.executable, script, "--inp", args.inp, "--out", args.out, "--metric", args.metric]
-        if args.scenario:
-            cmd += ["--scenario", args.scenario]
-        run(*cmd)
+        from pipeline import DEFAULT_PARAMS, baseline_file, load_params, load_yaml
+        from telemetry import profiled
+        params = load_params(Path(args.params) if args.params else None, DEFAULT_PARAMS)[args.algo]
+        sc = load_yaml(Path(args.scenario)) if args.scenario else None
+        with profiled(Path(args.profile) if args.profile else None, f"baseline:{args.algo}") as stage:
+            stage.rows = baseline_file(Path(args.inp), Path(args.out), args.algo, sc, args.metric, params)
+    elif args.cmd == "detect":
+        from detect import main as detect
+        detect(["--inp", args.inp, "--out", args.out, *opt("--scenario", args.scenario),
+                *opt("--metrics", args.metrics), *opt("--detectors", args.detectors),
+                *opt("--ensembles", args.ensembles), *opt("--weights", args.weights), *opt("--params", args.params)])
     elif args.cmd == "eval":
-        cmd = [sys.executable, "scripts/evaluate.py", "--scenario", args.scenario, "--data", args.data]
-        if args.pred:
-            cmd += ["--pred", args.pred]
-        if args.out:
-            cmd += ["--out", args.out]
-        run(*cmd)
+        from evaluate import main as evaluate
+        if args.manifest:
+            cmd = ["--manifest", args.manifest]
+        else:
+            cmd = ["--scenario", args.scenario, "--data", args.data]
+        evaluate([*cmd, *opt("--pred", args.pred), *opt("--out", args.out), *opt("--profile", args.profile)])
+    elif args.cmd == "sweep":
+        from sweep import main as sweep
+        if args.manifest:
+            cmd = ["--manifest", args.manifest]
+        else:
+            cmd = ["--scenario", args.scenario, "--data", args.data]
+        sweep([*cmd, "--workers", str(args.workers), "--out", args.out, *opt("--detectors", args.detectors),
+               *opt("--grid", args.grid)])
+    elif args.cmd == "suite":
+        from suite import main as suite
+        suite(["--out", args.out, *opt("--scenarios", args.scenarios), *opt("--detectors", args.detectors),
+               *opt("--seeds", args.seeds), *opt("--params", args.params),
+               *opt("--scenario-metric", args.scenario_metric), *opt("--workers", args.workers),
+               *[f"--{flag.replace('_', '-')}" for flag in ("force", "no_plot", "dry_run") if getattr(args, flag)]])
     elif args.cmd == "report":
-        run(sys.executable, "scripts/report.py", "--reports", args.reports, "--out", args.out, "--title", args.title)
+        from report import main as report
+        report(["--reports", args.reports, "--out", args.out, "--title", args.title])
     elif args.cmd == "plot":
-        run(sys.executable, "scripts/plot.py", "--scenario", args.scenario, "--data", args.data, "--out", args.out)
+        from plot import main as plot
+        if args.manifest:
+            cmd = ["--manifest", args.manifest, *opt("--out-dir", args.out_dir), *opt("--workers", args.workers)]
+        else:
+            cmd = ["--scenario", args.scenario, "--data", args.data, "--out", args.out]
+        plot([*cmd, *opt("--decimate", args.decimate), *opt("--points", args.points), *opt("--profile", args.profile)])
+    elif args.cmd == "cache":
+        from cache import main as cache
+        cmd = [*opt("--dir", args.dir), *(["--models"] if args.models else []), args.action]
+        if args.max_mb is not None and args.action == "prune":
+            cmd += ["--max-mb", str(args.max_mb)]
+        cache(cmd)
     elif args.cmd == "all":
-        data = f"{args.prefix}.csv"
-        pred = f"{args.prefix}_pred.csv"
-        rep = f"eval/reports/{Path(args.scenario).stem}_report.csv"
-        img = f"eval/reports/{Path(args.scenario).stem}.png"
-        os.makedirs(Path(data).parent, exist_ok=True)
-        run(sys.executable, "scripts/generate.py", "--scenario", args.scenario, "--out", data)
-        run(sys.executable, "scripts/baselines/threshold.py", "--inp", data, "--out", pred, "--scenario", args.scenario)
-        run(sys.executable, "scripts/evaluate.py", "--scenario", args.scenario, "--data", data, "--pred", pred, "--out",
-            rep)
-        run(sys.executable, "scripts/plot.py", "--scenario", args.scenario, "--data", data, "--out", img)
-
+        from pipeline import DEFAULT_PARAMS, load_params, run_all
+        params = load_params(Path(args.params) if args.params else None, DEFAULT_PARAMS)[args.algo]
+        run_all(Path(args.scenario), args.prefix, args.algo, args.metric, params, profile=args.profile)
 
 if __name__ == "__main__":
     main()
@@ -2,56 +2,328 @@
 from __future__ import annotations
 import argparse
 import csv
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Iterator
 import numpy as np
-import pandas as pd
 import yaml
+from intervals import dilate_runs, ground_truth_intervals, index_runs
+from telemetry import profiled
+from traceio import read_trace
+
+# cells (replicates x samples) of the weight matrix materialized at once
+DEFAULT_CHUNK_CELLS = 1 << 22
+# replicates per independently seeded batch; fixed so results do not depend on --workers
+BATCH_SIZE = 100
+# consecutive batches whose CI bounds must all stay within --tol before --adaptive stops
+STABLE_BATCHES = 2
 
 
 def load_yaml(p: Path) -> dict:
     return yaml.safe_load(p.read_text(encoding="utf-8"))
 
 
-def dilate(mask: np.ndarray, k: int) -> np.ndarray:
-    if k <= 0:
-        return mask
-    m = mask.copy()
-    for _ in range(k):
-        left = np.concatenate(([False], m[:-1]))
-        right = np.concatenate((m[1:], [False]))
-        m = m | left | right
-    return m
-
+def prepare(sc: dict, data, pred) -> dict:
+    """Per-sample inputs of every bootstrapped metric, over the post-warmup window.
 
-def compute_metrics(sc: dict, data: pd.DataFrame, pred: pd.DataFrame) -> dict:
+    Labels are taken on the ordered trace once: ground truth dilated by the detection
+    tolerance, and which predictions are TP/FP/FN samples. A replicate is then fully
+    described by how many times it draws each sample, or by which ranges of the
+    ordered trace it draws for the block bootstrap.
+    """
     warmup = int(sc["dataset"].get("warmup_s", 0))
-    x = data[data["t_s"] >= warmup].copy()
-    pr = pred[pred["t_s"] >= warmup]
+    x = data[data["t_s"] >= warmup]
+    y = pred[pred["t_s"] >= warmup]["pred"].to_numpy().astype(bool)
+    t = x["t_s"].to_numpy()
+    tol = int(sc.get("evaluation", {}).get("detection", {}).get("window_tolerance_s", 0))
+    gt = np.zeros(len(t), dtype=bool)
+    for s, e in dilate_runs(index_runs(t, ground_truth_intervals(sc)), tol, len(t)):
+        gt[s:e] = True
 
     targets = sc.get("evaluation", {}).get("tails", {}).get("p99_targets", ["latency_ms"])
-    row = {}
+    tails = {}
     for m in targets:
-        v = x[m].astype(float)
-        row[f"p99_{m}"] = float(np.percentile(v, 99))
+        v = x[m].to_numpy(dtype=float)
+        order = np.argsort(v, kind="stable")
+        tails[m] = (v[order], order)
+    # columns of one matrix product per replicate chunk: error rate, TP, FP, FN
+    linear = np.column_stack([x["error_rate_pct"].to_numpy(dtype=float), y & gt, y & ~gt, ~y & gt])
+    linear = linear.astype(float)
+    # block replicates read the linear columns' sums over sample ranges from prefix sums
+    prefix = np.vstack([np.zeros((1, linear.shape[1])), np.cumsum(linear, axis=0)])
+    return {"n": len(t), "tails": tails, "linear": linear, "prefix": prefix}
 
-    row["error_rate_pct"] = float(x["error_rate_pct"].mean())
 
-    gt = sc["ground_truth"]["positive_interval_s"]
-    tol = int(sc.get("evaluation", {}).get("detection", {}).get("window_tolerance_s", 0))
-    t = x["t_s"].to_numpy()
-    gt_mask = (t >= gt[0]) & (t <= gt[1])
-    gt_mask = dilate(gt_mask, tol)
+def replicate_weights(rng: np.random.Generator, reps: int, n: int) -> np.ndarray:
+    """``(reps, n)`` draw counts of ``reps`` bootstrap resamples of ``n`` samples."""
+    # one double per draw keeps the stream independent of how replicates are chunked
+    idx = (rng.random((reps, n)) * n).astype(np.int64)
+    idx += np.arange(reps)[:, None] * n
+    return np.bincount(idx.ravel(), minlength=reps * n).reshape(reps, n)
+
+
+class SampleDraws:
+    """iid replicates as a ``(reps, n)`` matrix of per-sample draw counts."""
+
+    def __init__(self, weights: np.ndarray):
+        self.weights = weights
+        self.reps, self.n = weights.shape
+        self.total = weights.sum(axis=1)
+
+    def linear(self, prep: dict) -> np.ndarray:
+        return self.weights @ prep["linear"]
+
+    def counts(self, idx: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+        w = self.weights if rows is None else self.weights[rows]
+        return w[:, idx]
+
+
+class BlockDraws:
+    """Block bootstrap replicates as half-open sample ranges ``[start, end)`` per replicate.
+
+    A block that wraps past the end of the trace is stored as two ranges. Linear
+    statistics come from prefix sums at the range ends, and the draw count of a
+    sample is the number of ranges covering it, so neither needs the full
+    ``(reps, n)`` matrix.
+    """
+
+    def __init__(self, row: np.ndarray, start: np.ndarray, end: np.ndarray, reps: int, n: int):
+        wrap = end > n
+        self.row = np.concatenate([row, row[wrap]])
+        self.start = np.concatenate([start, np.zeros(wrap.sum(), dtype=np.int64)])
+        self.end = np.concatenate([np.minimum(end, n), end[wrap] - n])
+        self.reps, self.n = reps, n
+        self.total = np.bincount(self.row, weights=self.end - self.start, minlength=reps)
+        # range ends of all replicates in one sorted array, row r shifted by r * (n + 1)
+        base = self.row * (n + 1)
+        self._starts = np.sort(base + self.start)
+        self._ends = np.sort(base + self.end)
+
+    def linear(self, prep: dict) -> np.ndarray:
+        part = prep["prefix"][self.end] - prep["prefix"][self.start]
+        return np.column_stack([np.bincount(self.row, weights=part[:, j], minlength=self.reps)
+                                for j in range(part.shape[1])])
+
+    def counts(self, idx: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+        rows = np.arange(self.reps) if rows is None else np.flatnonzero(rows)
+        # ranges started at or before i minus ranges ended at or before i; earlier rows cancel out
+        key = (rows[:, None] * (self.n + 1) + idx[None, :]).ravel()
+        c = np.searchsorted(self._starts, key, side="right") - np.searchsorted(self._ends, key, side="right")
+        return c.reshape(len(rows), len(idx))
+
+
+def block_draws(rng: np.random.Generator, reps: int, n: int, length: int, method: str) -> BlockDraws:
+    """``reps`` replicates of ``n`` samples made of blocks of the ordered trace.
+
+    ``moving``: blocks of ``length`` starting uniformly in ``[0, n - length]``.
+    ``circular``: the same with starts in ``[0, n)``, wrapping around the end.
+    ``stationary``: circular blocks with geometric lengths of mean ``length``
+    (Politis and Romano). The last block of a replicate is cut to total ``n``.
+    """
+    length = int(min(max(length, 1), n))
+    if method in ("moving", "circular"):
+        b = -(-n // length)
+        u = rng.random((reps, b))
+        lens = np.full((reps, b), length, dtype=np.int64)
+        lens[:, -1] = n - (b - 1) * length
+        span = n - length + 1 if method == "moving" else n
+        start = (u * span).astype(np.int64)
+    elif method == "stationary":
+        mean_blocks = n / length
+        b = int(np.ceil(mean_blocks + 6 * np.sqrt(mean_blocks))) + 16
+        u = rng.random((reps, 2 * b))
+        start = (u[:, :b] * n).astype(np.int64)
+        if length > 1:
+            # inverse-CDF geometric draws: one double per block, like every other draw here
+            lens = np.floor(np.log1p(-u[:, b:]) / np.log1p(-1 / length)).astype(np.int64) + 1
+        else:
+            lens = np.ones((reps, b), dtype=np.int64)
+        # more than six standard deviations short of n: stretch the last block
+        short = lens.sum(axis=1) < n
+        lens[short, -1] += n - lens[short].sum(axis=1)
+        before = np.cumsum(lens, axis=1) - lens
+        lens = np.clip(n - before, 0, lens)
+    else:
+        raise ValueError(f"unknown bootstrap method: {method}")
+    keep = lens > 0
+    row = np.broadcast_to(np.arange(reps)[:, None], lens.shape)[keep]
+    return BlockDraws(row, start[keep], start[keep] + lens[keep], reps, n)
+
+
+def ar1_block_length(x: np.ndarray) -> int:
+    """Block length ``(2 rho / (1 - rho^2))^(2/3) n^(1/3)`` for an AR(1) fit of ``x`` (Carlstein)."""
+    n = len(x)
+    x = x - x.mean()
+    denom = float(x @ x)
+    rho = float(x[1:] @ x[:-1]) / denom if denom > 0 else 0.0
+    rho = min(rho, 0.999)
+    if rho <= 0:
+        return 1
+    return int(min(max(np.ceil((2 * rho / (1 - rho * rho)) ** (2 / 3) * n ** (1 / 3)), 1), max(n // 2, 1)))
+
+
+def auto_block_length(prep: dict) -> int:
+    """Largest AR(1) block length over the error rate and every tail metric, in trace order."""
+    series = [prep["linear"][:, 0]]
+    for values, order in prep["tails"].values():
+        v = np.empty_like(values)
+        v[order] = values
+        series.append(v)
+    return max(ar1_block_length(v) for v in series)
+
+
+def weighted_rank_value(sorted_values: np.ndarray, weights: np.ndarray, rank: np.ndarray) -> np.ndarray:
+    """Per-row value at fractional ``rank`` of ``sorted_values`` repeated ``weights[r]`` times.
+
+    Interpolates between order statistics exactly like ``np.percentile`` on the
+    expanded sample. Rows are located in one ``searchsorted`` over the row-offset
+    cumulative counts.
+    """
+    reps, n = weights.shape
+    cum = np.cumsum(weights, axis=1)
+    total = cum[:, -1]
+    lo = np.floor(rank)
+    # rows are made globally sorted by shifting row r past every count of the rows before it
+    shift = np.arange(reps) * (int(total.max(initial=0)) + 1)
+    flat = (cum + shift[:, None]).ravel()
+    base = np.arange(reps) * n
+    i_lo = np.searchsorted(flat, lo + shift, side="right") - base
+    i_hi = np.searchsorted(flat, np.minimum(lo + 1, total - 1) + shift, side="right") - base
+    v_lo, v_hi = sorted_values[i_lo], sorted_values[i_hi]
+    return v_lo + (rank - lo) * (v_hi - v_lo)
 
-    y = pr["pred"].to_numpy().astype(bool)
-    tp = int(np.sum(y & gt_mask))
-    fp = int(np.sum(y & ~gt_mask))
-    fn = int(np.sum(~y & gt_mask))
-    row["precision"] = tp / (tp + fp) if (tp + fp) else 0.0
-    row["recall"] = tp / (tp + fn) if (tp + fn) else 0.0
-    row["f1"] = (2 * row["precision"] * row["recall"] /
-                 (row["precision"] + row["recall"])
-                 if (row["precision"] + row["recall"]) else 0.0)
-    return row
+
+def weighted_quantile(sorted_values: np.ndarray, order: np.ndarray, draws, q: float) -> np.ndarray:
+    """Per-replicate ``q`` quantile of the values whose ascending sort is ``order``.
+
+    Only the draw counts of the top few percent of the sorted samples are gathered
+    and accumulated: a high quantile's order statistics sit there for all but the
+    rarest replicates, which fall back to the full row.
+    """
+    n, total = draws.n, draws.total
+    k = min(n, int(np.ceil((1 - q) * n * 4)) + 64)
+    tail = draws.counts(order[n - k:])
+    below = total - tail.sum(axis=1)
+    rank = q * (total - 1)
+    out = np.empty(draws.reps)
+    ok = np.floor(rank) >= below
+    out[ok] = weighted_rank_value(sorted_values[n - k:], tail[ok], rank[ok] - below[ok])
+    if not ok.all():
+        rest = ~ok
+        out[rest] = weighted_rank_value(sorted_values, draws.counts(order, rest), rank[rest])
+    return out
+
+
+def replicate_metrics(prep: dict, draws) -> dict[str, np.ndarray]:
+    """Every metric for each replicate of ``draws`` (:class:`SampleDraws` or :class:`BlockDraws`), in report order."""
+    out = {}
+    total = draws.total
+    for m, (values, order) in prep["tails"].items():
+        out[f"p99_{m}"] = weighted_quantile(values, order, draws, 0.99)
+    err, tp, fp, fn = draws.linear(prep).T
+    out["error_rate_pct"] = err / total
+    with np.errstate(invalid="ignore", divide="ignore"):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        recall = np.where(tp + fn > 0, tp / (tp + fn), 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    out["precision"], out["recall"], out["f1"] = precision, recall, f1
+    return out
+
+
+def batch_rng(seed: int, batch: int) -> np.random.Generator:
+    """Generator of replicate batch ``batch``: its own ``SeedSequence(seed, spawn_key=(batch,))``."""
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(batch,)))
+
+
+def draw(rng: np.random.Generator, reps: int, n: int, method: str = "iid", block_length: int = 1):
+    if method == "iid":
+        return SampleDraws(replicate_weights(rng, reps, n))
+    return block_draws(rng, reps, n, block_length, method)
+
+
+def run_batch(prep: dict, seed: int, batch: int, reps: int, chunk_cells: int = DEFAULT_CHUNK_CELLS,
+              method: str = "iid", block_length: int = 1) -> dict[str, np.ndarray]:
+    """``reps`` replicates of batch ``batch``, drawn in chunks of at most ``chunk_cells`` weights."""
+    rng = batch_rng(seed, batch)
+    n = prep["n"]
+    per_chunk = max(1, chunk_cells // max(n, 1))
+    parts = [replicate_metrics(prep, draw(rng, min(per_chunk, reps - r0), n, method, block_length))
+             for r0 in range(0, reps, per_chunk)]
+    return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+
+_worker_prep: dict = {}
+
+
+def _init_worker(prep: dict) -> None:
+    # the prepared trace is sent once per process rather than once per batch
+    _worker_prep.update(prep)
+
+
+def _worker_batch(seed: int, batch: int, reps: int, chunk_cells: int, method: str,
+                  block_length: int) -> dict[str, np.ndarray]:
+    return run_batch(_worker_prep, seed, batch, reps, chunk_cells, method, block_length)
+
+
+def batches(prep: dict, n_bootstrap: int, seed: int, batch_size: int = BATCH_SIZE,
+            chunk_cells: int = DEFAULT_CHUNK_CELLS, workers: int = 1, method: str = "iid",
+            block_length: int = 1) -> Iterator[dict[str, np.ndarray]]:
+    """Replicate batches of ``batch_size`` (the last may be short), yielded in order.
+
+    Every batch has its own generator, so the replicates do not depend on the worker
+    count or chunk size. With ``workers > 1`` batches run on a process pool with a
+    bounded look-ahead; closing the iterator early cancels what has not started.
+    """
+    sizes = [min(batch_size, n_bootstrap - r0) for r0 in range(0, n_bootstrap, batch_size)]
+    if workers <= 1:
+        for b, reps in enumerate(sizes):
+            yield run_batch(prep, seed, b, reps, chunk_cells, method, block_length)
+        return
+
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(prep,))
+    try:
+        pending: deque = deque()
+        for b, reps in enumerate(sizes):
+            pending.append(pool.submit(_worker_batch, seed, b, reps, chunk_cells, method, block_length))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def ci_bounds(arr: np.ndarray, alpha: float) -> tuple[float, float]:
+    lo, hi = np.percentile(arr, [alpha / 2 * 100, (1.0 - alpha / 2) * 100])
+    return float(lo), float(hi)
+
+
+def bootstrap(prep: dict, n_bootstrap: int, seed: int, chunk_cells: int = DEFAULT_CHUNK_CELLS,
+              batch_size: int = BATCH_SIZE, workers: int = 1, alpha: float = 0.05,
+              tol: float | None = None, method: str = "iid", block_length: int = 1) -> dict[str, np.ndarray]:
+    """Up to ``n_bootstrap`` replicates of every metric, resampled by ``method`` (see :func:`block_draws`).
+
+    With ``tol`` set, stops once every metric's CI bounds have moved by at most ``tol``
+    (relative) after each of ``STABLE_BATCHES`` consecutive batches. The check runs
+    batch by batch in order, so where it stops does not depend on ``workers`` either.
+    """
+    parts: list[dict[str, np.ndarray]] = []
+    prev = None
+    stable = 0
+    for part in batches(prep, n_bootstrap, seed, batch_size, chunk_cells, workers, method, block_length):
+        parts.append(part)
+        if tol is None:
+            continue
+        acc = {k: np.concatenate([p[k] for p in parts]) for k in part}
+        cur = np.array([ci_bounds(v, alpha) for v in acc.values()])
+        if prev is not None:
+            moved = np.abs(cur - prev) <= tol * np.maximum(np.abs(cur), np.abs(prev))
+            stable = stable + 1 if moved.all() else 0
+            if stable >= STABLE_BATCHES:
+                break
+        prev = cur
+    return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
 
 
 def main():
@@ -60,46 +332,63 @@ def main():
     ap.add_argument("--scenario", "-s", type=Path, required=True)
     ap.add_argument("--data", "-d", type=Path, required=True)
     ap.add_argument("--pred", "-p", type=Path, required=True)
-    ap.add_argument("--n-bootstrap", "-n", type=int, default=1000)
+    ap.add_argument("--n-bootstrap", "-n", type=int, default=1000,
+                    help="Bootstrap replicates (the maximum with --adaptive)")
     ap.add_argument("--alpha", "-a", type=float, default=0.05)
     ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--workers", "-j", type=int, default=1,
+                    help="Run replicate batches on this many processes; results do not depend on it")
+    ap.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                    help="Replicates per independently seeded batch")
+    ap.add_argument("--adaptive", action="store_true",
+                    help="Stop early once the CI bounds of every metric are stable (see --tol)")
+    ap.add_argument("--tol", type=float, default=0.005,
+                    help="Relative CI bound movement per batch counted as stable with --adaptive")
+    ap.add_argument("--method", choices=["iid", "moving", "circular", "stationary"], default="iid",
+                    help="Resample samples (iid) or blocks of the ordered trace, keeping autocorrelation")
+    ap.add_argument("--block-length", type=int, default=0,
+                    help="Block length in samples (mean length for stationary); 0 = AR(1) plug-in rule")
+    ap.add_argument("--chunk-cells", type=int, default=DEFAULT_CHUNK_CELLS,
+                    help="Bound on replicates x samples held in memory at once (per worker)")
     ap.add_argument("--out", "-o", type=Path, required=True)
+    ap.add_argument("--profile", type=Path, metavar="MANIFEST",
+                    help="Append this stage's time, memory and throughput to a JSON run manifest")
     args = ap.parse_args()
 
     sc = load_yaml(args.scenario)
-    data = pd.read_csv(args.data, parse_dates=["ts"])
-    pred = pd.read_csv(args.pred, parse_dates=["ts"])
-
-    np.random.seed(args.seed)
-    n = len(data)
-    results: dict[str, list[float]] = {}
-
-    for _ in range(args.n_bootstrap):
-        idx = np.random.choice(n, size=n, replace=True)
-        sample_data = data.iloc[idx].reset_index(drop=True)
-        sample_pred = pred.iloc[idx].reset_index(drop=True)
-        row = compute_metrics(sc, sample_data, sample_pred)
-        for k, v in row.items():
-            results.setdefault(k, []).append(v)
-
-    lo = args.alpha / 2
-    hi = 1.0 - lo
+    with profiled(args.profile, "confidence") as stage:
+        data = read_trace(args.data)
+        pred = read_trace(args.pred)
+        prep = prepare(sc, data, pred)
+        block_length = 1
+        if args.method != "iid":
+            block_length = args.block_length or auto_block_length(prep)
+        results = bootstrap(prep, args.n_bootstrap, args.seed, args.chunk_cells, args.batch_size, args.workers,
+                            args.alpha, args.tol if args.adaptive else None, args.method, block_length)
+        n_iter = len(next(iter(results.values())))
+        stage.rows = len(data)
+        stage.info["replicates"] = n_iter
+
     rows = []
-    for metric, vals in results.items():
-        arr = np.array(vals)
+    for metric, arr in results.items():
+        lo, hi = ci_bounds(arr, args.alpha)
         rows.append({
             "metric": metric,
             "mean": round(float(np.mean(arr)), 6),
-            "ci_lower": round(float(np.percentile(arr, lo * 100)), 6),
-            "ci_upper": round(float(np.percentile(arr, hi * 100)), 6),
+            "ci_lower": round(lo, 6),
+            "ci_upper": round(hi, 6),
+            "n_iter": n_iter,
+            "method": args.method,
+            "block_length": block_length,
         })
 
     args.out.parent.mkdir(parents=True, exist_ok=True)
     with open(args.out, "w", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=["metric", "mean", "ci_lower", "ci_upper"])
+        w = csv.DictWriter(f, fieldnames=["metric", "mean", "ci_lower", "ci_upper", "n_iter", "method",
+                                           "block_length"])
         w.writeheader()
         w.writerows(rows)
-    print(f"Wrote {args.out} ({len(rows)} metrics, {args.n_bootstrap} bootstrap iterations)")
+    print(f"Wrote {args.out} ({len(rows)} metrics, {n_iter} bootstrap iterations)")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""Default parameters of every baseline detector.
+
+Plain data without third-party imports, so ``resbench`` can list the baselines as
+argument choices before loading numpy or pandas.
+"""
+from __future__ import annotations
+
+# the streaming detectors of detectors.py, run by detect.py
+STREAMING_PARAMS = {
+    "threshold": {"threshold": 0.0},  # <= 0: from the scenario SLO, as threshold.py
+    "zscore": {"window": 60, "k": 3.0},
+    "ewma": {"span": 30, "threshold": 3.0},
+    "cusum": {"drift": 0.5, "threshold": 5.0},
+    "mad": {"window": 60, "k": 3.5},
+    "quantile": {"window": 300, "q": 0.99},
+}
+DEFAULT_PARAMS = {
+    **STREAMING_PARAMS,
+    # fit: all | warmup | window (train_start <= t_s < train_end), as baselines/isoforest.py --fit
+    "isoforest": {"contam": 0.02, "seed": 42, "n_estimators": 100, "max_samples": "auto",
+                  "features": ["latency_ms", "error_rate_pct"], "fit": "all", "train_start": 0.0,
+                  "train_end": None, "n_jobs": 1},
+}
+ALGOS = list(DEFAULT_PARAMS)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Run every configured detector on every metric of a trace in one streaming pass.
+
+The trace is read once, chunk by chunk. Each (detector, metric) pair keeps its own
+streaming state and fills a ``pred_<detector>_<metric>`` column, identical to the
+output of the corresponding baseline CLI. Ensemble votes over all pairs are taken on
+the same chunk and written as ``pred_<combiner>``; the first ensemble is also written
+as ``pred`` so ``evaluate.py --pred`` scores it directly. ``evaluate.py --manifest``
+scores every column of the wide file together.
+"""
+from __future__ import annotations
+import argparse
+from pathlib import Path
+import numpy as np
+import yaml
+from defaults import STREAMING_PARAMS as DEFAULT_PARAMS
+from detectors import (CHUNK_ROWS, COMBINERS, Cusum, Detector, Ewma, Mad, Quantile, Threshold, ZScore, combine,
+                       slo_threshold)
+from traceio import TraceWriter, iter_trace, read_trace
+
+METRICS = ["latency_ms", "error_rate_pct", "throughput_rps"]
+DEFAULT_DETECTORS = ["threshold", "zscore", "ewma", "cusum"]
+
+
+def load_yaml(p: Path) -> dict:
+    return yaml.safe_load(p.read_text(encoding="utf-8"))
+
+
+def load_params(path: Path | None, defaults: dict | None = None) -> dict:
+    """``defaults`` (:data:`DEFAULT_PARAMS`) updated from a YAML of ``{detector: {param: value}}``."""
+    params = {d: dict(p) for d, p in (defaults or DEFAULT_PARAMS).items()}
+    if path:
+        for d, p in (load_yaml(path) or {}).items():
+            if d not in params:
+                raise SystemExit(f"{path}: unknown detector {d!r} (expected one of {', '.join(params)})")
+            unknown = set(p) - set(params[d])
+            if unknown:
+                raise SystemExit(f"{path}: {d} has no parameter {sorted(unknown)}")
+            params[d].update(p)
+    return params
+
+
+def build(name: str, metric: str, p: dict, scenario: dict | None, reference) -> Detector:
+    """One streaming detector on ``metric``; CUSUM takes its in-control mean/std from ``reference``."""
+    if name == "threshold":
+        thr = float(p["threshold"])
+        return Threshold(thr if thr > 0 else slo_threshold(scenario, metric))
+    if name == "zscore":
+        return ZScore(int(p["window"]), float(p["k"]))
+    if name == "ewma":
+        return Ewma(int(p["span"]), float(p["threshold"]))
+    if name == "mad":
+        return Mad(int(p["window"]), float(p["k"]))
+    if name == "quantile":
+        return Quantile(int(p["window"]), float(p["q"]))
+    return Cusum.fit(reference[metric], float(p["drift"]), float(p["threshold"]))
+
+
+def parse_weights(items: list[str]) -> dict[str, float]:
+    out = {}
+    for item in items:
+        name, sep, w = item.partition("=")
+        if not sep:
+            raise SystemExit(f"--weights expects NAME=WEIGHT, got {item!r}")
+        out[name] = float(w)
+    return out
+
+
+def member_weight(weights: dict[str, float], detector: str, metric: str) -> float:
+    """Weight of a (detector, metric) pair: its column name, then the detector, then the metric; 1 by default."""
+    for key in (f"{detector}_{metric}", detector, metric):
+        if key in weights:
+            return weights[key]
+    return 1.0
+
+
+def detect_all(inp: Path, out: Path, members: dict[str, tuple[str, Detector]], ensembles: list[str],
+               weights: np.ndarray, share: float = 0.5, chunk_rows: int = CHUNK_ROWS) -> int:
+    """Stream the trace once through every ``{column: (metric, detector)}`` member into one wide file."""
+    metrics = list(dict.fromkeys(m for m, _ in members.values()))
+    rows = 0
+    with TraceWriter(out) as w:
+        for df in iter_trace(inp, ["ts", "t_s", *metrics], chunk_rows):
+            values = {m: df[m].to_numpy(dtype=float) for m in metrics}
+            preds = np.stack([det.update(values[m]) for m, det in members.values()]).astype(np.int8)
+            votes = {f"pred_{e}": combine(preds, e, weights, share) for e in ensembles}
+            cols = {"pred": votes[f"pred_{ensembles[0]}"]} if ensembles else {}
+            cols.update(votes)
+            cols.update({f"pred_{c}": p for c, p in zip(members, preds)})
+            w.write(df[["ts", "t_s"]].assign(**cols))
+            rows += len(df)
+    return rows
+
+
+def main(argv: list[str] | None = None):
+    ap = argparse.ArgumentParser(description="All baseline detectors on all metrics in one pass, with ensemble votes")
+    ap.add_argument("--inp", "-i", type=Path, required=True)
+    ap.add_argument("--out", "-o", type=Path, required=True)
+    ap.add_argument("--scenario", "-s", type=Path, help="Scenario whose SLO sets the static thresholds")
+    ap.add_argument("--metrics", nargs="+", default=METRICS)
+    ap.add_argument("--detectors", nargs="+", choices=list(DEFAULT_PARAMS), default=DEFAULT_DETECTORS,
+                    help="Default: the four streaming baselines; mad and quantile are per-sample and slower")
+    ap.add_argument("--params", type=Path,
+                    help="YAML of per-detector parameters overriding the defaults, e.g. zscore: {window: 30, k: 2.5}")
+    ap.add_argument("--ensembles", nargs="*", choices=COMBINERS, default=list(COMBINERS),
+                    help="Combiners over all detector columns; the first is also written as 'pred'")
+    ap.add_argument("--weights", nargs="+", default=[], metavar="NAME=WEIGHT",
+                    help="Weighted-vote weights by column (zscore_latency_ms), detector or metric; default 1")
+    ap.add_argument("--vote-share", type=float, default=0.5,
+                    help="Weighted vote alarms when alarming members carry more than this share of the weight")
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Rows streamed through the detectors at once")
+    args = ap.parse_args(argv)
+
+    params = load_params(args.params)
+    scenario = load_yaml(args.scenario) if args.scenario else None
+    # CUSUM needs its in-control reference before streaming; one extra read covers all metrics
+    reference = read_trace(args.inp, args.metrics) if "cusum" in args.detectors else None
+    members = {f"{d}_{m}": (m, build(d, m, params[d], scenario, reference))
+               for d in args.detectors for m in args.metrics}
+    weights = parse_weights(args.weights)
+    w = np.array([member_weight(weights, d, m) for d in args.detectors for m in args.metrics])
+
+    rows = detect_all(args.inp, args.out, members, args.ensembles, w, args.vote_share, args.chunk_rows)
+    print(f"Wrote {args.out} ({rows} rows, {len(members)} detector columns, {len(args.ensembles)} ensembles)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""Streaming anomaly detectors behind the baseline CLIs.
+
+Every detector consumes one metric as consecutive chunks through ``update(chunk)``
+and returns the 0/1 predictions of exactly those samples. State is bounded by the
+detector's window, not by the stream length, and the predictions do not depend on
+how the stream is chunked: feeding a series in any number of pieces gives the same
+output, bit for bit, as feeding it at once.
+"""
+from __future__ import annotations
+import math
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from rolling import RollingOrder
+from traceio import TraceWriter, iter_trace
+
+CHUNK_ROWS = 1 << 20
+
+
+class Detector:
+    def update(self, chunk) -> np.ndarray:
+        raise NotImplementedError
+
+    def run(self, values, chunk_rows: int = 0) -> np.ndarray:
+        """Predictions for a whole series, fed in chunks of ``chunk_rows`` (0 = at once)."""
+        v = np.asarray(values, dtype=float)
+        step = chunk_rows if chunk_rows > 0 else max(len(v), 1)
+        parts = [self.update(v[i:i + step]) for i in range(0, len(v), step)]
+        return np.concatenate(parts, axis=-1) if parts else self.update(v)
+
+
+class RollingMoments:
+    """Count, mean and variance (ddof=0) of the last ``window`` samples, NaNs skipped.
+
+    Window sums are anchored to fixed blocks of ``window`` samples counted from the
+    start of the stream: a window is the suffix of the previous block plus the prefix
+    of the current one, both plain cumulative sums within a block. Each sum is thus
+    accumulated in the same order whatever the chunking, which running add/remove
+    (Welford) updates do not guarantee in floating point, and never subtracts a large
+    running total. Values are shifted by the first finite sample before squaring.
+    State is the previous block and the open one.
+    """
+
+    def __init__(self, window: int):
+        if window < 1:
+            raise ValueError("window must be >= 1")
+        self.window = window
+        self.ref = None
+        self.prev = np.zeros((0, 3))  # previous complete block as (valid, x - ref, (x - ref)^2)
+        self.open = np.zeros((0, 3))
+
+    def update(self, chunk) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        x = np.asarray(chunk, dtype=float)
+        w, n = self.window, len(x)
+        ok = ~np.isnan(x)
+        if self.ref is None and ok.any():
+            self.ref = float(x[ok][0])
+        d = np.where(ok, x - (self.ref or 0.0), 0.0)
+        cols = np.concatenate([self.prev, self.open, np.column_stack([ok, d, d * d])])
+        # pad to whole blocks; the first row of ``cols`` starts a block
+        nblocks = -(-len(cols) // w)
+        blocks = np.zeros((nblocks * w, 3))
+        blocks[:len(cols)] = cols
+        blocks = blocks.reshape(nblocks, w, 3)
+        pre = np.cumsum(blocks, axis=1)
+        suf = np.zeros((nblocks, w + 1, 3))
+        suf[:, :w] = np.cumsum(blocks[:, ::-1], axis=1)[:, ::-1]
+
+        # positions of the new samples within ``cols``; a window ending at offset r of its
+        # block also covers the previous block from offset r + 1
+        pos = len(self.prev) + len(self.open) + np.arange(n)
+        k, r = pos // w, pos % w
+        sums = pre[k, r]
+        has_prev = k > 0
+        sums[has_prev] += suf[k[has_prev] - 1, r[has_prev] + 1]
+
+        whole = len(cols) // w * w
+        self.open = cols[whole:]
+        if whole:
+            self.prev = cols[whole - w:whole]
+        count, s1, s2 = sums[:, 0], sums[:, 1], sums[:, 2]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = s1 / count
+            var = np.maximum(s2 / count - mean * mean, 0.0)
+        return count, mean + (self.ref or 0.0), var
+
+
+class ZScore(Detector):
+    """``|x - rolling mean| > k * rolling std`` over the last ``window`` samples."""
+
+    def __init__(self, window: int = 60, k: float = 3.0):
+        self.k = k
+        self.min_periods = max(2, window // 4)
+        self.stats = RollingMoments(window)
+
+    def update(self, chunk) -> np.ndarray:
+        x = np.asarray(chunk, dtype=float)
+        count, mean, var = self.stats.update(x)
+        std = np.sqrt(var)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            z = np.abs(x - mean) / np.where(std > 0, std, np.nan)
+        return ((z > self.k) & (count >= self.min_periods)).astype(np.int8)
+
+
+MAD_SCALE = 1.4826  # MAD of a normal sample is 0.6745 standard deviations
+
+
+class Mad(Detector):
+    """``|x - rolling median| > k * 1.4826 * rolling MAD`` over the last ``window`` samples.
+
+    The robust counterpart of :class:`ZScore`: a spike barely moves the median and
+    MAD of its window, where it inflates the mean and std it is measured against.
+    """
+
+    def __init__(self, window: int = 60, k: float = 3.5):
+        self.k = k
+        self.min_periods = max(2, window // 4)
+        self.order = RollingOrder(window)
+
+    def update(self, chunk) -> np.ndarray:
+        x = np.asarray(chunk, dtype=float)
+        out = np.zeros(len(x), dtype=np.int8)
+        order, limit = self.order, self.k * MAD_SCALE
+        for i, v in enumerate(x.tolist()):
+            order.push(v)
+            if math.isnan(v) or len(order) < self.min_periods:
+                continue
+            m, mad = order.median_mad()
+            if mad > 0 and abs(v - m) > limit * mad:
+                out[i] = 1
+        return out
+
+
+class Quantile(Detector):
+    """``x`` above the ``q``-quantile (or below the ``lower``-quantile) of the preceding ``window`` samples."""
+
+    def __init__(self, window: int = 300, q: float = 0.99, lower: float | None = None):
+        self.q = q
+        self.lower = lower
+        self.min_periods = max(2, window // 4)
+        self.order = RollingOrder(window)
+
+    def update(self, chunk) -> np.ndarray:
+        x = np.asarray(chunk, dtype=float)
+        out = np.zeros(len(x), dtype=np.int8)
+        order = self.order
+        for i, v in enumerate(x.tolist()):
+            if len(order) >= self.min_periods:
+                if v > order.quantile(self.q) or (self.lower is not None and v < order.quantile(self.lower)):
+                    out[i] = 1
+            order.push(v)
+        return out
+
+
+class Ewma(Detector):
+    """Residual from a recursive EWMA (``adjust=False``) beyond ``threshold`` rolling stds of the residual."""
+
+    def __init__(self, span: int = 30, threshold: float = 3.0):
+        self.alpha = 2.0 / (span + 1)
+        self.threshold = threshold
+        self.min_periods = max(2, span // 4)
+        self.stats = RollingMoments(span)
+        self.last = None  # EWMA of the previous sample
+
+    def smooth(self, x: np.ndarray) -> np.ndarray:
+        """EWMA of ``x`` continuing from the previous chunk; the first sample seeds it."""
+        if not len(x):
+            return x.copy()
+        # the recursion restarted on the last smoothed value reproduces the unchunked one exactly
+        seeded = x if self.last is None else np.concatenate([[self.last], x])
+        y = pd.Series(seeded).ewm(alpha=self.alpha, adjust=False).mean().to_numpy()[len(seeded) - len(x):]
+        self.last = y[-1]
+        return y
+
+    def update(self, chunk) -> np.ndarray:
+        x = np.asarray(chunk, dtype=float)
+        residual = x - self.smooth(x)
+        count, _, var = self.stats.update(residual)
+        std = np.sqrt(var)
+        with np.errstate(invalid="ignore"):
+            hit = np.abs(residual) > self.threshold * np.where(std > 0, std, np.nan)
+        return (hit & (count >= self.min_periods)).astype(np.int8)
+
+
+CUSUM_BLOCK = 256
+CUSUM_JACOBI_PASSES = 4
+
+
+def cusum_scan(z: np.ndarray, drift: np.ndarray, threshold: np.ndarray, s_hi: np.ndarray,
+               s_lo: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Two-sided CUSUM with reset-on-alarm over ``z`` for ``P`` (drift, threshold) pairs.
+
+    ``s_hi``/``s_lo`` are the ``(P,)`` sums before ``z[0]``. Returns ``(P, n)`` alarms
+    and the sums after the last sample. Each step is the per-sample recursion
+    ``s = max(0, s + z - k)`` with its arithmetic unchanged, so the output is
+    identical to a plain loop.
+
+    The recursion runs on all blocks of ``CUSUM_BLOCK`` samples at once, one step at
+    a time, each block starting from its predecessor's end state of the previous
+    pass (zero at first). Blocks whose start state changed are re-run. Two
+    trajectories meet as soon as both sums hit zero or alarm together, which under
+    a positive drift happens within a few samples, so few passes converge. Whatever
+    is still unsettled after ``CUSUM_JACOBI_PASSES`` is finished block by block in
+    order.
+    """
+    drift = np.asarray(drift, dtype=float)
+    threshold = np.asarray(threshold, dtype=float)
+    pairs, n = len(drift), len(z)
+    b = CUSUM_BLOCK
+    if n < 4 * b:
+        pred = np.zeros((pairs, n), dtype=np.int8)
+        s_hi, s_lo = s_hi.copy(), s_lo.copy()
+        zl = z.tolist()
+        for p in range(pairs):
+            s_hi[p], s_lo[p] = _cusum_steps(zl, drift[p], threshold[p], s_hi[p], s_lo[p], pred[p])
+        return pred, s_hi, s_lo
+
+    nblocks = -(-n // b)
+    tail = n - (nblocks - 1) * b  # valid samples in the last block
+    zb = np.zeros(nblocks * b)
+    zb[:n] = z
+    zb = zb.reshape(nblocks, b)
+    zt_major = np.ascontiguousarray(zb.T)  # step t of every block is one contiguous row
+    k, h = drift[:, None], threshold[:, None]
+    start_hi = np.zeros((pairs, nblocks))
+    start_lo = np.zeros((pairs, nblocks))
+    start_hi[:, 0], start_lo[:, 0] = s_hi, s_lo
+    end_hi = np.zeros((pairs, nblocks))
+    end_lo = np.zeros((pairs, nblocks))
+    pred = np.zeros((pairs, nblocks, b), dtype=np.int8)
+
+    active = np.arange(nblocks)
+    for _ in range(CUSUM_JACOBI_PASSES):
+        zs = zt_major if len(active) == nblocks else zt_major[:, active]
+        sh, sl = start_hi[:, active].copy(), start_lo[:, active].copy()
+        alarms = np.zeros((pairs, b, len(active)), dtype=np.int8)
+        last = active[-1] == nblocks - 1
+        for t in range(b):
+            zt = zs[t]
+            sh = np.fmax(0.0, sh + zt - k)
+            sl = np.fmax(0.0, sl - zt - k)
+            hit = (sh > h) | (sl > h)
+            if hit.any():
+                alarms[:, t] = hit
+                sh[hit] = 0.0
+                sl[hit] = 0.0
+            if last and t == tail - 1:
+                # the padding after the last sample must not move the final state
+                last_hi, last_lo = sh[:, -1].copy(), sl[:, -1].copy()
+        if last:
+            sh[:, -1], sl[:, -1] = last_hi, last_lo
+        pred[:, active] = alarms.transpose(0, 2, 1)
+        end_hi[:, active], end_lo[:, active] = sh, sl
+        src = active[active < nblocks - 1]
+        moved = ((end_hi[:, src] != start_hi[:, src + 1]) | (end_lo[:, src] != start_lo[:, src + 1])).any(axis=0)
+        active = src[moved] + 1
+        start_hi[:, active], start_lo[:, active] = end_hi[:, active - 1], end_lo[:, active - 1]
+        if not len(active):
+            break
+
+    # long unsettled stretches (a sustained shift that keeps both trajectories apart)
+    pending = active.tolist()
+    zl = zb.ravel().tolist() if pending else []
+    for p in range(pairs):
+        todo = list(pending)
+        while todo:
+            q = todo.pop(0)
+            while True:
+                width = tail if q == nblocks - 1 else b
+                row = np.zeros(b, dtype=np.int8)
+                end_hi[p, q], end_lo[p, q] = _cusum_steps(zl[q * b:q * b + width], drift[p], threshold[p],
+                                                          start_hi[p, q], start_lo[p, q], row)
+                pred[p, q] = row
+                if q + 1 == nblocks or (end_hi[p, q], end_lo[p, q]) == (start_hi[p, q + 1], start_lo[p, q + 1]):
+                    break
+                q += 1
+                start_hi[p, q], start_lo[p, q] = end_hi[p, q - 1], end_lo[p, q - 1]
+                if todo and todo[0] == q:
+                    todo.pop(0)
+    return pred.reshape(pairs, -1)[:, :n], end_hi[:, -1].copy(), end_lo[:, -1].copy()
+
+
+def _cusum_steps(zl: list, k: float, h: float, s_hi: float, s_lo: float, pred: np.ndarray) -> tuple[float, float]:
+    s_hi, s_lo = float(s_hi), float(s_lo)
+    for i, zi in enumerate(zl):
+        s_hi = max(0.0, s_hi + zi - k)
+        s_lo = max(0.0, s_lo - zi - k)
+        if s_hi > h or s_lo > h:
+            pred[i] = 1
+            s_hi = s_lo = 0.0
+    return s_hi, s_lo
+
+
+class CusumBank(Detector):
+    """Two-sided CUSUMs on ``(x - mu) / sigma`` for many ``(drift, threshold)`` pairs.
+
+    Both sums of a pair reset after its alarm. ``mu`` and ``sigma`` are the
+    in-control reference and must be known before the stream starts; the first
+    sample of the stream only initializes the sums. ``update`` returns a
+    ``(len(pairs), len(chunk))`` array, one row per pair, computed by
+    :func:`cusum_scan`.
+    """
+
+    def __init__(self, mu: float, sigma: float, pairs):
+        self.mu = mu
+        self.sigma = sigma if sigma else 1.0
+        self.pairs = [(float(k), float(h)) for k, h in pairs]
+        self.drift = np.array([k for k, _ in self.pairs])
+        self.threshold = np.array([h for _, h in self.pairs])
+        self.s_hi = np.zeros(len(self.pairs))
+        self.s_lo = np.zeros(len(self.pairs))
+        self.started = False
+
+    def update(self, chunk) -> np.ndarray:
+        z = (np.asarray(chunk, dtype=float) - self.mu) / self.sigma
+        out = np.zeros((len(self.pairs), len(z)), dtype=np.int8)
+        i0 = 0
+        if not self.started and len(z):
+            self.started = True
+            i0 = 1
+        out[:, i0:], self.s_hi, self.s_lo = cusum_scan(z[i0:], self.drift, self.threshold, self.s_hi, self.s_lo)
+        return out
+
+
+class Cusum(CusumBank):
+    """Single-pair :class:`CusumBank`; ``update`` returns a 1-D array."""
+
+    def __init__(self, mu: float, sigma: float, drift: float = 0.5, threshold: float = 5.0):
+        super().__init__(mu, sigma, [(drift, threshold)])
+
+    @classmethod
+    def fit(cls, values, drift: float = 0.5, threshold: float = 5.0) -> "Cusum":
+        v = np.asarray(values, dtype=float)
+        return cls(float(np.mean(v)), float(np.std(v, ddof=0)), drift, threshold)
+
+    def update(self, chunk) -> np.ndarray:
+        return super().update(chunk)[0]
+
+
+class Threshold(Detector):
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+
+    def update(self, chunk) -> np.ndarray:
+        return (np.asarray(chunk, dtype=float) > self.threshold).astype(np.int8)
+
+
+def slo_threshold(scenario: dict | None, metric: str, default: float = 250.0) -> float:
+    """Static threshold for ``metric`` from a scenario's SLO: ``<metric>_p99``, then ``<metric>``."""
+    slo = (scenario or {}).get("evaluation", {}).get("slo", {})
+    return float(slo.get(f"{metric}_p99", 0)) or float(slo.get(metric, 0)) or default
+
+
+COMBINERS = ("any", "majority", "weighted")
+
+
+def combine(preds: np.ndarray, how: str, weights=None, share: float = 0.5) -> np.ndarray:
+    """Ensemble vote over stacked ``(members, n)`` 0/1 predictions.
+
+    ``any`` alarms when one member does, ``majority`` when more than half do, and
+    ``weighted`` when the alarming members carry more than ``share`` of the total
+    weight (equal weights and ``share=0.5`` are the majority vote).
+    """
+    p = np.asarray(preds, dtype=bool)
+    if how == "any":
+        out = p.any(axis=0)
+    elif how == "majority":
+        out = 2 * p.sum(axis=0) > len(p)
+    elif how == "weighted":
+        w = np.ones(len(p)) if weights is None else np.asarray(weights, dtype=float)
+        out = w @ p > share * w.sum()
+    else:
+        raise ValueError(f"unknown combiner {how!r} (expected one of {', '.join(COMBINERS)})")
+    return out.astype(np.int8)
+
+
+def detect_file(detector: Detector, inp: Path, out: Path, metric: str, chunk_rows: int = CHUNK_ROWS) -> int:
+    """Stream ``metric`` of the trace at ``inp`` through ``detector`` into a ``ts, t_s, pred`` file."""
+    rows = 0
+    with TraceWriter(out) as w:
+        for df in iter_trace(inp, ["ts", "t_s", metric], chunk_rows):
+            pred = detector.update(df[metric].to_numpy(dtype=float))
+            w.write(df[["ts", "t_s"]].assign(pred=pred.astype(int)))
+            rows += len(df)
+    return rows
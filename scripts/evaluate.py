@@ -2,45 +2,55 @@
 from __future__ import annotations
 import argparse
 from pathlib import Path
+from typing import Iterator
 import numpy as np
 import pandas as pd
 import yaml
+from intervals import (PointTimes, coalesce, column_runs, confusion, dilate_runs, event_metrics,
+                       ground_truth_intervals, index_runs, runs)
+from sketch import DEFAULT_REL_ERROR, QuantileSketch, save_sketches
+from telemetry import profiled
+from traceio import iter_trace, read_trace
 
 def load_yaml(p: Path) -> dict:
     return yaml.safe_load(p.read_text(encoding="utf-8"))
 
-def dilate(mask: np.ndarray, k: int) -> np.ndarray:
-    if k <= 0:
-        return mask
-    m = mask.copy()
-    for _ in range(k):
-        left = np.concatenate(([False], m[:-1]))
-        right = np.concatenate((m[1:], [False]))
-        m = m | left | right
-    return m
-
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--scenario", "-s", type=Path, required=True)
-    ap.add_argument("--data", "-d", type=Path, required=True)
-    ap.add_argument("--pred", "-p", type=Path)
-    ap.add_argument("--out", "-o", type=Path)
-    args = ap.parse_args()
+def node_tails(nodes: pd.DataFrame, warmup: int, targets: list[str]) -> pd.DataFrame:
+    """Per-node p99/p99.9 from a long per-node trace, one vectorized pass per metric.
 
-    sc = load_yaml(args.scenario)
-    df = pd.read_csv(args.data, parse_dates=["ts"])
-    warmup = int(sc["dataset"].get("warmup_s", 0))
-    x = df[df["t_s"] >= warmup].copy()
+    Rows are arranged into a ``(time, node)`` matrix and the percentiles are taken
+    along the time axis, so the cost does not grow with a Python loop over nodes.
+    """
+    node_col = nodes["node"].astype("category")
+    ids = node_col.cat.categories
+    codes = node_col.cat.codes.to_numpy()
+    k = len(ids)
+    if len(nodes) % k:
+        raise ValueError("per-node trace does not have one row per node for every timestamp")
+    order = None
+    grid = codes.reshape(-1, k)
+    if not ((grid == grid[0]).all() and len(np.unique(grid[0])) == k):
+        ts = nodes["ts"].to_numpy() if "ts" in nodes else nodes["t_s"].to_numpy()
+        order = np.lexsort((codes, ts))
+        grid = codes[order].reshape(-1, k)
+    cols = grid[0]
 
-    targets = sc.get("evaluation", {}).get("tails", {}).get("p99_targets", ["latency_ms"])
-    p99_map, p999_map = {}, {}
+    t = nodes["t_s"].to_numpy()
+    t = (t if order is None else t[order]).reshape(-1, k)[:, 0]
+    keep = t >= warmup
+    out = pd.DataFrame({"node": ids[cols]})
     for m in targets:
-        v = x[m].astype(float)
-        p99_map[m] = float(np.percentile(v, 99))
-        p999_map[m] = float(np.percentile(v, 99.9))
+        v = nodes[m].to_numpy(dtype=float)
+        mat = (v if order is None else v[order]).reshape(-1, k)[keep]
+        p99, p999 = np.percentile(mat, [99, 99.9], axis=0)
+        out[f"p99_{m}"] = np.round(p99, 3)
+        out[f"p99_9_{m}"] = np.round(p999, 3)
+    return out
 
-    err = float(x["error_rate_pct"].mean())
 
+def report_row(sc: dict, err: float, p99_map: dict, p999_map: dict, tail_mode: str, detection: dict,
+               head: dict | None = None) -> dict:
+    """One report row: availability, SLO verdict, detection metrics and tails, in report column order."""
     av = sc.get("evaluation", {}).get("availability", None)
     A = MTBF = MTTR = None
     if av:
@@ -58,41 +68,283 @@ def main():
         elif k == "error_rate_pct":
             slo_ok &= (err <= float(v))
 
-    gt = sc["ground_truth"]["positive_interval_s"]
-    tol = int(sc.get("evaluation", {}).get("detection", {}).get("window_tolerance_s", 0))
-    t = x["t_s"].to_numpy()
-    gt_mask = (t >= gt[0]) & (t <= gt[1])
-    gt_mask = dilate(gt_mask, tol)
-
-    if args.pred:
-        pr = pd.read_csv(args.pred, parse_dates=["ts"])
-        pr = pr[pr["t_s"] >= warmup]
-        y = pr["pred"].to_numpy().astype(bool)
-    else:
-        y = np.zeros_like(gt_mask, dtype=bool)
-
-    tp = int(np.sum(y & gt_mask))
-    fp = int(np.sum(y & ~gt_mask))
-    fn = int(np.sum(~y & gt_mask))
-    precision = tp / (tp + fp) if (tp + fp) else 0.0
-    recall = tp / (tp + fn) if (tp + fn) else 0.0
-    f1 = 2 * precision * recall / (precision + recall) if (precision + recall) else 0.0
-
     row = {
         "scenario_id": sc["id"],
         "seed": sc["reproducibility"]["seed"],
+        **(head or {}),
         "A": round(A, 6) if A is not None else "NA",
         "MTBF_s": MTBF if MTBF is not None else "NA",
         "MTTR_s": MTTR if MTTR is not None else "NA",
         "error_rate_pct": round(err, 4),
         "SLO_pass": bool(slo_ok),
+        **detection,
+    }
+    for m in p99_map:
+        row[f"p99_{m}"] = round(p99_map[m], 3)
+        row[f"p99_9_{m}"] = round(p999_map[m], 3)
+    row["tail_mode"] = tail_mode
+    return row
+
+
+def detection_metrics(t, events: np.ndarray, alarms: np.ndarray, tol: int) -> dict:
+    """Sample-level precision/recall/F1 and event-level metrics of one alarm run set."""
+    tp, fp, fn = confusion(dilate_runs(events, tol, len(t)), alarms)
+    precision = tp / (tp + fp) if (tp + fp) else 0.0
+    recall = tp / (tp + fn) if (tp + fn) else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if (precision + recall) else 0.0
+    return {
         "precision": round(precision, 4),
         "recall": round(recall, 4),
         "f1": round(f1, 4),
+        **event_metrics(t, events, alarms, tol),
     }
+
+
+def evaluate_frame(sc: dict, df: pd.DataFrame, pred=None, head: dict | None = None) -> dict:
+    """Report row of a trace held in memory, with exact tails; ``pred`` is aligned with ``df``'s rows."""
+    warmup = int(sc["dataset"].get("warmup_s", 0))
+    targets = sc.get("evaluation", {}).get("tails", {}).get("p99_targets", ["latency_ms"])
+    tol = int(sc.get("evaluation", {}).get("detection", {}).get("window_tolerance_s", 0))
+    post = df["t_s"].to_numpy() >= warmup
+    x = df[post]
+    p99_map, p999_map = {}, {}
     for m in targets:
-        row[f"p99_{m}"] = round(p99_map[m], 3)
-        row[f"p99_9_{m}"] = round(p999_map[m], 3)
+        v = x[m].astype(float)
+        p99_map[m] = float(np.percentile(v, 99))
+        p999_map[m] = float(np.percentile(v, 99.9))
+    err = float(x["error_rate_pct"].mean())
+
+    t = x["t_s"].to_numpy()
+    events = index_runs(t, ground_truth_intervals(sc))
+    if pred is not None:
+        alarms = runs(np.asarray(pred)[post].astype(bool))
+    else:
+        alarms = np.empty((0, 2), dtype=np.int64)
+    return report_row(sc, err, p99_map, p999_map, "exact", detection_metrics(t, events, alarms, tol), head)
+
+
+class RowReader:
+    """Rows of a chunked trace handed out in chunks of any size, counting what has been read."""
+
+    def __init__(self, chunks: Iterator[pd.DataFrame]):
+        self.chunks = chunks
+        self.buf: pd.DataFrame | None = None
+        self.rows = 0
+
+    def take(self, k: int) -> pd.DataFrame:
+        """The next ``k`` rows; fewer only once the file has run out."""
+        parts, got = [], 0
+        while got < k:
+            if self.buf is None or not len(self.buf):
+                self.buf = next(self.chunks, None)
+                if self.buf is None:
+                    break
+            parts.append(self.buf.iloc[:k - got])
+            self.buf = self.buf.iloc[k - got:]
+            got += len(parts[-1])
+        self.rows += got
+        return pd.concat(parts) if len(parts) > 1 else (parts[0] if parts else pd.DataFrame())
+
+    def rest(self) -> int:
+        """Read what is left and return its row count."""
+        left = len(self.buf) if self.buf is not None else 0
+        left += sum(len(c) for c in self.chunks)
+        self.buf = None
+        self.rows += left
+        return left
+
+
+def stream_pass(data: Path, pred: Path | None, sc: dict, targets: list[str], rel_error: float,
+                chunk_rows: int):
+    """One chunked pass over the trace (and predictions) in bounded memory.
+
+    Returns per-metric sketches of the post-warmup tails, the mean error rate,
+    ground-truth and alarm runs, and the sample times event metrics need. The
+    predictions must cover the trace row for row, as in exact mode.
+    """
+    warmup = int(sc["dataset"].get("warmup_s", 0))
+    iv = ground_truth_intervals(sc)
+    sketches = {m: QuantileSketch(rel_error) for m in targets}
+    err_sum = 0.0
+    n = 0
+    ev_parts, al_parts, marks = [], [], []
+    cols = list(dict.fromkeys(["t_s", "error_rate_pct", *targets]))
+    chunks = iter_trace(data, cols, chunk_rows)
+    preds = RowReader(iter_trace(pred, ["t_s", "pred"], chunk_rows)) if pred else None
+    total = 0
+    for chunk in chunks:
+        if preds is not None:
+            pc = preds.take(len(chunk))
+            if len(pc) < len(chunk):
+                rows = total + len(chunk) + sum(len(c) for c in chunks)
+                raise SystemExit(f"{pred}: {preds.rows} rows, trace {data} has {rows}")
+            if not np.array_equal(pc["t_s"].to_numpy(), chunk["t_s"].to_numpy()):
+                raise SystemExit(f"{pred}: t_s differs from trace {data} in rows {total}-{total + len(chunk) - 1}")
+        total += len(chunk)
+        keep = chunk["t_s"].to_numpy() >= warmup
+        x = chunk[keep]
+        t = x["t_s"].to_numpy()
+        for m in targets:
+            sketches[m].add(x[m].to_numpy(dtype=float))
+        err_sum += float(x["error_rate_pct"].sum())
+        ev = index_runs(t, iv)
+        parts = [ev]
+        if preds is not None:
+            y = pc["pred"].to_numpy()[pc["t_s"].to_numpy() >= warmup].astype(bool)
+            al = runs(y)
+            al_parts.append(al + n)
+            parts.append(al)
+        for r in parts:
+            marks.append((r[:, 0] + n, t[r[:, 0]]))
+        ev_parts.append(ev + n)
+        n += len(t)
+    if preds is not None and preds.rest():
+        raise SystemExit(f"{pred}: {preds.rows} rows, trace {data} has {total}")
+    empty = np.empty((0, 2), dtype=np.int64)
+    events = coalesce(np.concatenate(ev_parts)) if ev_parts else empty
+    alarms = coalesce(np.concatenate(al_parts)) if al_parts else empty
+    index = np.concatenate([m[0] for m in marks]) if marks else np.empty(0, dtype=np.int64)
+    times = np.concatenate([m[1] for m in marks]) if marks else np.empty(0)
+    return sketches, (err_sum / n if n else float("nan")), events, alarms, PointTimes(n, index, times)
+
+
+def prediction_sets(pr: pd.DataFrame, label: str) -> dict[str, np.ndarray]:
+    """Every prediction column of a file: ``pred`` keeps ``label``, ``pred_<name>`` becomes ``label:<name>``."""
+    return {(label if c == "pred" else f"{label}:{c[5:]}"): pr[c].to_numpy().astype(bool)
+            for c in pr.columns if c == "pred" or c.startswith("pred_")}
+
+
+def evaluate_manifest(manifest: Path) -> pd.DataFrame:
+    """Score every run of a manifest; each trace and prediction file is read once.
+
+    A manifest is YAML with a ``runs`` list. Each run names a ``scenario``, its ``data``
+    trace and ``preds`` (``{detector: path}`` or a list of paths, labelled by file stem),
+    plus an optional ``seed`` to report instead of the scenario's. Relative paths are
+    resolved against the manifest's directory. All predictions on one trace are stacked
+    into a matrix and their alarm runs extracted in a single vectorized pass.
+    """
+    doc = load_yaml(manifest)
+    base = manifest.parent
+    groups: dict[tuple[Path, Path], list[dict]] = {}
+    for run in doc["runs"]:
+        key = ((base / run["scenario"]).resolve(), (base / run["data"]).resolve())
+        groups.setdefault(key, []).append(run)
+
+    rows = []
+    for (scenario, data), group in groups.items():
+        sc = load_yaml(scenario)
+        warmup = int(sc["dataset"].get("warmup_s", 0))
+        targets = sc.get("evaluation", {}).get("tails", {}).get("p99_targets", ["latency_ms"])
+        tol = int(sc.get("evaluation", {}).get("detection", {}).get("window_tolerance_s", 0))
+        df = read_trace(data)
+        x = df[df["t_s"] >= warmup]
+        p99_map = {m: float(np.percentile(x[m].astype(float), 99)) for m in targets}
+        p999_map = {m: float(np.percentile(x[m].astype(float), 99.9)) for m in targets}
+        err = float(x["error_rate_pct"].mean())
+        t = x["t_s"].to_numpy()
+        events = index_runs(t, ground_truth_intervals(sc))
+
+        heads, cols = [], []
+        for run in group:
+            preds = run.get("preds") or {}
+            if isinstance(preds, list):
+                preds = {Path(p).stem: p for p in preds}
+            seed = run.get("seed", sc["reproducibility"]["seed"])
+            if not preds:
+                heads.append({"seed": seed, "detector": "none"})
+                cols.append(np.zeros(len(t), dtype=bool))
+            for label, path in preds.items():
+                pr = read_trace((base / path).resolve())
+                pr = pr[pr["t_s"] >= warmup]
+                if len(pr) != len(t):
+                    raise SystemExit(f"{path}: {len(pr)} post-warmup rows, trace {data} has {len(t)}")
+                for name, y in prediction_sets(pr, label).items():
+                    heads.append({"seed": seed, "detector": name})
+                    cols.append(y)
+        for head, alarms in zip(heads, column_runs(np.column_stack(cols))):
+            rows.append(report_row(sc, err, p99_map, p999_map, "exact",
+                                   detection_metrics(t, events, alarms, tol), head))
+    return pd.DataFrame(rows)
+
+
+def main(argv: list[str] | None = None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scenario", "-s", type=Path)
+    ap.add_argument("--data", "-d", type=Path)
+    ap.add_argument("--pred", "-p", type=Path)
+    ap.add_argument("--out", "-o", type=Path)
+    ap.add_argument("--nodes-data", type=Path,
+                    help="Per-node trace from generate.py --nodes-out; adds the highest per-node p99 to the report")
+    ap.add_argument("--nodes-out", type=Path, help="Write the per-node tail table here")
+    ap.add_argument("--tails", choices=["exact", "sketch"], default="exact",
+                    help="exact: load the trace and sort (default); sketch: one chunked pass with a "
+                         "mergeable quantile sketch, for traces larger than memory")
+    ap.add_argument("--sketch-error", type=float, default=DEFAULT_REL_ERROR,
+                    help="Relative error bound of sketched quantiles")
+    ap.add_argument("--chunk-rows", type=int, default=1 << 20, help="Rows per chunk in sketch mode")
+    ap.add_argument("--sketch-out", type=Path,
+                    help="Write the tail sketches as JSON, to merge across shards or seeds with sketch.py")
+    ap.add_argument("--manifest", "-m", type=Path,
+                    help="YAML manifest of (scenario, data, predictions) runs, scored in one process "
+                         "into a single table (default --out: eval/reports/batch_report.csv)")
+    ap.add_argument("--profile", type=Path, metavar="MANIFEST",
+                    help="Append this stage's time, memory and throughput to a JSON run manifest")
+    args = ap.parse_args(argv)
+
+    if args.manifest:
+        if args.tails != "exact" or args.nodes_data or args.sketch_out or args.profile:
+            ap.error("--manifest supports exact tails only, without --nodes-data, --sketch-out or --profile")
+        table = evaluate_manifest(args.manifest)
+        outp = args.out or Path("eval/reports") / "batch_report.csv"
+        outp.parent.mkdir(parents=True, exist_ok=True)
+        table.to_csv(outp, index=False)
+        print(f"Wrote {outp} ({len(table)} rows)")
+        return
+    if args.scenario is None or args.data is None:
+        ap.error("--scenario and --data are required unless --manifest is given")
+
+    sc = load_yaml(args.scenario)
+    warmup = int(sc["dataset"].get("warmup_s", 0))
+    targets = sc.get("evaluation", {}).get("tails", {}).get("p99_targets", ["latency_ms"])
+    sketches = None
+
+    with profiled(args.profile, "evaluate") as stage:
+        if args.tails == "sketch":
+            tol = int(sc.get("evaluation", {}).get("detection", {}).get("window_tolerance_s", 0))
+            p99_map, p999_map = {}, {}
+            sketches, err, events, alarms, t = stream_pass(args.data, args.pred, sc, targets, args.sketch_error,
+                                                           args.chunk_rows)
+            for m in targets:
+                p99_map[m], p999_map[m] = sketches[m].quantile([0.99, 0.999]).tolist()
+            tail_mode = f"sketch:{args.sketch_error:g}"
+            row = report_row(sc, err, p99_map, p999_map, tail_mode, detection_metrics(t, events, alarms, tol))
+            stage.rows = len(t)
+        else:
+            df = read_trace(args.data)
+            pred = None
+            if args.pred:
+                pr = read_trace(args.pred)
+                if len(pr) != len(df):
+                    raise SystemExit(f"{args.pred}: {len(pr)} rows, trace {args.data} has {len(df)}")
+                pred = pr["pred"].to_numpy()
+            row = evaluate_frame(sc, df, pred)
+            stage.rows = int((df["t_s"] >= warmup).sum())
+            if args.sketch_out:
+                x = df[df["t_s"] >= warmup]
+                sketches = {m: QuantileSketch(args.sketch_error).add(x[m].to_numpy(dtype=float)) for m in targets}
+
+        if args.sketch_out:
+            save_sketches(sketches, args.sketch_out, {"scenario_id": sc["id"], "seed": row["seed"]})
+
+        if args.nodes_data:
+            per_node = node_tails(read_trace(args.nodes_data), warmup, targets)
+            for m in targets:
+                top = int(per_node[f"p99_{m}"].to_numpy().argmax())
+                row[f"max_node_p99_{m}"] = float(per_node[f"p99_{m}"].iloc[top])
+                row[f"worst_node_{m}"] = str(per_node["node"].iloc[top])
+            if args.nodes_out:
+                args.nodes_out.parent.mkdir(parents=True, exist_ok=True)
+                per_node.to_csv(args.nodes_out, index=False)
 
     outp = args.out or Path("eval/reports") / f"{sc['id']}_report.csv"
     outp.parent.mkdir(parents=True, exist_ok=True)
@@ -1,82 +1,395 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 import argparse
-import random
+import math
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime, timezone
+from typing import Iterator
 import yaml
 import numpy as np
 import pandas as pd
+from intervals import fault_intervals, fault_list
+from cache import content_key, fetch, file_digest, store
+from ingest import ingest_scenario, scenario_source
+from telemetry import profiled
+from traceio import TraceWriter, date_format_for, iter_trace, write_trace_chunks
+
+TS0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+# Noise is drawn per shard of this many rows, so it is part of a trace's identity
+# together with the seed. Changing it changes every generated trace.
+SHARD_ROWS = 1 << 16
+# rows drawn and discarded per step when a chunk starts past its shard stream
+SKIP_ROWS = 1 << 12
+
 
 def load_yaml(p: Path) -> dict:
     return yaml.safe_load(p.read_text(encoding="utf-8"))
 
+
 def iso(ts0: datetime, t: np.ndarray) -> pd.Series:
     return pd.to_datetime(ts0) + pd.to_timedelta(t, unit="s")
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--scenario", "-s", type=Path, required=True)
-    ap.add_argument("--out", "-o", type=Path, required=True)
-    args = ap.parse_args()
-
-    sc = load_yaml(args.scenario)
-    prof = load_yaml((args.scenario.parent / sc["system_profile"]).resolve())
-    seed = int(sc["reproducibility"]["seed"])
-    random.seed(seed)
-    np.random.seed(seed)
 
+def n_samples(sc: dict, prof: dict) -> int:
     hz = int(prof.get("sampling_defaults_hz", 1))
     dur = int(sc["dataset"]["duration_s"])
-    t = np.arange(0, dur, 1 / hz)
-    ts0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    # same length np.arange(0, dur, 1 / hz) would produce
+    return int(math.ceil(dur / (1 / hz)))
+
+
+def shard_rngs(seed: int, shard: int, nodes: bool = False) -> list[np.random.Generator]:
+    """Latency/throughput/error-rate generators of one time shard.
+
+    Shard ``i`` covers rows ``[i * SHARD_ROWS, (i + 1) * SHARD_ROWS)`` and draws from its
+    own ``SeedSequence(seed, spawn_key=(i,))``, so shards can be produced in any order or
+    process. The single-series trace uses its first three children and per-node
+    matrices the next three, so the two never share draws.
+    """
+    children = np.random.SeedSequence(seed, spawn_key=(shard,)).spawn(6)
+    return [np.random.default_rng(c) for c in (children[3:] if nodes else children[:3])]
+
+
+class ShardStream:
+    """One shard's noise, drawn front to back in the pieces that are asked for.
+
+    Successive draws from a generator concatenate to a single draw of their total size,
+    so ``take`` returns exactly the rows one draw of the whole shard would hold, while
+    holding only the rows requested. ``width`` adds a node axis: ``(rows, width)``
+    time-major draws.
+    """
+
+    def __init__(self, seed: int, shard: int, width: int | None):
+        self.shard = shard
+        self.width = width
+        self.rngs = shard_rngs(seed, shard, width is not None)
+        self.pos = 0
+
+    def _draw(self, rows: int) -> list[np.ndarray]:
+        size = rows if self.width is None else (rows, self.width)
+        return [g.standard_normal(size) for g in self.rngs]
+
+    def take(self, a: int, b: int) -> list[np.ndarray]:
+        """Rows ``[a, b)`` of the shard; ``a`` must not precede the rows already taken."""
+        step = max(b - a, SKIP_ROWS)
+        while self.pos < a:
+            k = min(step, a - self.pos)
+            self._draw(k)
+            self.pos += k
+        self.pos = b
+        return self._draw(b - a)
+
+
+# the shard stream each (seed, width) is currently reading, so consecutive chunks continue
+# where the previous one stopped instead of redrawing their shard from its start
+_streams: dict[tuple[int, int | None], ShardStream] = {}
+
+
+def noise(seed: int, i0: int, i1: int, width: int | None = None) -> list[np.ndarray]:
+    """Rows ``[i0, i1)`` of the shard noise, independent of how the trace is chunked.
+
+    Rendering a trace front to back draws every shard once, whatever the chunk size;
+    a chunk that starts behind its shard's stream restarts the shard.
+    """
+    parts = []
+    for shard in range(i0 // SHARD_ROWS, (i1 - 1) // SHARD_ROWS + 1):
+        s0 = shard * SHARD_ROWS
+        a, b = max(i0, s0) - s0, min(i1, s0 + SHARD_ROWS) - s0
+        stream = _streams.get((seed, width))
+        if stream is None or stream.shard != shard or stream.pos > a:
+            stream = _streams[(seed, width)] = ShardStream(seed, shard, width)
+        parts.append(stream.take(a, b))
+    return [np.concatenate(p) if len(parts) > 1 else p[0] for p in zip(*parts)]
+
+
+def node_weights(f: dict, nodes: list[dict]) -> np.ndarray:
+    """0/1 weight per profile node: 1 where the fault targets it.
+
+    ``parameters.affected_nodes`` / ``affected_component`` select node ids and
+    ``parameters.affected_roles`` selects roles; a fault naming neither hits every node.
+    """
+    params = f.get("parameters") or {}
+    ids = {n["id"] for n in nodes}
+    want = set(params.get("affected_nodes") or [])
+    if params.get("affected_component"):
+        want.add(params["affected_component"])
+    roles = set(params.get("affected_roles") or [])
+    unknown = sorted(want - ids)
+    if unknown:
+        raise ValueError(f"failure targets nodes not in the system profile: {', '.join(unknown)}")
+    if not want and not roles:
+        return np.ones(len(nodes))
+    return np.array([n["id"] in want or n["role"] in roles for n in nodes], dtype=float)
+
+
+def fault_effects(f: dict) -> tuple[float, float, float, float | None]:
+    """``(latency_add_ms, error_rate_add_pct, throughput_factor, tail_decay_s)`` of one fault."""
+    p = f.get("parameters") or {}
+    if f["type"] == "latency_spike":
+        return float(p["magnitude_ms"]), 0.2, 1.0, float(p.get("decay_s", f["duration_s"]))
+    if f["type"] == "node_crash":
+        return 250.0, 1.0, 0.6, None
+    if f["type"] == "network_partition":
+        return 300.0, 1.5, 0.5, None
+    if f["type"] == "slowdown":
+        drop = float(p.get("throughput_drop_pct", 25)) / 100.0
+        if not 0.0 <= drop <= 1.0:
+            raise ValueError(f"throughput_drop_pct must be within [0, 100], got {drop * 100:g}")
+        return float(p.get("magnitude_ms", 120)), 0.0, 1.0 - drop, None
+    if f["type"] == "corruption":
+        return 0.0, float(p.get("error_spike_pct", 1.0)), 1.0, None
+    return 0.0, 0.0, 1.0, None
+
+
+class Timeline:
+    """Every fault instance of a scenario as sorted interval arrays.
+
+    Overlapping faults stack: latency and error-rate offsets add up and throughput
+    factors multiply. Each effect keeps prefix sums over the start-sorted and the
+    end-sorted intervals, so the total at ``t`` is ``P_start[#starts <= t] - P_end[#ends < t]``:
+    two ``searchsorted`` calls per chunk whatever the number of faults, and a result
+    that depends only on ``t``, never on chunk boundaries. Throughput factors are summed
+    as logarithms; a factor of 0 has none, so those faults are counted in a fourth
+    prefix sum instead and zero the throughput wherever one is active. A ``latency_spike`` also
+    decays over ``decay_s`` after it ends; the most recently ended spike sets the tail.
+
+    With ``nodes`` the effects are weighted per node (see :func:`node_weights`) and
+    apply to ``(time, node)`` matrices.
+    """
+
+    def __init__(self, faults: list[dict], nodes: list[dict] | None = None):
+        width = 1 if nodes is None else len(nodes)
+        ivs, effects, weights, decays = [], [], [], []
+        for f in faults:
+            iv = fault_intervals(f)
+            lat, err, thr, decay = fault_effects(f)
+            w = np.ones(width) if nodes is None else node_weights(f, nodes)
+            ivs.append(iv)
+            effects.append(np.tile([lat, err, np.log(thr) if thr > 0 else 0.0, float(thr == 0)], (len(iv), 1)))
+            weights.append(np.tile(w, (len(iv), 1)))
+            decays.append(np.full(len(iv), np.nan if decay is None else decay))
+        iv = np.concatenate(ivs) if ivs else np.empty((0, 2))
+        eff = np.concatenate(effects) if effects else np.empty((0, 4))
+        w = np.concatenate(weights) if weights else np.empty((0, width))
+        decay = np.concatenate(decays) if decays else np.empty(0)
 
+        contrib = eff[:, :, None] * w[:, None, :]
+        by_start = np.argsort(iv[:, 0], kind="stable")
+        by_end = np.argsort(iv[:, 1], kind="stable")
+        zero = np.zeros((1, 4, width))
+        self.starts = iv[by_start, 0]
+        self.ends = iv[by_end, 1]
+        self.p_start = np.concatenate([zero, np.cumsum(contrib[by_start], axis=0)])
+        self.p_end = np.concatenate([zero, np.cumsum(contrib[by_end], axis=0)])
+
+        spike = ~np.isnan(decay)
+        order = np.argsort(iv[spike, 1], kind="stable")
+        self.tail_end = iv[spike, 1][order]
+        self.tail_decay = decay[spike][order]
+        self.tail_mag = (eff[spike, 0][:, None] * w[spike])[order]
+        self.aggregate = nodes is None
+
+    def apply(self, t: np.ndarray, latency: np.ndarray, throughput: np.ndarray, error_rate: np.ndarray) -> None:
+        """Add the fault effects at times ``t`` to the metric arrays in place."""
+        i = np.searchsorted(self.starts, t, side="right")
+        j = np.searchsorted(self.ends, t, side="left")
+        d = self.p_start[i] - self.p_end[j]
+        d[i == j] = 0.0  # no fault active: drop prefix-sum rounding residue
+        if self.aggregate:
+            d = d[..., 0]
+        latency += d[:, 0]
+        error_rate += d[:, 1]
+        throughput *= np.exp(d[:, 2])
+        throughput[d[:, 3] > 0.5] = 0.0  # at least one zero-factor fault active
+
+        if len(self.tail_end):
+            k = np.searchsorted(self.tail_end, t, side="left") - 1
+            rows = np.flatnonzero(k >= 0)
+            k = k[rows]
+            since = t[rows] - self.tail_end[k]
+            live = since <= self.tail_decay[k]
+            rows, k, since = rows[live], k[live], since[live]
+            tail = self.tail_mag[k] * np.exp(-since / self.tail_decay[k])[:, None]
+            latency[rows] += tail[:, 0] if self.aggregate else tail
+
+
+def simulate(sc: dict, prof: dict, t: np.ndarray, i0: int, i1: int, nodes: list[dict] | None = None):
+    """Latency, throughput and error rate at rows ``[i0, i1)`` (times ``t``) with the faults applied.
+
+    Without ``nodes`` the system is one series. With ``nodes`` every node gets a column of
+    a ``(rows, nodes)`` matrix, drawn from its own noise streams, with the throughput
+    nominal split evenly across nodes.
+    """
+    seed = int(sc["reproducibility"]["seed"])
+    k = None if nodes is None else len(nodes)
     lat_nom = float(prof["metrics"]["latency_ms"]["nominal"])
-    thr_nom = float(prof.get("metrics", {}).get("throughput_rps", {}).get("nominal", 200))
+    thr_nom = float(prof.get("metrics", {}).get("throughput_rps", {}).get("nominal", 200)) / (k or 1)
     err_nom = float(prof["metrics"]["error_rate_pct"]["nominal"])
 
-    latency = np.full_like(t, lat_nom, dtype=float) + np.random.normal(0, 5.0, size=t.size)
-    throughput = np.full_like(t, thr_nom, dtype=float) + np.random.normal(0, thr_nom * 0.03, size=t.size)
-    error_rate = np.clip(np.random.normal(err_nom, err_nom * 0.25, size=t.size), 0, None)
+    z_lat, z_thr, z_err = noise(seed, i0, i1, k)
+    latency = lat_nom + 5.0 * z_lat
+    throughput = thr_nom + thr_nom * 0.03 * z_thr
+    error_rate = np.clip(err_nom + err_nom * 0.25 * z_err, 0, None)
+    Timeline(fault_list(sc), nodes).apply(t, latency, throughput, error_rate)
+    return latency, throughput, error_rate
 
-    f = sc["failure"]
-    start = float(f["start_s"])
-    end = start + float(f["duration_s"])
-    mask = (t >= start) & (t <= end)
 
-    if f["type"] == "latency_spike":
-        mag = float(f["parameters"]["magnitude_ms"])
-        decay = float(f["parameters"].get("decay_s", f["duration_s"]))
-        latency[mask] += mag
-        tail = (t > end) & (t <= end + decay)
-        latency[tail] += mag * np.exp(-(t[tail] - end) / decay)
-        error_rate[mask] += 0.2
-    elif f["type"] == "node_crash":
-        latency[mask] += 250
-        error_rate[mask] += 1.0
-        throughput[mask] *= 0.6
-    elif f["type"] == "network_partition":
-        latency[mask] += 300
-        error_rate[mask] += 1.5
-        throughput[mask] *= 0.5
-    elif f["type"] == "slowdown":
-        mag = float(f["parameters"].get("magnitude_ms", 120))
-        drop = float(f["parameters"].get("throughput_drop_pct", 25)) / 100.0
-        latency[mask] += mag
-        throughput[mask] *= (1.0 - drop)
-    elif f["type"] == "corruption":
-        spike = float(f["parameters"].get("error_spike_pct", 1.0))
-        error_rate[mask] += spike
-
-    df = pd.DataFrame({
-        "ts": iso(ts0, t),
+def render_rows(sc: dict, prof: dict, i0: int, i1: int, per_node: bool = False):
+    """Rows ``[i0, i1)`` of the trace as a DataFrame.
+
+    With ``per_node`` the result is an ``(aggregate, per_node)`` pair. The aggregate is
+    the same single-series trace either way; ``per_node`` simulates every profile node
+    separately (see :func:`simulate`), so its node mean is not the aggregate. It is in
+    long format, time-major with one row per node.
+    """
+    hz = int(prof.get("sampling_defaults_hz", 1))
+    t = np.arange(i0, i1, dtype=float) * (1 / hz)
+    ts = iso(TS0, t)
+
+    latency, throughput, error_rate = simulate(sc, prof, t, i0, i1)
+    agg = pd.DataFrame({
+        "ts": ts,
         "t_s": t.astype(int),
         "latency_ms": latency,
         "error_rate_pct": error_rate,
         "throughput_rps": throughput
     })
-    args.out.parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(args.out, index=False)
+    if not per_node:
+        return agg
+
+    nodes = prof["nodes"]
+    k = len(nodes)
+    latency, throughput, error_rate = simulate(sc, prof, t, i0, i1, nodes)
+    long = pd.DataFrame({
+        "ts": np.repeat(ts.to_numpy(), k),
+        "t_s": np.repeat(t.astype(int), k),
+        "node": pd.Categorical.from_codes(np.tile(np.arange(k), i1 - i0), categories=[nd["id"] for nd in nodes]),
+        "latency_ms": latency.ravel(),
+        "error_rate_pct": error_rate.ravel(),
+        "throughput_rps": throughput.ravel()
+    })
+    return agg, long
+
+
+def generate_chunks(sc: dict, prof: dict, chunk_rows: int = 0, per_node: bool = False,
+                    workers: int = 1) -> Iterator:
+    """Yield the trace as consecutive chunks of at most ``chunk_rows`` rows.
+
+    ``chunk_rows <= 0`` yields the whole trace at once (or one shard per task when
+    ``workers > 1``). Chunks are rendered by :func:`render_rows`, on a process pool when
+    ``workers > 1``, and yielded in order; the concatenated output is the same for any
+    chunk size and worker count.
+    """
+    n = n_samples(sc, prof)
+    if chunk_rows <= 0:
+        chunk_rows = n if workers <= 1 else SHARD_ROWS
+    ranges = [(i0, min(i0 + chunk_rows, n)) for i0 in range(0, n, chunk_rows)]
+    if workers <= 1:
+        for i0, i1 in ranges:
+            yield render_rows(sc, prof, i0, i1, per_node)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: deque = deque()
+        for i0, i1 in ranges:
+            pending.append(pool.submit(render_rows, sc, prof, i0, i1, per_node))
+            # bounded look-ahead keeps memory flat when writing is slower than rendering
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def generation_inputs(sc: dict, prof: dict, scenario_path: Path | None = None) -> dict:
+    """Everything a generated trace depends on; hashed into the dataset cache key.
+
+    An ingested trace (``dataset.source: trace``) depends on the content of the
+    recorded export instead of the seed, faults and noise model.
+    """
+    here = Path(__file__).resolve().parent
+    if sc["dataset"].get("source") == "trace":
+        return {
+            "dataset": sc["dataset"],
+            "hz": int(prof.get("sampling_defaults_hz", 1)),
+            "source": file_digest(scenario_source(sc, scenario_path)),
+            "generator": {name: file_digest(here / name) for name in ("ingest.py", "traceio.py")},
+        }
+    return {
+        "dataset": sc["dataset"],
+        "failure": sc.get("failure"),
+        "failures": sc.get("failures"),
+        "seed": int(sc["reproducibility"]["seed"]),
+        "profile": prof,
+        "shard_rows": SHARD_ROWS,
+        "generator": {name: file_digest(here / name) for name in ("generate.py", "intervals.py", "traceio.py")},
+    }
+
+
+def main(argv: list[str] | None = None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scenario", "-s", type=Path, required=True)
+    ap.add_argument("--out", "-o", type=Path, required=True,
+                    help="Output trace (.csv, .npz or .parquet)")
+    ap.add_argument("--chunk-rows", type=int, default=0,
+                    help="Generate and write this many rows at a time (0 = whole trace at once)")
+    ap.add_argument("--workers", "-j", type=int, default=1,
+                    help="Render chunks on this many processes; output does not depend on it")
+    ap.add_argument("--nodes-out", type=Path,
+                    help="Also simulate every profile node and write the per-node series here (long format); "
+                         "--out is the same with or without it")
+    ap.add_argument("--no-cache", action="store_true",
+                    help="Always regenerate and do not store the result in the dataset cache")
+    ap.add_argument("--profile", type=Path, metavar="MANIFEST",
+                    help="Append this stage's time, memory and throughput to a JSON run manifest")
+    args = ap.parse_args(argv)
+    with profiled(args.profile, "generate") as stage:
+        generate_file(args, stage)
+
+
+def generate_file(args, stage) -> None:
+    """Generate (or fetch from the cache) the trace ``args`` describe, counting its rows on ``stage``."""
+    sc = load_yaml(args.scenario)
+    prof = load_yaml((args.scenario.parent / sc["system_profile"]).resolve())
+    hz = int(prof.get("sampling_defaults_hz", 1))
+    source = sc["dataset"].get("source", "synthetic")
+    if source == "live":
+        raise SystemExit(f"{sc['id']}: dataset.source 'live' cannot be generated; record it and ingest it as 'trace'")
+    if source == "trace" and args.nodes_out is not None:
+        raise SystemExit(f"{sc['id']}: --nodes-out needs a synthetic scenario")
+
+    outputs = {f"trace{args.out.suffix.lower()}": args.out}
+    if args.nodes_out is not None:
+        outputs[f"nodes{args.nodes_out.suffix.lower()}"] = args.nodes_out
+    key = None
+    if not args.no_cache:
+        key = content_key({**generation_inputs(sc, prof, args.scenario), "outputs": sorted(outputs)})
+        meta = fetch(key, outputs)
+        if meta is not None:
+            print(f"Reused cached dataset {key[:12]} for {sc['id']}")
+            # entries stored before row counts were recorded are counted from the file
+            stage.rows = meta["rows"] if "rows" in meta else sum(len(c) for c in iter_trace(args.out, ["t_s"]))
+            stage.info["cached"] = True
+            return
+
+    if source == "trace":
+        rows = write_trace_chunks(ingest_scenario(sc, args.scenario, hz), args.out, date_format_for(hz))
+    elif args.nodes_out is None:
+        rows = write_trace_chunks(generate_chunks(sc, prof, args.chunk_rows, workers=args.workers), args.out,
+                                  date_format_for(hz))
+    else:
+        rows = 0
+        with TraceWriter(args.out, date_format_for(hz)) as agg_w, \
+                TraceWriter(args.nodes_out, date_format_for(hz)) as node_w:
+            for agg, per_node in generate_chunks(sc, prof, args.chunk_rows, per_node=True, workers=args.workers):
+                agg_w.write(agg)
+                node_w.write(per_node)
+                rows += len(agg)
+
+    if key is not None:
+        store(key, outputs, meta={"scenario": sc["id"], "rows": rows})
+    stage.rows = rows
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
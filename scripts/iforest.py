@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""IsolationForest fitting, caching and scoring shared by the baseline CLI and the pipeline.
+
+Missing samples are forward filled (leading gaps take each feature's first valid
+value) before fitting and scoring, so a file scored chunk by chunk and a trace
+scored in memory give the same alarms and hit the same cached model.
+"""
+from __future__ import annotations
+import hashlib
+import tempfile
+from pathlib import Path
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import IsolationForest
+from cache import content_key, fetch, model_cache_dir, store
+from detectors import CHUNK_ROWS
+from traceio import TraceWriter, iter_trace
+
+FEATURES = ["latency_ms", "error_rate_pct"]
+
+
+class Filler:
+    """Forward fill across chunks; gaps before any valid value take ``seed``.
+
+    Seeded with each feature's first valid value this is ``ffill().bfill()`` of the
+    whole trace, one chunk at a time.
+    """
+
+    def __init__(self, seed: np.ndarray):
+        self.last = np.asarray(seed, dtype=float)
+
+    def __call__(self, X: np.ndarray) -> np.ndarray:
+        if not len(X):
+            return X
+        filled = pd.DataFrame(np.vstack([self.last, X])).ffill().to_numpy()[1:]
+        self.last = filled[-1]
+        return filled
+
+
+def training_rows(inp: Path, features: list[str], start: float, end: float,
+                  chunk_rows: int = CHUNK_ROWS) -> tuple[np.ndarray, np.ndarray]:
+    """Filled feature rows with ``start <= t_s < end``, and each feature's first valid value.
+
+    Reading stops once past ``end`` with every feature seen valid, so fitting on the
+    warmup touches only the head of a long trace.
+    """
+    first = np.full(len(features), np.nan)
+    before = np.full(len(features), np.nan)  # last valid value before ``start``
+    parts = []
+    for df in iter_trace(inp, ["t_s", *features], chunk_rows):
+        t = df["t_s"].to_numpy()
+        X = df[features].to_numpy(dtype=float)
+        valid = ~np.isnan(X)
+        todo = np.isnan(first) & valid.any(axis=0)
+        first[todo] = X[valid.argmax(axis=0)[todo], np.flatnonzero(todo)]
+        pre = t < start
+        if pre.any():
+            last = pd.DataFrame(X[pre]).ffill().to_numpy()[-1]
+            before = np.where(np.isnan(last), before, last)
+        parts.append(X[(t >= start) & (t < end)])
+        if len(t) and t[-1] >= end and not np.isnan(first).any():
+            break
+    X = np.concatenate(parts) if parts else np.empty((0, len(features)))
+    return Filler(np.where(np.isnan(before), first, before))(X), first
+
+
+def fit_model(X: np.ndarray, params: dict, n_jobs: int, meta: dict,
+              use_cache: bool = True) -> tuple[IsolationForest, str | None]:
+    """Fit ``IsolationForest(**params)`` on ``X``, or load it from the model cache.
+
+    The key covers the training matrix, the hyperparameters and the scikit-learn
+    version; ``n_jobs`` only changes how trees are built, not the model. Returns the
+    model and the cache key it was reused from, if any.
+    """
+    key = content_key({"model": "isoforest", "sklearn": sklearn.__version__, "params": params,
+                       "shape": X.shape, "data": hashlib.sha256(np.ascontiguousarray(X).tobytes()).hexdigest()})
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "model.joblib"
+        if use_cache and fetch(key, {path.name: path}, model_cache_dir()) is not None:
+            return joblib.load(path).set_params(n_jobs=n_jobs), key
+        model = IsolationForest(**params, n_jobs=n_jobs).fit(X)
+        if use_cache:
+            joblib.dump(model, path)
+            store(key, {path.name: path}, meta=meta, root=model_cache_dir())
+    return model, None
+
+
+def score_file(model: IsolationForest, inp: Path, out: Path, features: list[str], first: np.ndarray,
+               chunk_rows: int = CHUNK_ROWS) -> int:
+    """Score the trace in ``chunk_rows`` batches into a ``ts, t_s, pred`` file."""
+    fill = Filler(first)
+    rows = 0
+    with TraceWriter(out) as w:
+        for df in iter_trace(inp, ["ts", "t_s", *features], chunk_rows):
+            pred = model.predict(fill(df[features].to_numpy(dtype=float))) == -1
+            w.write(df[["ts", "t_s"]].assign(pred=pred.astype(int)))
+            rows += len(df)
+    return rows
+
+
+def predict_frame(df: pd.DataFrame, params: dict, features: list[str] = FEATURES, start: float = 0.0,
+                  end: float = np.inf, n_jobs: int = 1, use_cache: bool = True, meta: dict | None = None,
+                  chunk_rows: int = CHUNK_ROWS) -> np.ndarray:
+    """0/1 alarms of a model fit on the rows with ``start <= t_s < end`` of a trace held in memory."""
+    X = df[features].ffill().bfill().to_numpy(dtype=float)
+    t = df["t_s"].to_numpy()
+    train = X[(t >= start) & (t < end)]
+    if not len(train):
+        raise ValueError(f"no training rows with {start:g} <= t_s < {end:g}")
+    model, _ = fit_model(train, params, n_jobs, meta or {"scenario": "isoforest"}, use_cache)
+    step = max(chunk_rows, 1)
+    return np.concatenate([model.predict(X[i:i + step]) == -1 for i in range(0, len(X), step)]).astype(np.int8)
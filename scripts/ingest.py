@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""Ingest a recorded metric export as a ResilienceBench trace.
+
+Reads CSV or OpenMetrics/Prometheus text exposition in fixed-size blocks, bins the
+samples onto the ``1 / hz`` grid, averages samples sharing a bin, forward-fills
+empty bins and writes the same ``ts, t_s, <metrics>`` schema the generator produces.
+Memory is bounded by the block size, not the export size. Input must be ordered by
+time; a sample landing in an already-written bin is an error. Gaps are filled at most
+one block's worth of bins at a time, and samples past ``duration_s`` are never binned.
+"""
+from __future__ import annotations
+import argparse
+from pathlib import Path
+from typing import Iterable, Iterator
+import numpy as np
+import pandas as pd
+from traceio import TraceWriter, date_format_for
+
+METRICS = ("latency_ms", "error_rate_pct", "throughput_rps")
+BLOCK_ROWS = 1 << 20
+OPENMETRICS_SUFFIXES = (".om", ".prom", ".openmetrics", ".txt")
+
+
+def format_for(path: Path, fmt: str | None = None) -> str:
+    if fmt:
+        return fmt
+    return "openmetrics" if path.suffix.lower() in OPENMETRICS_SUFFIXES else "csv"
+
+
+def to_ns(ts: pd.Series | np.ndarray) -> np.ndarray:
+    """Epoch nanoseconds from datetime strings or numeric epoch seconds/milliseconds."""
+    ts = pd.Series(ts)
+    if pd.api.types.is_numeric_dtype(ts):
+        x = ts.to_numpy(dtype=float)
+        # Prometheus text exposition stamps samples in milliseconds
+        scale = 10**6 if len(x) and np.nanmax(np.abs(x)) > 1e11 else 10**9
+        # whole units and fraction apart: epoch nanoseconds overflow float64's exact range
+        whole = np.floor(x)
+        return whole.astype(np.int64) * scale + np.round((x - whole) * scale).astype(np.int64)
+    return pd.to_datetime(ts, utc=True).to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+
+def csv_blocks(path: Path, columns: dict[str, str], time_column: str = "ts",
+               block_rows: int = BLOCK_ROWS) -> Iterator[tuple[np.ndarray, dict[str, np.ndarray]]]:
+    """``(epoch_ns, {metric: values})`` blocks of a wide CSV export; ``columns`` maps source -> metric."""
+    reader = pd.read_csv(path, usecols=[time_column, *columns], chunksize=block_rows)
+    for df in reader:
+        yield to_ns(df[time_column]), {m: df[c].to_numpy(dtype=float) for c, m in columns.items()}
+
+
+def openmetrics_blocks(path: Path, columns: dict[str, str],
+                       block_rows: int = BLOCK_ROWS) -> Iterator[tuple[np.ndarray, dict[str, np.ndarray]]]:
+    """``(epoch_ns, {metric: values})`` blocks of OpenMetrics text; ``columns`` maps metric name -> metric.
+
+    Every sample must carry a timestamp. Labels are ignored, so all series of one
+    metric name are averaged per bin.
+    """
+    names, values, stamps = [], [], []
+
+    def flush():
+        name = np.asarray(names)
+        t = to_ns(np.asarray(stamps, dtype=float))
+        v = np.asarray(values, dtype=float)
+        block = {m: np.where(name == src, v, np.nan) for src, m in columns.items()}
+        names.clear()
+        values.clear()
+        stamps.clear()
+        return t, block
+
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            if "{" in line:
+                name = line.split("{", 1)[0]
+                rest = line.rsplit("}", 1)[1].split()
+            else:
+                name, *rest = line.split()
+            if name not in columns:
+                continue
+            if len(rest) < 2:
+                raise ValueError(f"{path}: sample without a timestamp: {line.strip()!r}")
+            value, stamp = rest[:2]
+            names.append(name)
+            values.append(value)
+            stamps.append(stamp)
+            if len(names) >= block_rows:
+                yield flush()
+    if names:
+        yield flush()
+
+
+class Resampler:
+    """Streams irregular samples onto a regular ``1 / hz`` grid.
+
+    The grid starts at the first sample's timestamp floored to the period. Only the
+    highest bin seen so far stays open, since later samples may still fall in it;
+    every bin below it is closed. Empty bins carry the last value forward and bins
+    before a metric's first sample take that first value.
+    """
+
+    def __init__(self, hz: int, metrics: Iterable[str], max_rows: int | None = None, step_bins: int = BLOCK_ROWS):
+        self.period = 10**9 // hz
+        self.hz = hz
+        self.metrics = list(metrics)
+        self.max_rows = max_rows
+        self.step_bins = max(step_bins, 2)
+        self.t0 = None
+        self.closed = 0  # bins below this index are final
+        self.written = 0  # rows handed out so far
+        self.open_sum = np.zeros(len(self.metrics))
+        self.open_cnt = np.zeros(len(self.metrics))
+        self.last = np.full(len(self.metrics), np.nan)
+        self.pending: list[np.ndarray] = []
+
+    def feed(self, t_ns: np.ndarray, block: dict[str, np.ndarray]) -> Iterator[pd.DataFrame]:
+        """Bin one block of samples, yielding the bins it closes ``step_bins`` at a time.
+
+        A gap in the export or a far-off timestamp is filled in slices rather than in one
+        allocation. Samples at or past ``max_rows`` bins are dropped and close the grid.
+        """
+        if len(t_ns) == 0:
+            return
+        if self.t0 is None:
+            self.t0 = int(t_ns[0]) // self.period * self.period
+        b = (t_ns - self.t0) // self.period
+        if b.min() < self.closed:
+            raise ValueError("input is not ordered by time: sample at "
+                             f"t_s={b.min() / self.hz:g} after t_s={self.closed / self.hz:g} was written")
+        hi = int(b.max())
+        if self.max_rows is not None and hi >= self.max_rows:
+            # past the end of the trace: never binned, and every bin before the end is final
+            keep = b < self.max_rows
+            b, block = b[keep], {m: block[m][keep] for m in self.metrics}
+            hi = self.max_rows
+        lo = self.closed
+        while True:
+            end = min(self.closed + self.step_bins, hi + 1)
+            width = end - self.closed
+            sel = (b >= lo) & (b < end)
+            idx = b[sel] - self.closed
+            sums = np.zeros((width, len(self.metrics)))
+            cnts = np.zeros((width, len(self.metrics)))
+            for j, m in enumerate(self.metrics):
+                v = block[m][sel]
+                ok = ~np.isnan(v)
+                sums[:, j] = np.bincount(idx[ok], weights=v[ok], minlength=width)
+                cnts[:, j] = np.bincount(idx[ok], minlength=width)
+            sums[0] += self.open_sum
+            cnts[0] += self.open_cnt
+            self.open_sum, self.open_cnt = sums[-1], cnts[-1]
+            yield from self._close(sums[:-1], cnts[:-1])
+            if end > hi or self.done:
+                return
+            # the last bin of this slice stays open; its samples are already in open_sum
+            lo = end
+
+    def finish(self) -> Iterator[pd.DataFrame]:
+        if self.t0 is not None:
+            yield from self._close(self.open_sum[None], self.open_cnt[None])
+        if self.pending:
+            # a metric never had a sample: it stays at zero
+            yield from self._write(np.nan_to_num(np.concatenate(self.pending)))
+
+    @property
+    def done(self) -> bool:
+        return self.max_rows is not None and self.closed >= self.max_rows
+
+    def _close(self, sums: np.ndarray, cnts: np.ndarray) -> Iterator[pd.DataFrame]:
+        if self.max_rows is not None:
+            keep = max(0, self.max_rows - self.closed)
+            sums, cnts = sums[:keep], cnts[:keep]
+        if not len(sums):
+            return
+        self.closed += len(sums)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            vals = np.where(cnts > 0, sums / cnts, np.nan)
+        vals = pd.DataFrame(vals).ffill().to_numpy()
+        vals = np.where(np.isnan(vals), self.last, vals)
+        self.last = vals[-1]
+        if self.pending or np.isnan(vals).any():
+            # hold rows back until every metric has been seen, then back-fill them
+            self.pending.append(vals)
+            if np.isnan(self.last).any():
+                return
+            vals = pd.DataFrame(np.concatenate(self.pending)).bfill().to_numpy()
+        yield from self._write(vals)
+
+    def _write(self, vals: np.ndarray) -> Iterator[pd.DataFrame]:
+        self.pending = []
+        i = self.written + np.arange(len(vals))
+        self.written += len(vals)
+        df = pd.DataFrame({
+            "ts": pd.to_datetime(self.t0 + i * self.period, utc=True),
+            "t_s": (i / self.hz).astype(int),
+        })
+        for j, m in enumerate(self.metrics):
+            df[m] = vals[:, j]
+        yield df
+
+
+def ingest_chunks(path: Path, hz: int, columns: dict[str, str] | None = None, fmt: str | None = None,
+                  time_column: str = "ts", duration_s: float | None = None,
+                  block_rows: int = BLOCK_ROWS) -> Iterator[pd.DataFrame]:
+    """Trace chunks resampled to ``hz`` from the export at ``path``.
+
+    ``columns`` maps source column (CSV) or metric name (OpenMetrics) to output metric;
+    by default the standard metric names are taken as they are. ``duration_s`` truncates
+    the trace: samples past it are dropped. ``block_rows`` also caps the bins filled per step.
+    """
+    columns = columns or {m: m for m in METRICS}
+    if format_for(path, fmt) == "openmetrics":
+        blocks = openmetrics_blocks(path, columns, block_rows)
+    else:
+        blocks = csv_blocks(path, columns, time_column, block_rows)
+    max_rows = None if duration_s is None else int(np.ceil(duration_s * hz))
+    rs = Resampler(hz, dict.fromkeys(columns.values()), max_rows, block_rows)
+    for t_ns, block in blocks:
+        yield from rs.feed(t_ns, block)
+        if rs.done:
+            break
+    yield from rs.finish()
+
+
+def scenario_source(sc: dict, scenario_path: Path) -> Path:
+    """The recorded export of a ``dataset.source: trace`` scenario, resolved like ``system_profile``."""
+    path = sc["dataset"].get("path")
+    if not path:
+        raise SystemExit(f"{sc['id']}: dataset.source is 'trace' but dataset.path is not set")
+    return (scenario_path.parent / path).resolve()
+
+
+def ingest_scenario(sc: dict, scenario_path: Path, hz: int) -> Iterator[pd.DataFrame]:
+    ds = sc["dataset"]
+    return ingest_chunks(scenario_source(sc, scenario_path), hz, ds.get("columns"), ds.get("format"),
+                         ds.get("time_column", "ts"), ds.get("duration_s"))
+
+
+def parse_columns(pairs: list[str]) -> dict[str, str] | None:
+    if not pairs:
+        return None
+    out = {}
+    for p in pairs:
+        src, _, dst = p.partition("=")
+        out[src] = dst or src
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Resample a recorded metric export into a trace")
+    ap.add_argument("--inp", "-i", type=Path, required=True, help="CSV or OpenMetrics text export")
+    ap.add_argument("--out", "-o", type=Path, required=True, help="Output trace (.csv, .npz or .parquet)")
+    ap.add_argument("--hz", type=int, default=1, help="Output sampling rate")
+    ap.add_argument("--format", choices=["csv", "openmetrics"],
+                    help="Input format (default: from the extension; .om/.prom/.txt are OpenMetrics)")
+    ap.add_argument("--column", "-c", action="append", default=[], metavar="SRC=METRIC",
+                    help="Map a source column or metric name to an output metric (repeatable; "
+                         "default: latency_ms, error_rate_pct, throughput_rps as-is)")
+    ap.add_argument("--time-column", default="ts", help="CSV timestamp column (datetime or epoch s/ms)")
+    ap.add_argument("--duration-s", type=float, help="Truncate the trace to this many seconds")
+    ap.add_argument("--block-rows", type=int, default=BLOCK_ROWS, help="Input rows read per block")
+    args = ap.parse_args()
+
+    rows = 0
+    with TraceWriter(args.out, date_format_for(args.hz)) as w:
+        for chunk in ingest_chunks(args.inp, args.hz, parse_columns(args.column), args.format,
+                                   args.time_column, args.duration_s, args.block_rows):
+            w.write(chunk)
+            rows += len(chunk)
+    print(f"Wrote {rows} rows to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
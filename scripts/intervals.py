@@ -0,0 +1,195 @@
+"""Fault and ground-truth intervals shared by the generator and the evaluators.
+
+Intervals are closed ``[start_s, end_s]`` ranges in trace seconds, held as an
+``(k, 2)`` float array. Membership is counted with two ``searchsorted`` calls over the
+sorted starts and ends, so marking ``n`` samples against ``k`` intervals costs
+``O((n + k) log k)`` instead of one full-length mask per interval.
+"""
+from __future__ import annotations
+import numpy as np
+
+
+def fault_list(sc: dict) -> list[dict]:
+    """The scenario's faults: the single ``failure`` block and/or the ``failures`` list."""
+    faults = [sc["failure"]] if sc.get("failure") else []
+    return faults + list(sc.get("failures") or [])
+
+
+def fault_intervals(f: dict) -> np.ndarray:
+    """``(count, 2)`` intervals of one fault entry, expanding ``repeat: {every_s, count}``."""
+    start = float(f["start_s"])
+    dur = float(f["duration_s"])
+    rep = f.get("repeat") or {}
+    starts = start + float(rep.get("every_s", 0)) * np.arange(int(rep.get("count", 1)))
+    return np.column_stack([starts, starts + dur])
+
+
+def merge(iv: np.ndarray) -> np.ndarray:
+    """Union of possibly overlapping intervals as a sorted, disjoint ``(k, 2)`` array."""
+    iv = np.asarray(iv, dtype=float).reshape(-1, 2)
+    if len(iv) == 0:
+        return iv
+    iv = iv[np.argsort(iv[:, 0], kind="stable")]
+    run_end = np.maximum.accumulate(iv[:, 1])
+    new = np.r_[True, iv[1:, 0] > run_end[:-1]]
+    last = np.r_[np.flatnonzero(new)[1:] - 1, len(iv) - 1]
+    return np.column_stack([iv[new, 0], run_end[last]])
+
+
+def ground_truth_intervals(sc: dict) -> np.ndarray:
+    """Positive intervals of a scenario as a sorted, disjoint ``(k, 2)`` array.
+
+    Taken from ``ground_truth.positive_intervals_s``, else the single
+    ``ground_truth.positive_interval_s``, else derived from the fault timeline.
+    """
+    gt = sc.get("ground_truth") or {}
+    if gt.get("positive_intervals_s"):
+        return merge(gt["positive_intervals_s"])
+    if gt.get("positive_interval_s"):
+        return merge([gt["positive_interval_s"]])
+    faults = fault_list(sc)
+    if not faults:
+        return np.empty((0, 2))
+    return merge(np.concatenate([fault_intervals(f) for f in faults]))
+
+
+def active_count(t: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Number of closed intervals covering each ``t``; ``starts``/``ends`` sorted independently."""
+    return np.searchsorted(starts, t, side="right") - np.searchsorted(ends, t, side="left")
+
+
+def interval_mask(t: np.ndarray, iv: np.ndarray) -> np.ndarray:
+    iv = np.asarray(iv, dtype=float).reshape(-1, 2)
+    return active_count(t, np.sort(iv[:, 0]), np.sort(iv[:, 1])) > 0
+
+
+# Index runs: half-open ``[start, stop)`` sample ranges as an ``(k, 2)`` int64 array,
+# sorted and disjoint. Confusion counts and event metrics below work on runs only,
+# so after the runs are extracted their cost depends on the number of runs, not samples.
+
+def runs(mask: np.ndarray) -> np.ndarray:
+    """Maximal runs of True in a boolean mask."""
+    m = np.asarray(mask, dtype=bool).view(np.int8)
+    edges = np.diff(m, prepend=np.int8(0), append=np.int8(0))
+    return np.column_stack([np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)]).astype(np.int64)
+
+
+def coalesce(r: np.ndarray) -> np.ndarray:
+    """Merge overlapping or touching runs of a start-sorted, end-monotone ``(k, 2)`` array."""
+    if len(r) == 0:
+        return r
+    new = np.r_[True, r[1:, 0] > r[:-1, 1]]
+    last = np.r_[np.flatnonzero(new)[1:] - 1, len(r) - 1]
+    return np.column_stack([r[new, 0], r[last, 1]])
+
+
+def column_runs(masks: np.ndarray) -> list[np.ndarray]:
+    """``runs`` of every column of an ``(n, p)`` boolean matrix, from one vectorized edge pass."""
+    m = np.asarray(masks, dtype=bool)
+    n, p = m.shape
+    pad = np.zeros((1, p), dtype=np.int8)
+    edges = np.diff(m.view(np.int8), axis=0, prepend=pad, append=pad)
+    col, row = np.nonzero(edges.T)  # column-major: per column, rising and falling edges alternate
+    rising = edges[row, col] == 1
+    r = np.column_stack([row[rising], row[~rising]]).astype(np.int64)
+    return np.split(r, np.cumsum(np.bincount(col[rising], minlength=p))[:-1])
+
+
+def index_runs(t: np.ndarray, iv: np.ndarray) -> np.ndarray:
+    """Runs of samples of a time-ordered ``t`` inside the closed intervals ``iv``.
+
+    Equal to ``runs(interval_mask(t, iv))`` for sorted ``t`` and disjoint ``iv``, in
+    ``O(k log n)`` instead of a pass over every sample.
+    """
+    iv = np.asarray(iv, dtype=float).reshape(-1, 2)
+    r = np.column_stack([np.searchsorted(t, iv[:, 0], side="left"),
+                         np.searchsorted(t, iv[:, 1], side="right")]).astype(np.int64)
+    return coalesce(r[r[:, 1] > r[:, 0]])
+
+
+def dilate_runs(r: np.ndarray, k: int, n: int) -> np.ndarray:
+    """Grow every run by ``k`` samples on both sides within ``[0, n)`` and merge the overlaps."""
+    if k <= 0 or len(r) == 0:
+        return r
+    # runs are sorted and equally grown, so only neighbours can overlap
+    return coalesce(np.column_stack([np.maximum(r[:, 0] - k, 0), np.minimum(r[:, 1] + k, n)]))
+
+
+def measure(r: np.ndarray) -> int:
+    return int((r[:, 1] - r[:, 0]).sum())
+
+
+def covered_before(r: np.ndarray, x: np.ndarray) -> np.ndarray:
+    """Number of samples of the runs ``r`` below each position ``x`` (prefix measure)."""
+    length = r[:, 1] - r[:, 0]
+    cum = np.r_[0, np.cumsum(length)]
+    j = np.searchsorted(r[:, 0], x, side="right") - 1
+    jc = np.maximum(j, 0)
+    inside = np.clip(x - r[jc, 0], 0, length[jc])
+    return np.where(j >= 0, cum[jc] + inside, 0)
+
+
+def overlap(a: np.ndarray, b: np.ndarray) -> int:
+    """Samples covered by both run sets, in ``O((|a| + |b|) log |b|)``."""
+    if len(a) == 0 or len(b) == 0:
+        return 0
+    return int((covered_before(b, a[:, 1]) - covered_before(b, a[:, 0])).sum())
+
+
+def hits(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Index of the first run of ``b`` overlapping each run of ``a``, or -1."""
+    if len(b) == 0:
+        return np.full(len(a), -1)
+    j = np.searchsorted(b[:, 1], a[:, 0], side="right")
+    jc = np.minimum(j, len(b) - 1)
+    return np.where((j < len(b)) & (b[jc, 0] < a[:, 1]), jc, -1)
+
+
+def confusion(gt: np.ndarray, pred: np.ndarray) -> tuple[int, int, int]:
+    """Sample-level ``(tp, fp, fn)`` of prediction runs against ground-truth runs."""
+    tp = overlap(pred, gt)
+    return tp, measure(pred) - tp, measure(gt) - tp
+
+
+def event_metrics(t: np.ndarray, events: np.ndarray, pred: np.ndarray, tol: int) -> dict:
+    """Event-level detection quality.
+
+    ``events`` are the ground-truth runs before tolerance dilation; each is detected
+    when an alarm run overlaps it widened by ``tol`` samples. Time to detect is from
+    the event's first sample to the first alarm in that window (0 if the alarm was
+    already raised). An alarm run touching no widened event is a false-alarm episode.
+    """
+    n = len(t)
+    windows = np.column_stack([np.maximum(events[:, 0] - tol, 0), np.minimum(events[:, 1] + tol, n)])
+    j = hits(windows, pred)
+    found = j >= 0
+    first = np.maximum(pred[j[found], 0], windows[found, 0])
+    ttd = np.maximum(t[first] - t[events[found, 0]], 0)
+    false_alarms = int((hits(pred, dilate_runs(events, tol, n)) < 0).sum())
+    return {
+        "events": len(events),
+        "missed_events": int((~found).sum()),
+        "ttd_mean_s": round(float(ttd.mean()), 3) if len(ttd) else "NA",
+        "ttd_max_s": round(float(ttd.max()), 3) if len(ttd) else "NA",
+        "false_alarm_episodes": false_alarms,
+    }
+
+
+class PointTimes:
+    """Times of selected sample indices of an ``n``-sample trace that is not held in memory.
+
+    Stands in for the full time array in :func:`event_metrics`, which only looks up
+    event and alarm-run starts.
+    """
+
+    def __init__(self, n: int, index: np.ndarray, t: np.ndarray):
+        order = np.argsort(index, kind="stable")
+        self.n = n
+        self.index = np.asarray(index)[order]
+        self.t = np.asarray(t)[order]
+
+    def __len__(self) -> int:
+        return self.n
+
+    def __getitem__(self, i: np.ndarray) -> np.ndarray:
+        return self.t[np.searchsorted(self.index, i)]
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+import argparse
+import sys
+import time
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from detectors import Cusum, CusumBank  # noqa: E402
+
+
+def loop_cusum(z: np.ndarray, drift: float, threshold: float) -> np.ndarray:
+    """The original per-sample CUSUM loop, as the reference."""
+    n = len(z)
+    zl = z.tolist()
+    pred = np.zeros(n, dtype=np.int8)
+    s_hi = s_lo = 0.0
+    for i in range(1, n):
+        s_hi = max(0, s_hi + zl[i] - drift)
+        s_lo = max(0, s_lo - zl[i] - drift)
+        if s_hi > threshold or s_lo > threshold:
+            pred[i] = 1
+            s_hi = s_lo = 0
+    return pred
+
+
+def synthetic_z(rows: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    z = rng.normal(0, 1.0, rows)
+    # level shifts of a few sigma, 300 samples long, as in the fault scenarios
+    for s in rng.integers(0, rows, max(1, rows // 20_000)):
+        z[s:s + 300] += rng.choice([-1, 1]) * rng.uniform(1, 8)
+    return z
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Vectorized CUSUM vs the per-sample loop")
+    ap.add_argument("--rows", "-n", type=int, default=10_000_000)
+    ap.add_argument("--drifts", type=float, nargs="+", default=[0.25, 0.5, 1.0])
+    ap.add_argument("--thresholds", type=float, nargs="+", default=[3.0, 5.0, 8.0])
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--min-speedup", type=float, default=5.0,
+                    help="Fail if the kernel is less than this many times faster than the loop")
+    args = ap.parse_args()
+
+    z = synthetic_z(args.rows, args.seed)
+    pairs = [(k, h) for k in args.drifts for h in args.thresholds]
+
+    k, h = 0.5, 5.0
+    t0 = time.perf_counter()
+    ref = loop_cusum(z, k, h)
+    t_loop = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    fast = Cusum(0.0, 1.0, k, h).run(z)
+    t_fast = time.perf_counter() - t0
+    equal = bool(np.array_equal(ref, fast))
+    speedup = t_loop / t_fast
+    print(f"loop    {t_loop:8.3f} s {args.rows / t_loop:14,.0f} samples/s  alarms {int(ref.sum())}")
+    print(f"kernel  {t_fast:8.3f} s {args.rows / t_fast:14,.0f} samples/s  alarms {int(fast.sum())}  "
+          f"{'identical' if equal else 'DIFFERENT'}  {speedup:.1f}x")
+
+    t0 = time.perf_counter()
+    grid = CusumBank(0.0, 1.0, pairs).run(z)
+    t_bank = time.perf_counter() - t0
+    print(f"bank    {t_bank:8.3f} s for {len(pairs)} (drift, threshold) pairs "
+          f"({t_bank / len(pairs):.3f} s per pair; loop estimate {t_loop * len(pairs):.1f} s)")
+    row = pairs.index((k, h)) if (k, h) in pairs else None
+    bank_ok = row is None or bool(np.array_equal(grid[row], ref))
+
+    ok = equal and bank_ok and speedup >= args.min_speedup
+    print("OK" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
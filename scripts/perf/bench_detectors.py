@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+import argparse
+import sys
+import time
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from detectors import Cusum, Ewma, Threshold, ZScore  # noqa: E402
+
+DETECTORS = {
+    "threshold": lambda v: Threshold(75.0),
+    "zscore": lambda v: ZScore(60, 3.0),
+    "ewma": lambda v: Ewma(30, 3.0),
+    "cusum": lambda v: Cusum.fit(v, 0.5, 5.0),
+}
+
+
+def synthetic_latency(rows: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    v = 60 + rng.normal(0, 5.0, rows)
+    # a few level shifts so the detectors have something to alarm on
+    for s in rng.integers(0, rows, max(1, rows // 100_000)):
+        v[s:s + 300] += 40
+    return v
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Streaming detector throughput and chunked-vs-batch equality")
+    ap.add_argument("--rows", "-n", type=int, default=1_000_000)
+    ap.add_argument("--chunk-rows", type=int, nargs="+", default=[1_000, 65_536])
+    ap.add_argument("--detectors", nargs="+", default=list(DETECTORS), choices=list(DETECTORS))
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    v = synthetic_latency(args.rows, args.seed)
+    failed = False
+    print(f"{'detector':10s} {'chunk':>8s} {'seconds':>9s} {'samples/s':>14s}  alarms  match")
+    for name in args.detectors:
+        make = DETECTORS[name]
+        t0 = time.perf_counter()
+        batch = make(v).run(v)
+        dt = time.perf_counter() - t0
+        print(f"{name:10s} {'all':>8s} {dt:9.3f} {args.rows / dt:14,.0f}  {int(batch.sum()):6d}")
+        for chunk in args.chunk_rows:
+            t0 = time.perf_counter()
+            pred = make(v).run(v, chunk)
+            dt = time.perf_counter() - t0
+            ok = bool(np.array_equal(pred, batch))
+            failed |= not ok
+            print(f"{name:10s} {chunk:8d} {dt:9.3f} {args.rows / dt:14,.0f}  {int(pred.sum()):6d}  "
+                  f"{'OK' if ok else 'FAIL'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from traceio import read_trace, write_trace_chunks  # noqa: E402
+
+TS0 = pd.Timestamp("2025-01-01", tz="UTC")
+
+
+def synthetic_chunks(rows: int, chunk_rows: int, seed: int):
+    rng = np.random.default_rng(seed)
+    for i0 in range(0, rows, chunk_rows):
+        i1 = min(i0 + chunk_rows, rows)
+        t = np.arange(i0, i1)
+        yield pd.DataFrame({
+            "ts": TS0 + pd.to_timedelta(t, unit="s"),
+            "t_s": t,
+            "latency_ms": 60 + rng.normal(0, 5.0, t.size),
+            "error_rate_pct": np.clip(rng.normal(0.02, 0.005, t.size), 0, None),
+            "throughput_rps": 200 + rng.normal(0, 6.0, t.size),
+        })
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Trace load time: CSV vs columnar formats")
+    ap.add_argument("--rows", "-n", type=int, default=10_000_000)
+    ap.add_argument("--repeat", "-r", type=int, default=3)
+    ap.add_argument("--formats", nargs="+", default=["npz", "parquet"])
+    ap.add_argument("--min-speedup", type=float, default=10.0,
+                    help="Fail if any columnar format loads less than this many times faster than CSV")
+    ap.add_argument("--workdir", type=Path)
+    args = ap.parse_args()
+
+    formats = ["csv"] + [f for f in args.formats if f != "csv"]
+    if "parquet" in formats:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print("pyarrow not installed; skipping parquet")
+            formats.remove("parquet")
+
+    with tempfile.TemporaryDirectory(dir=args.workdir) as tmp:
+        times = {}
+        for fmt in formats:
+            path = Path(tmp) / f"trace.{fmt}"
+            write_trace_chunks(synthetic_chunks(args.rows, 1_000_000, 0), path)
+            size_mb = path.stat().st_size / 2**20
+            times[fmt] = best_of(lambda: read_trace(path), args.repeat)
+            print(f"{fmt:8s} {size_mb:10.1f} MiB  load {times[fmt]:8.3f} s  "
+                  f"{args.rows / times[fmt]:14,.0f} rows/s")
+
+    failed = False
+    for fmt in formats[1:]:
+        speedup = times["csv"] / times[fmt]
+        ok = speedup >= args.min_speedup
+        failed |= not ok
+        print(f"{fmt}: {speedup:.1f}x faster than csv [{'OK' if ok else 'FAIL'}]")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+import argparse
+import sys
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from detectors import MAD_SCALE, Mad, Quantile  # noqa: E402
+
+
+def naive_mad(v: np.ndarray, window: int, k: float) -> np.ndarray:
+    """The O(n*w) reference: ``rolling().apply`` recomputing median and MAD of every window."""
+    min_periods = max(2, window // 4)
+
+    def alarm(a):
+        x = a[-1]
+        a = a[~np.isnan(a)]
+        if np.isnan(x) or len(a) < min_periods:
+            return 0.0
+        m = np.median(a)
+        mad = np.median(np.abs(a - m))
+        return float(mad > 0 and abs(x - m) > k * MAD_SCALE * mad)
+
+    return pd.Series(v).rolling(window, min_periods=1).apply(alarm, raw=True).to_numpy().astype(np.int8)
+
+
+def naive_quantile(v: np.ndarray, window: int, q: float) -> np.ndarray:
+    min_periods = max(2, window // 4)
+
+    def thr(a):
+        a = a[~np.isnan(a)]
+        return np.quantile(a, q) if len(a) >= min_periods else np.inf
+
+    t = pd.Series(v).rolling(window, min_periods=1).apply(thr, raw=True).shift(1, fill_value=np.inf)
+    return (v > t.to_numpy()).astype(np.int8)
+
+
+DETECTORS = {
+    "mad": (lambda w: Mad(w, 3.5), lambda v, w: naive_mad(v, w, 3.5)),
+    "quantile": (lambda w: Quantile(w, 0.99), lambda v, w: naive_quantile(v, w, 0.99)),
+}
+
+
+def synthetic_latency(rows: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    v = 60 + rng.normal(0, 5.0, rows)
+    for s in rng.integers(0, rows, max(1, rows // 20_000)):
+        v[s:s + 300] += 40
+    v[rng.random(rows) < 0.001] = np.nan
+    return v
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Skiplist rolling median/MAD and quantile detectors vs rolling().apply")
+    ap.add_argument("--rows", "-n", type=int, default=200_000)
+    ap.add_argument("--naive-rows", type=int, default=20_000, help="Rows timed and compared with the naive version")
+    ap.add_argument("--windows", type=int, nargs="+", default=[60, 300, 900, 3600])
+    ap.add_argument("--detectors", nargs="+", default=list(DETECTORS), choices=list(DETECTORS))
+    ap.add_argument("--chunk-rows", type=int, default=4096, help="Chunking checked against the unchunked run")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    v = synthetic_latency(args.rows, args.seed)
+    head = v[:args.naive_rows]
+    failed = False
+    print(f"{'detector':9s} {'window':>6s} {'skiplist/s':>12s} {'naive/s':>10s} {'speedup':>8s}  alarms  match")
+    for name in args.detectors:
+        make, naive = DETECTORS[name]
+        for w in args.windows:
+            t0 = time.perf_counter()
+            pred = make(w).run(v)
+            fast = args.rows / (time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            ref = naive(head, w)
+            slow = len(head) / (time.perf_counter() - t0)
+            chunked = make(w).run(v, args.chunk_rows)
+            ok = bool(np.array_equal(pred[:len(head)], ref)) and bool(np.array_equal(chunked, pred))
+            failed |= not ok
+            print(f"{name:9s} {w:6d} {fast:12,.0f} {slow:10,.0f} {fast / slow:7.1f}x  {int(pred.sum()):6d}  "
+                  f"{'OK' if ok else 'FAIL'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Import-time budget of every resbench subcommand, measured with ``python -X importtime``.
+
+Each case runs the real command on a small trace in a fresh interpreter. Its import
+time is the sum of the top-level cumulative times that ``-X importtime`` reports,
+minimum over ``--repeat`` runs. A case fails if it exceeds its budget or loads a
+library its code path does not need: ``--help`` and ``cache`` must not load numpy,
+only plotting may load matplotlib, only IsolationForest may load scikit-learn.
+"""
+from __future__ import annotations
+import argparse
+import os
+import subprocess  # nosec B404
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+CLI = str(ROOT / "scripts" / "cli.py")
+SCEN = str(ROOT / "benchmarks" / "scenarios" / "latency_spike.yaml")
+HEAVY = ["numpy", "pandas", "yaml", "matplotlib", "sklearn"]
+DATA_ONLY = ["matplotlib", "sklearn"]
+
+# (name, argv, import budget in ms, top-level packages that must not be imported);
+# cases run in order, so later ones read the trace the ``gen`` case writes
+CASES = [
+    ("--help", [CLI, "--help"], 40, HEAVY),
+    ("cache list", [CLI, "cache", "list"], 40, HEAVY),
+    ("gen", [CLI, "gen", "-s", SCEN, "-o", "{tmp}/t.csv"], 450, DATA_ONLY),
+    ("baseline zscore", [CLI, "baseline", "--algo", "zscore", "-i", "{tmp}/t.csv", "-o", "{tmp}/p.csv"], 450,
+     DATA_ONLY),
+    ("detect", [CLI, "detect", "-i", "{tmp}/t.csv", "-o", "{tmp}/w.csv", "-s", SCEN], 450, DATA_ONLY),
+    ("eval", [CLI, "eval", "-s", SCEN, "-d", "{tmp}/t.csv", "-p", "{tmp}/p.csv", "-o", "{tmp}/r/t_report.csv"],
+     450, DATA_ONLY),
+    ("report", [CLI, "report", "-r", "{tmp}/r", "-o", "{tmp}/r/index.html"], 450, DATA_ONLY),
+    ("plot", [CLI, "plot", "-s", SCEN, "-d", "{tmp}/t.csv", "-o", "{tmp}/t.png"], 900, ["sklearn"]),
+    ("all", [CLI, "all", "-s", SCEN, "--prefix", "{tmp}/a"], 900, ["sklearn"]),
+    ("baseline isoforest", [CLI, "baseline", "--algo", "isoforest", "-i", "{tmp}/t.csv", "-o", "{tmp}/i.csv"],
+     1500, ["matplotlib"]),
+]
+
+
+def import_profile(argv: list[str], env: dict) -> tuple[float, set[str]]:
+    """Total import time in ms and the top-level packages imported by one run of ``argv``."""
+    r = subprocess.run([sys.executable, "-X", "importtime", *argv], cwd=ROOT, env=env,  # nosec B603
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if r.returncode:
+        raise SystemExit(f"{' '.join(argv)} failed:\n{r.stderr[-2000:]}")
+    total, packages = 0, set()
+    for line in r.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header
+        packages.add(name.strip().split(".")[0])
+        if not name.startswith("  "):  # nested imports are indented
+            total += int(cumulative)
+    return total / 1000, packages
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-subcommand import-time budget of the resbench CLI")
+    ap.add_argument("--repeat", "-r", type=int, default=3, help="Runs per case; the fastest counts")
+    ap.add_argument("--scale", type=float, default=1.0, help="Multiply every budget, for slower machines")
+    ap.add_argument("--cases", nargs="+", help="Only these cases (gen always runs first to provide the trace)")
+    args = ap.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "RESBENCH_CACHE_DIR": f"{tmp}/cache", "RESBENCH_MODEL_CACHE_DIR": f"{tmp}/models",
+               "MPLCONFIGDIR": f"{tmp}/mpl"}
+        print(f"{'case':20s} {'import ms':>9s} {'budget':>7s}  heavy packages loaded")
+        for name, argv, budget, banned in CASES:
+            if args.cases and name not in args.cases and name != "gen":
+                continue
+            argv = [a.format(tmp=tmp) for a in argv]
+            runs = [import_profile(argv, env) for _ in range(args.repeat)]
+            ms = min(t for t, _ in runs)
+            loaded = set().union(*(p for _, p in runs))
+            bad = sorted(loaded & set(banned))
+            limit = budget * args.scale
+            ok = ms <= limit and not bad
+            failed |= not ok
+            heavy = ", ".join(p for p in HEAVY if p in loaded) or "-"
+            note = f"  must not load {', '.join(bad)}" if bad else ""
+            print(f"{name:20s} {ms:9.0f} {limit:7.0f}  {heavy}{note}  {'OK' if ok else 'FAIL'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""Benchmarks of the toolkit's own hot paths across trace sizes, with scaling curves.
+
+Every case is timed at each ``--sizes`` row count up to its own cap (the loaders,
+IsolationForest and the bootstrap hold whole frames and MAD/quantile cost ~10 us a row,
+so they stop earlier than the streaming paths). Runs up to 10^6 rows take the best of ``--repeat``; larger ones run
+once. The results, one curve of (rows, seconds) per case plus its fitted scaling
+exponent, are written as JSON.
+
+With ``--compare`` the run is checked against a stored results file: a case is a
+regression if it is more than ``--tolerance`` times slower at any size both runs
+cover, or if its scaling exponent grew by more than ``--exponent-slack`` (an
+algorithmic slowdown, visible on any machine). Stored times are first scaled by how
+much slower this machine sorts a fixed array than the one that stored them.
+"""
+from __future__ import annotations
+import argparse
+import json
+import math
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from bench_io import synthetic_chunks  # noqa: E402
+from confidence import bootstrap, prepare  # noqa: E402
+from defaults import DEFAULT_PARAMS, STREAMING_PARAMS  # noqa: E402
+from detect import build  # noqa: E402
+from detectors import CHUNK_ROWS, Threshold  # noqa: E402
+from generate import generate_chunks  # noqa: E402
+from intervals import confusion, dilate_runs, runs  # noqa: E402
+from sketch import QuantileSketch  # noqa: E402
+from telemetry import host  # noqa: E402
+from traceio import read_trace, write_trace_chunks  # noqa: E402
+
+ROOT = Path(__file__).resolve().parents[2]
+SCEN = ROOT / "benchmarks" / "scenarios" / "latency_spike.yaml"
+SIZES = [10**3, 10**4, 10**5, 10**6]
+# sizes above this run once instead of --repeat times
+REPEAT_ROWS = 10**6
+# the exponent is fitted on points at least this slow; faster ones are mostly per-call overhead
+FIT_MIN_SECONDS = 0.002
+TOLERANCE_S = 10
+SHIFT_EVERY = 10_000
+
+
+def load_yaml(p: Path) -> dict:
+    return yaml.safe_load(p.read_text(encoding="utf-8"))
+
+
+def synthetic_series(rows: int, seed: int) -> tuple[np.ndarray, np.ndarray]:
+    """Latency with a 300-sample level shift every ~``SHIFT_EVERY`` samples, and the shifts as ground truth."""
+    rng = np.random.default_rng(seed)
+    v = 60 + rng.normal(0, 5.0, rows)
+    gt = np.zeros(rows, dtype=bool)
+    for s in rng.integers(0, rows, max(1, rows // SHIFT_EVERY)):
+        gt[s:s + 300] = True
+    v[gt] += 40
+    return v, gt
+
+
+def synthetic_frame(rows: int) -> pd.DataFrame:
+    return pd.concat(list(synthetic_chunks(rows, CHUNK_ROWS, 0)), ignore_index=True)
+
+
+# Each case prepares its inputs for ``n`` rows (untimed) and returns the timed call.
+
+def case_generate(ctx: dict, n: int):
+    sc, prof = ctx["scenario"], ctx["profile"]
+    hz = int(prof.get("sampling_defaults_hz", 1))
+    sc = {**sc, "dataset": {**sc["dataset"], "duration_s": math.ceil(n / hz)}}
+
+    def fn():
+        for _ in generate_chunks(sc, prof, CHUNK_ROWS):
+            pass
+    return fn
+
+
+def case_load(fmt: str):
+    def prepare_load(ctx: dict, n: int):
+        path = Path(ctx["tmp"]) / f"trace.{fmt}"
+        write_trace_chunks(synthetic_chunks(n, CHUNK_ROWS, 0), path)
+        return lambda: read_trace(path)
+    return prepare_load
+
+
+def case_baseline(algo: str):
+    def prepare_baseline(ctx: dict, n: int):
+        v = ctx["latency"][:n]
+        det = build(algo, "latency_ms", STREAMING_PARAMS[algo], ctx["scenario"], {"latency_ms": v})
+        return lambda: det.run(v, CHUNK_ROWS)
+    return prepare_baseline
+
+
+def case_isoforest(ctx: dict, n: int):
+    from pipeline import forest_params
+    from iforest import predict_frame
+
+    df = synthetic_frame(n)
+    p = DEFAULT_PARAMS["isoforest"]
+    return lambda: predict_frame(df, forest_params(p), list(p["features"]), use_cache=False)
+
+
+def case_confusion(ctx: dict, n: int):
+    pred = Threshold(75.0).run(ctx["latency"][:n], CHUNK_ROWS).astype(bool)
+    gt = ctx["truth"][:n]
+
+    def fn():
+        return confusion(dilate_runs(runs(gt), TOLERANCE_S, n), runs(pred))
+    return fn
+
+
+def case_percentile(ctx: dict, n: int):
+    v = ctx["latency"][:n]
+    return lambda: np.percentile(v, [99, 99.9])
+
+
+def case_sketch(ctx: dict, n: int):
+    v = ctx["latency"][:n]
+
+    def fn():
+        s = QuantileSketch()
+        for i in range(0, n, CHUNK_ROWS):
+            s.add(v[i:i + CHUNK_ROWS])
+        return s.quantile([0.99, 0.999])
+    return fn
+
+
+def case_bootstrap(ctx: dict, n: int):
+    data = synthetic_frame(n)
+    pred = data[["t_s"]].assign(pred=Threshold(75.0).run(data["latency_ms"].to_numpy()))
+    sc, reps = ctx["scenario"], ctx["bootstrap_reps"]
+    return lambda: bootstrap(prepare(sc, data, pred), reps, 0)
+
+
+# name -> (largest size it runs at, preparation)
+CASES = {
+    "generate": (10**8, case_generate),
+    "load:csv": (10**7, case_load("csv")),
+    "load:npz": (10**7, case_load("npz")),
+    "load:parquet": (10**7, case_load("parquet")),
+    **{f"baseline:{a}": (10**8, case_baseline(a)) for a in ["threshold", "zscore", "ewma", "cusum"]},
+    # the rolling-order-statistic detectors run at ~10 us/row, 15+ minutes at 10^8
+    "baseline:mad": (10**7, case_baseline("mad")),
+    "baseline:quantile": (10**7, case_baseline("quantile")),
+    "baseline:isoforest": (10**6, case_isoforest),
+    "dilate+confusion": (10**8, case_confusion),
+    "percentile:exact": (10**8, case_percentile),
+    "percentile:sketch": (10**8, case_sketch),
+    "bootstrap": (10**6, case_bootstrap),
+}
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def calibrate() -> float:
+    """Seconds to sort 2^20 floats, the machine-speed yardstick stored with every run."""
+    v = np.random.default_rng(0).random(1 << 20)
+    return round(best_of(lambda: np.sort(v), 5), 6)
+
+
+def scaling(points: list[dict]) -> dict:
+    """Least-squares exponent ``b`` of ``seconds ~ rows^b`` and the cost per row at the largest size."""
+    fit = [p for p in points if p["seconds"] >= FIT_MIN_SECONDS]
+    out = {"exponent": None, "ns_per_row": None}
+    if len(fit) >= 2:
+        x = np.log([p["rows"] for p in fit])
+        y = np.log([p["seconds"] for p in fit])
+        out["exponent"] = round(float(np.polyfit(x, y, 1)[0]), 3)
+    if points:
+        out["ns_per_row"] = round(points[-1]["seconds"] / points[-1]["rows"] * 1e9, 2)
+    return out
+
+
+def compare(cases: dict, baseline: dict, tolerance: float, min_seconds: float, slack: float,
+            speed: float = 1.0) -> list[str]:
+    """Regressions of ``cases`` against the ``cases`` of a stored results file.
+
+    ``speed`` is this machine's calibration time over the stored one; stored times are
+    scaled by it before the ``tolerance`` check.
+    """
+    problems = []
+    for name, cur in cases.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        before = {p["rows"]: p["seconds"] for p in base["points"]}
+        for p in cur["points"]:
+            b = before.get(p["rows"])
+            if b is None or b < min_seconds:
+                continue
+            b *= speed
+            if p["seconds"] > tolerance * b:
+                problems.append(f"{name} @ {p['rows']:,} rows: {p['seconds']:.4f} s vs {b:.4f} s "
+                                f"({p['seconds'] / b:.1f}x)")
+        # exponents over the sizes both runs cover, so a longer run is not compared to a shorter fit
+        e0 = scaling([p for p in base["points"] if p["rows"] in {q["rows"] for q in cur["points"]}])["exponent"]
+        e1 = scaling([p for p in cur["points"] if p["rows"] in before])["exponent"]
+        if e0 is not None and e1 is not None and e1 - e0 > slack:
+            problems.append(f"{name}: scaling exponent {e1:.2f} vs {e0:.2f}")
+    return problems
+
+
+def plot_curves(cases: dict, out: Path) -> None:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(9, 6))
+    for name, c in cases.items():
+        pts = c["points"]
+        ax.loglog([p["rows"] for p in pts], [p["seconds"] for p in pts], marker="o", label=name)
+    ax.set_xlabel("rows")
+    ax.set_ylabel("seconds")
+    ax.grid(True, which="both", alpha=0.3)
+    ax.legend(fontsize=7, ncol=2)
+    fig.tight_layout()
+    out.parent.mkdir(parents=True, exist_ok=True)
+    fig.savefig(out, dpi=120)
+    plt.close(fig)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Throughput and scaling of generation, loading, baselines, "
+                                             "event counting, percentiles and the bootstrap")
+    ap.add_argument("--sizes", "-n", type=float, nargs="+", default=SIZES,
+                    help="Row counts, e.g. 1e3 1e4 ... 1e8 (default: 10^3 to 10^6)")
+    ap.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    ap.add_argument("--no-caps", action="store_true", help="Run every case at every size, ignoring its cap")
+    ap.add_argument("--repeat", "-r", type=int, default=3, help=f"Runs per point up to {REPEAT_ROWS:,} rows")
+    ap.add_argument("--bootstrap-reps", type=int, default=200, help="Replicates of the bootstrap case")
+    ap.add_argument("--out", "-o", type=Path, default=Path("eval/perf/bench_suite.json"))
+    ap.add_argument("--plot", type=Path, help="Also draw the scaling curves (log-log) to this PNG")
+    ap.add_argument("--compare", type=Path, help="Stored results to check this run against")
+    ap.add_argument("--tolerance", type=float, default=2.0,
+                    help="Flag a point more than this many times slower than the stored one")
+    ap.add_argument("--min-seconds", type=float, default=0.005,
+                    help="Ignore stored points faster than this; they are dominated by timer noise")
+    ap.add_argument("--exponent-slack", type=float, default=0.2,
+                    help="Flag a case whose scaling exponent grew by more than this")
+    ap.add_argument("--workdir", type=Path, help="Directory for the loaders' temporary trace files")
+    args = ap.parse_args()
+
+    sizes = sorted({int(s) for s in args.sizes})
+    names = list(args.cases)
+    if "load:parquet" in names:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print("pyarrow not installed; skipping load:parquet")
+            names.remove("load:parquet")
+
+    cal = calibrate()
+    sc = load_yaml(SCEN)
+    largest = max(n for n in sizes if args.no_caps or any(n <= CASES[c][0] for c in names))
+    latency, truth = synthetic_series(largest, 0)
+    cases = {}
+    print(f"{'case':20s} {'rows':>12s} {'seconds':>10s} {'rows/s':>14s}")
+    with tempfile.TemporaryDirectory(dir=args.workdir) as tmp:
+        ctx = {"scenario": sc, "profile": load_yaml((SCEN.parent / sc["system_profile"]).resolve()),
+               "latency": latency, "truth": truth, "tmp": tmp, "bootstrap_reps": args.bootstrap_reps}
+        for name in names:
+            cap, prepare_case = CASES[name]
+            points = []
+            for n in sizes:
+                if n > cap and not args.no_caps:
+                    continue
+                fn = prepare_case(ctx, n)
+                s = best_of(fn, args.repeat if n <= REPEAT_ROWS else 1)
+                points.append({"rows": n, "seconds": round(s, 6), "rows_per_s": round(n / s, 1)})
+                print(f"{name:20s} {n:12,d} {s:10.4f} {n / s:14,.0f}")
+            cases[name] = {"points": points, **scaling(points)}
+
+    print(f"\n{'case':20s} {'exponent':>8s} {'ns/row':>10s}")
+    for name, c in cases.items():
+        exp = "-" if c["exponent"] is None else f"{c['exponent']:.2f}"
+        print(f"{name:20s} {exp:>8s} {c['ns_per_row']:10.1f}")
+
+    doc = {"created": datetime.now(timezone.utc).isoformat(timespec="seconds"), "host": host(),
+           "calibration_s": cal, "sizes": sizes, "cases": cases}
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    args.out.write_text(json.dumps(doc, indent=2), encoding="utf-8")
+    print(f"Wrote {args.out}")
+    if args.plot:
+        plot_curves(cases, args.plot)
+        print(f"Wrote {args.plot}")
+
+    if args.compare:
+        stored = json.loads(args.compare.read_text(encoding="utf-8"))
+        speed = cal / stored["calibration_s"]
+        print(f"Machine speed vs {args.compare}: calibration {cal:.4f} s vs {stored['calibration_s']:.4f} s")
+        problems = compare(cases, stored["cases"], args.tolerance, args.min_seconds, args.exponent_slack, speed)
+        for p in problems:
+            print(f"SLOWER  {p}")
+        print(f"{len(problems)} regression(s) against {args.compare}" if problems
+              else f"No regressions against {args.compare}")
+        sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+import argparse
+import sys
+import time
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from generate import Timeline, fault_effects, node_weights  # noqa: E402
+from intervals import fault_intervals  # noqa: E402
+
+NODES = [{"id": "a", "role": "api"}, {"id": "b", "role": "api"}, {"id": "c", "role": "db"}]
+
+
+def loop_apply(faults: list[dict], t: np.ndarray, nodes: list[dict] | None) -> list[np.ndarray]:
+    """Fault effects applied one interval at a time, as the reference."""
+    width = 1 if nodes is None else len(nodes)
+    lat, thr, err = np.zeros((len(t), width)), np.ones((len(t), width)), np.zeros((len(t), width))
+    spikes = []
+    for f in faults:
+        dl, de, ft, decay = fault_effects(f)
+        w = np.ones(width) if nodes is None else node_weights(f, nodes)
+        for s, e in fault_intervals(f):
+            on = (t >= s) & (t <= e)
+            lat[on] += dl * w
+            err[on] += de * w
+            thr[on] *= np.where(w > 0, ft, 1.0)
+            if decay is not None:
+                spikes.append((e, decay, dl * w))
+    spikes.sort(key=lambda x: x[0])
+    for r, ti in enumerate(t):
+        ended = [x for x in spikes if x[0] < ti]
+        if ended and ti - ended[-1][0] <= ended[-1][1]:
+            e, decay, mag = ended[-1]
+            lat[r] += mag * np.exp(-(ti - e) / decay)
+    if nodes is None:
+        return [lat[:, 0], thr[:, 0], err[:, 0]]
+    return [lat, thr, err]
+
+
+def timeline_apply(faults: list[dict], t: np.ndarray, nodes: list[dict] | None) -> list[np.ndarray]:
+    shape = len(t) if nodes is None else (len(t), len(nodes))
+    lat, thr, err = np.zeros(shape), np.ones(shape), np.zeros(shape)
+    Timeline(faults, nodes).apply(t, lat, thr, err)
+    return [lat, thr, err]
+
+
+def cases() -> dict[str, list[dict]]:
+    """Overlapping fault mixes, including slowdowns that stop throughput entirely."""
+    halt = {"type": "slowdown", "start_s": 100, "duration_s": 200, "parameters": {"throughput_drop_pct": 100}}
+    slow = {"type": "slowdown", "start_s": 250, "duration_s": 200, "parameters": {"throughput_drop_pct": 10}}
+    return {
+        "stacked": [
+            {"type": "latency_spike", "start_s": 50, "duration_s": 60, "parameters": {"magnitude_ms": 400},
+             "repeat": {"every_s": 300, "count": 4}},
+            {"type": "network_partition", "start_s": 80, "duration_s": 500, "parameters": {}},
+            {**slow, "parameters": {"throughput_drop_pct": 40, "affected_roles": ["db"]}},
+        ],
+        "zero_then_slowdown": [halt, slow],
+        "zero_one_node": [{**halt, "parameters": {"throughput_drop_pct": 100, "affected_nodes": ["a"]}}, slow],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Interval-indexed fault injection vs a per-interval loop")
+    ap.add_argument("--rows", "-n", type=int, default=20_000)
+    args = ap.parse_args()
+
+    t = np.linspace(0, 1500, args.rows)
+    ok = True
+    for name, faults in cases().items():
+        for nodes in (None, NODES):
+            t0 = time.perf_counter()
+            ref = loop_apply(faults, t, nodes)
+            t_loop = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            fast = timeline_apply(faults, t, nodes)
+            t_fast = time.perf_counter() - t0
+            finite = all(np.isfinite(a).all() for a in fast)
+            equal = all(np.allclose(a, b, rtol=1e-9, atol=1e-9) for a, b in zip(ref, fast))
+            ok = ok and finite and equal
+            mode = "aggregate" if nodes is None else "per-node"
+            print(f"{name:20s} {mode:9s} loop {t_loop:7.3f} s  timeline {t_fast:7.4f} s  "
+                  f"{'identical' if equal else 'DIFFERENT'}{'' if finite else '  NON-FINITE'}")
+    print("OK" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
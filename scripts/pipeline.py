@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""The generate -> detect -> evaluate -> plot pipeline as functions over in-memory traces.
+
+Each stage takes and returns plain frames and arrays, so ``resbench all`` runs in one
+interpreter: the trace is generated (or taken from the dataset cache) once, every
+detector runs on its columns directly, and files are written only as artifacts.
+The outputs are the same as chaining ``generate.py``, a baseline CLI,
+``evaluate.py`` and ``plot.py`` through files.
+"""
+from __future__ import annotations
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import yaml
+from cache import content_key, fetch, store
+from defaults import ALGOS, DEFAULT_PARAMS
+from detect import build, load_params
+from detectors import CHUNK_ROWS, detect_file
+from telemetry import manifest_for, profiled
+from traceio import date_format_for, read_trace, write_trace
+
+
+def load_yaml(p: Path) -> dict:
+    return yaml.safe_load(p.read_text(encoding="utf-8"))
+
+
+def with_seed(sc: dict, seed: int | None) -> dict:
+    """The scenario with ``reproducibility.seed`` replaced, unless ``seed`` is None."""
+    if seed is None:
+        return sc
+    return {**sc, "reproducibility": {**sc.get("reproducibility", {}), "seed": int(seed)}}
+
+
+def generate(scenario: Path, out: Path | None = None, use_cache: bool = True, seed: int | None = None) -> pd.DataFrame:
+    """The scenario's aggregate trace, written to ``out`` if given; ``seed`` overrides the scenario's.
+
+    With ``out`` the dataset cache is shared with ``generate.py``: a hit is copied to
+    ``out`` and read back, a miss is generated in memory, written and stored.
+    """
+    from generate import generate_chunks, generation_inputs
+    from ingest import ingest_scenario
+
+    sc = with_seed(load_yaml(scenario), seed)
+    prof = load_yaml((scenario.parent / sc["system_profile"]).resolve())
+    hz = int(prof.get("sampling_defaults_hz", 1))
+    source = sc["dataset"].get("source", "synthetic")
+    if source == "live":
+        raise SystemExit(f"{sc['id']}: dataset.source 'live' cannot be generated; record it and ingest it as 'trace'")
+
+    key = None
+    if out is not None and use_cache:
+        outputs = {f"trace{out.suffix.lower()}": out}
+        key = content_key({**generation_inputs(sc, prof, scenario), "outputs": sorted(outputs)})
+        if fetch(key, outputs) is not None:
+            print(f"Reused cached dataset {key[:12]} for {sc['id']}")
+            return read_trace(out)
+
+    chunks = ingest_scenario(sc, scenario, hz) if source == "trace" else generate_chunks(sc, prof)
+    df = pd.concat(list(chunks), ignore_index=True)
+    if out is not None:
+        out.parent.mkdir(parents=True, exist_ok=True)
+        write_trace(df, out, date_format_for(hz))
+        if key is not None:
+            store(key, outputs, meta={"scenario": sc["id"], "rows": len(df)})
+    return df
+
+
+def training_window(p: dict, sc: dict | None) -> tuple[float, float]:
+    """``[start, end)`` in ``t_s`` of the isoforest training rows for its ``fit`` mode."""
+    if p["fit"] == "warmup":
+        if sc is None:
+            raise ValueError("isoforest fit 'warmup' needs a scenario")
+        return 0.0, float(sc["dataset"].get("warmup_s", 0))
+    if p["fit"] == "window":
+        if p["train_end"] is None:
+            raise ValueError("isoforest fit 'window' needs train_end")
+        return float(p["train_start"]), float(p["train_end"])
+    return 0.0, np.inf
+
+
+def baseline_params(algo: str, params: dict | None = None) -> dict:
+    if algo not in DEFAULT_PARAMS:
+        raise ValueError(f"unknown baseline {algo!r} (expected one of {', '.join(ALGOS)})")
+    return {**DEFAULT_PARAMS[algo], **(params or {})}
+
+
+def forest_params(p: dict) -> dict:
+    return {"contamination": p["contam"], "random_state": p["seed"], "n_estimators": p["n_estimators"],
+            "max_samples": p["max_samples"]}
+
+
+def detect(df: pd.DataFrame, algo: str, sc: dict | None = None, metric: str = "latency_ms",
+           params: dict | None = None, use_cache: bool = True) -> np.ndarray:
+    """0/1 alarms of baseline ``algo`` on ``df``, row for row as its CLI writes them.
+
+    ``params`` override ``DEFAULT_PARAMS[algo]``; the scenario sets the static
+    threshold and the isoforest warmup. IsolationForest uses its features instead of
+    ``metric``.
+    """
+    p = baseline_params(algo, params)
+    if algo != "isoforest":
+        return build(algo, metric, p, sc, df).run(df[metric].to_numpy(dtype=float)).astype(np.int8)
+
+    from iforest import predict_frame  # scikit-learn is only needed here
+
+    start, end = training_window(p, sc)
+    meta = {"scenario": f"isoforest {sc['id']}" if sc else "isoforest"}
+    return predict_frame(df, forest_params(p), list(p["features"]), start, end, p["n_jobs"], use_cache, meta)
+
+
+def baseline_file(inp: Path, out: Path, algo: str, sc: dict | None = None, metric: str = "latency_ms",
+                  params: dict | None = None, use_cache: bool = True, chunk_rows: int = CHUNK_ROWS) -> int:
+    """Stream a trace file through baseline ``algo`` into a ``ts, t_s, pred`` file in bounded memory."""
+    p = baseline_params(algo, params)
+    if algo != "isoforest":
+        reference = read_trace(inp, [metric]) if algo == "cusum" else None
+        return detect_file(build(algo, metric, p, sc, reference), inp, out, metric, chunk_rows)
+
+    from iforest import fit_model, score_file, training_rows
+
+    features = list(p["features"])
+    start, end = training_window(p, sc)
+    X, first = training_rows(inp, features, start, end, chunk_rows)
+    if not len(X):
+        raise SystemExit(f"{inp}: no training rows with {start:g} <= t_s < {end:g}")
+    model, _ = fit_model(X, forest_params(p), p["n_jobs"], {"scenario": f"isoforest {inp.name}"}, use_cache)
+    return score_file(model, inp, out, features, first, chunk_rows)
+
+
+def evaluate(sc: dict, df: pd.DataFrame, pred: np.ndarray | None = None, head: dict | None = None) -> dict:
+    from evaluate import evaluate_frame
+
+    return evaluate_frame(sc, df, pred, head)
+
+
+def plot(sc: dict, df: pd.DataFrame, out: Path) -> None:
+    from plot import plot_trace  # matplotlib is only needed here
+
+    plot_trace(sc, df, out)
+
+
+def write_predictions(df: pd.DataFrame, pred: np.ndarray, out: Path) -> None:
+    out.parent.mkdir(parents=True, exist_ok=True)
+    write_trace(df[["ts", "t_s"]].assign(pred=pred.astype(int)), out)
+
+
+def run_all(scenario: Path, prefix: str, algo: str = "threshold", metric: str = "latency_ms",
+            params: dict | None = None, reports: Path = Path("eval/reports"), use_cache: bool = True,
+            profile: bool = False) -> dict:
+    """Generate, detect, evaluate and plot one scenario in this process.
+
+    Writes ``{prefix}.csv``, ``{prefix}_pred.csv``, ``{reports}/{stem}_report.csv`` and
+    ``{reports}/{stem}.png``, and returns the report row. With ``profile`` each stage's
+    timings go to a fresh ``{reports}/{stem}_run.json`` manifest.
+    """
+    report = reports / f"{scenario.stem}_report.csv"
+    manifest = manifest_for(report) if profile else None
+    if manifest is not None:
+        manifest.unlink(missing_ok=True)
+
+    sc = load_yaml(scenario)
+    with profiled(manifest, "generate") as stage:
+        df = generate(scenario, Path(f"{prefix}.csv"), use_cache)
+        stage.rows = len(df)
+    with profiled(manifest, f"baseline:{algo}") as stage:
+        pred = detect(df, algo, sc, metric, params, use_cache)
+        write_predictions(df, pred, Path(f"{prefix}_pred.csv"))
+        stage.rows = len(pred)
+
+    with profiled(manifest, "evaluate") as stage:
+        row = evaluate(sc, df, pred)
+        stage.rows = int((df["t_s"] >= int(sc["dataset"].get("warmup_s", 0))).sum())
+    reports.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame([row]).to_csv(report, index=False)
+    try:
+        print(pd.DataFrame([row]).to_markdown(index=False))
+    except Exception:
+        print(row)
+    with profiled(manifest, "plot") as stage:
+        plot(sc, df, reports / f"{scenario.stem}.png")
+        stage.rows = len(df)
+    return row
+
+
+def main(argv: list[str] | None = None):
+    ap = argparse.ArgumentParser(description="Generate, detect, evaluate and plot a scenario in one process")
+    ap.add_argument("--scenario", "-s", type=Path, required=True)
+    ap.add_argument("--prefix", default="eval/samples/sample",
+                    help="The trace and predictions are written to PREFIX.csv and PREFIX_pred.csv")
+    ap.add_argument("--algo", choices=ALGOS, default="threshold")
+    ap.add_argument("--metric", "-m", default="latency_ms")
+    ap.add_argument("--params", type=Path,
+                    help="YAML of per-baseline parameters overriding the defaults, e.g. isoforest: {fit: warmup}")
+    ap.add_argument("--reports", "-r", type=Path, default=Path("eval/reports"))
+    ap.add_argument("--no-cache", action="store_true", help="Regenerate the trace and refit models")
+    ap.add_argument("--profile", action="store_true",
+                    help="Record each stage's time, memory and throughput in REPORTS/<scenario>_run.json")
+    args = ap.parse_args(argv)
+
+    params = load_params(args.params, DEFAULT_PARAMS)[args.algo]
+    run_all(args.scenario, args.prefix, args.algo, args.metric, params, args.reports, not args.no_cache, args.profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,214 @@
 #!/usr/bin/env python3
+"""Latency and throughput over time, with the scenario's ground-truth intervals shaded.
+
+Traces are decimated before they reach matplotlib: a 10^7-sample line cannot look
+any different from a few thousand well-chosen points at 1200 pixels wide.
+``minmax`` (the default) keeps the lowest and highest sample of each of
+``points / 2`` equal-count buckets, about one bucket per pixel column, so every
+spike and dip stays visible. ``lttb`` (Largest-Triangle-Three-Buckets) keeps
+``points`` samples that follow the shape of the line. ``--manifest`` plots every
+trace of an evaluation manifest on a pool of worker processes.
+"""
 from __future__ import annotations
 import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import yaml
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+import yaml
+from intervals import ground_truth_intervals
+from telemetry import profiled
+from traceio import read_trace
+import matplotlib
+matplotlib.use("Agg")  # files only: no display, no GUI event loop
+import matplotlib.dates as mdates  # noqa: E402
+import matplotlib.pyplot as plt  # noqa: E402
+
+FIGSIZE = (10, 4)
+DPI = 120
+# a minimum and a maximum per pixel column of the figure
+DEFAULT_POINTS = 2 * FIGSIZE[0] * DPI
+# samples scanned per block by minmax_indices, bounding its temporary copies
+BLOCK_ROWS = 1 << 20
 
 
 def load_yaml(p: Path) -> dict:
     return yaml.safe_load(p.read_text(encoding="utf-8"))
 
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--scenario", "-s", type=Path, required=True)
-    ap.add_argument("--data", "-d", type=Path, required=True)
-    ap.add_argument("--out", "-o", type=Path, required=True)
-    args = ap.parse_args()
-
-    sc = load_yaml(args.scenario)
-    df = pd.read_csv(args.data, parse_dates=["ts"])
-
-    fig, ax = plt.subplots(figsize=(10, 4))
-    if "latency_ms" in df.columns:
-        ax.plot(df["ts"], df["latency_ms"], label="latency_ms")
-    if "throughput_rps" in df.columns:
-        ax.plot(df["ts"], df["throughput_rps"], label="throughput_rps")
+def minmax_indices(y: np.ndarray, buckets: int) -> np.ndarray:
+    """Sorted indices of the first and last sample and of each equal-count bucket's minimum and maximum.
+
+    NaN samples lose to any number, so a gap survives only where a whole bucket is NaN.
+    """
+    n = len(y)
+    if n <= 2 * buckets:
+        return np.arange(n)
+    k = -(-n // buckets)
+    step = k * max(1, BLOCK_ROWS // k)
+    parts = [np.array([0, n - 1])]
+    for i0 in range(0, n, step):
+        block = np.asarray(y[i0:i0 + step], dtype=float)
+        width = -(-len(block) // k) * k
+        nan = np.isnan(block)
+        lo = np.full(width, np.inf)
+        lo[:len(block)] = np.where(nan, np.inf, block)
+        hi = np.full(width, -np.inf)
+        hi[:len(block)] = np.where(nan, -np.inf, block)
+        start = i0 + np.arange(0, width, k)
+        parts += [start + lo.reshape(-1, k).argmin(axis=1), start + hi.reshape(-1, k).argmax(axis=1)]
+    idx = np.unique(np.concatenate(parts))
+    return idx[idx < n]
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """Indices of ``points`` samples chosen by Largest-Triangle-Three-Buckets.
+
+    The first and last samples are kept. Every bucket in between contributes the sample
+    spanning the largest triangle with the previously kept sample and the mean of the
+    next bucket.
+    """
+    n = len(y)
+    if points >= n or points < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    out = np.empty(points, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for b in range(points - 2):
+        s, e = edges[b], edges[b + 1]
+        ns, ne = (edges[b + 1], edges[b + 2]) if b + 2 < len(edges) else (n - 1, n)
+        ny = y[ns:ne]
+        ny = ny[~np.isnan(ny)]
+        cx, cy = x[ns:ne].mean(), (ny.mean() if len(ny) else y[a])
+        area = np.abs((x[a] - cx) * (y[s:e] - y[a]) - (x[a] - x[s:e]) * (cy - y[a]))
+        a = s + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        out[b + 1] = a
+    return out
+
+
+def decimate_indices(t_s: np.ndarray, y: np.ndarray, method: str, points: int) -> np.ndarray:
+    if method == "minmax":
+        return minmax_indices(y, max(points // 2, 1))
+    if method == "lttb":
+        return lttb_indices(t_s, y, points)
+    return np.arange(len(y))
+
+
+def shade_faults(ax, sc: dict, t_s: np.ndarray, ts: pd.Series) -> None:
+    """Shade every ground-truth interval, clipped to the trace, as one collection.
+
+    Interval edges are placed between the samples around them by linear
+    interpolation of ``ts``, so a trace with gaps is shaded at the right times.
+    """
+    iv = ground_truth_intervals(sc)
+    if not len(iv) or len(t_s) < 2:
+        return
+    iv = np.clip(iv, t_s[0], t_s[-1])
+    iv = iv[iv[:, 1] > iv[:, 0]]
+    if not len(iv):
+        return
+    edges = iv.ravel()
+    j = np.clip(np.searchsorted(t_s, edges), 1, len(t_s) - 1)
+    lo, hi = mdates.date2num(ts.iloc[j - 1]), mdates.date2num(ts.iloc[j])
+    w = (edges - t_s[j - 1]) / np.maximum(t_s[j] - t_s[j - 1], 1e-12)
+    x = (lo + w * (hi - lo)).reshape(-1, 2)
+    ax.broken_barh(list(zip(x[:, 0], x[:, 1] - x[:, 0])), (0, 1), transform=ax.get_xaxis_transform(),
+                   alpha=0.12, label="ground truth")
+
+
+def plot_trace(sc: dict, df: pd.DataFrame, out: Path, decimate: str = "minmax",
+               points: int = DEFAULT_POINTS) -> None:
+    """Latency and throughput over time, with the scenario's ground-truth intervals shaded."""
+    fig, ax = plt.subplots(figsize=FIGSIZE)
+    t = df["ts"]
+    t_s = df["t_s"].to_numpy(dtype=float)
+    for m in ["latency_ms", "throughput_rps"]:
+        if m in df.columns:
+            y = df[m].to_numpy(dtype=float)
+            idx = decimate_indices(t_s, y, decimate, points)
+            ax.plot(t.iloc[idx], y[idx], label=m)
+    shade_faults(ax, sc, t_s, t)
     ax.set_xlabel("time")
     ax.legend(loc="best")
-    g0, g1 = sc["ground_truth"]["positive_interval_s"]
-    t = df["ts"]
-    ax.axvspan(t.iloc[g0], t.iloc[min(g1, len(t) - 1)], alpha=0.12, label="fault")
-    args.out.parent.mkdir(parents=True, exist_ok=True)
+    out.parent.mkdir(parents=True, exist_ok=True)
     fig.tight_layout()
-    fig.savefig(args.out, dpi=120)
+    fig.savefig(out, dpi=DPI)
     plt.close(fig)
 
 
+def plot_file(scenario: Path, data: Path, out: Path, decimate: str = "minmax", points: int = DEFAULT_POINTS) -> int:
+    df = read_trace(data)
+    plot_trace(load_yaml(scenario), df, out, decimate, points)
+    return len(df)
+
+
+def manifest_jobs(manifest: Path, out_dir: Path) -> list[tuple[Path, Path, Path]]:
+    """``(scenario, data, png)`` of every distinct trace of an ``evaluate.py --manifest`` manifest.
+
+    Each PNG is named after its trace file; predictions in the manifest are ignored.
+    """
+    doc = load_yaml(manifest)
+    base = manifest.parent
+    jobs: dict[Path, tuple[Path, Path, Path]] = {}
+    for run in doc["runs"]:
+        data = (base / run["data"]).resolve()
+        jobs.setdefault(data, ((base / run["scenario"]).resolve(), data, out_dir / f"{data.stem}.png"))
+    pngs = [png for _, _, png in jobs.values()]
+    if len(set(pngs)) != len(pngs):
+        raise SystemExit(f"{manifest}: two traces share a file stem and would write the same plot")
+    return list(jobs.values())
+
+
+def plot_batch(jobs: list[tuple[Path, Path, Path]], workers: int = 1, decimate: str = "minmax",
+               points: int = DEFAULT_POINTS) -> int:
+    """Plot every ``(scenario, data, png)`` job on ``workers`` processes; returns the rows plotted."""
+    rows = 0
+    if workers <= 1 or len(jobs) <= 1:
+        for scenario, data, out in jobs:
+            rows += plot_file(scenario, data, out, decimate, points)
+            print(f"Wrote {out}")
+        return rows
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        futures = [pool.submit(plot_file, scenario, data, out, decimate, points) for scenario, data, out in jobs]
+        for (_, _, out), fut in zip(jobs, futures):
+            rows += fut.result()
+            print(f"Wrote {out}")
+    return rows
+
+
+def main(argv: list[str] | None = None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scenario", "-s", type=Path)
+    ap.add_argument("--data", "-d", type=Path)
+    ap.add_argument("--out", "-o", type=Path)
+    ap.add_argument("--decimate", choices=["minmax", "lttb", "none"], default="minmax",
+                    help="minmax: min and max per bucket, keeps every spike (default); lttb: shape-preserving; "
+                         "none: every sample")
+    ap.add_argument("--points", type=int, default=DEFAULT_POINTS,
+                    help="Samples kept per series after decimation (default: two per pixel column)")
+    ap.add_argument("--manifest", "-m", type=Path,
+                    help="Plot every trace of an evaluate.py manifest into --out-dir as <trace stem>.png")
+    ap.add_argument("--out-dir", type=Path, default=Path("eval/reports/plots"))
+    ap.add_argument("--workers", "-j", type=int, default=os.cpu_count() or 1,
+                    help="Worker processes for --manifest")
+    ap.add_argument("--profile", type=Path, metavar="MANIFEST",
+                    help="Append this stage's time, memory and throughput to a JSON run manifest")
+    args = ap.parse_args(argv)
+
+    if args.manifest:
+        jobs = manifest_jobs(args.manifest, args.out_dir)
+        with profiled(args.profile, "plot") as stage:
+            stage.rows = plot_batch(jobs, args.workers, args.decimate, args.points)
+        return
+    if args.scenario is None or args.data is None or args.out is None:
+        ap.error("--scenario, --data and --out are required unless --manifest is given")
+
+    with profiled(args.profile, "plot") as stage:
+        stage.rows = plot_file(args.scenario, args.data, args.out, args.decimate, args.points)
+
 if __name__ == "__main__":
     main()
@@ -4,14 +4,17 @@ import argparse
 from pathlib import Path
 from datetime import datetime, timezone
 import pandas as pd
+from telemetry import load_manifests
 
+PERF_COLUMNS = ["run", "stage", "rows", "wall_s", "cpu_s", "peak_rss_mb", "rows_per_s"]
 
-def main():
+
+def main(argv: list[str] | None = None):
     ap = argparse.ArgumentParser()
     ap.add_argument("--reports", "-r", type=Path, default=Path("eval/reports"))
     ap.add_argument("--out", "-o", type=Path, default=Path("eval/reports/index.html"))
     ap.add_argument("--title", "-t", type=str, default="ResilienceBench Report")
-    args = ap.parse_args()
+    args = ap.parse_args(argv)
 
     args.reports.mkdir(parents=True, exist_ok=True)
     csvs = sorted(args.reports.glob("*.csv"))
@@ -30,12 +33,19 @@ def main():
         frames.append(df)
 
     table = pd.concat(frames, ignore_index=True)
+    perf = ""
+    stages = load_manifests(args.reports)
+    if stages:
+        # stage records written with --profile; extra fields such as cached follow the fixed columns
+        pt = pd.DataFrame(stages).drop(columns=["started"], errors="ignore")
+        pt = pt[PERF_COLUMNS + [c for c in pt.columns if c not in PERF_COLUMNS]]
+        perf = f"<h2>Performance</h2>\n{pt.to_html(index=False, na_rep='')}"
     ts = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S %Z")
     html = f"""<!doctype html><html><head><meta charset="utf-8">
 <title>{args.title}</title><meta name="viewport" content="width=device-width, initial-scale=1">
 <style>
 body{{font-family:system-ui,-apple-system,Segoe UI,Roboto,Ubuntu,"Helvetica Neue",Arial,sans-serif;margin:24px}}
-h1{{font-size:20px;margin:0 0 12px}} small{{color:#666}}
+h1{{font-size:20px;margin:0 0 12px}} h2{{font-size:16px;margin:24px 0 0}} small{{color:#666}}
 table{{border-collapse:collapse;width:100%;margin-top:16px}}
 th,td{{border:1px solid #ddd;padding:8px;font-size:14px;text-align:left}}
 th{{background:#fafafa}} tr:nth-child(even){{background:#fbfbfb}}
@@ -45,6 +55,7 @@ img{{max-width:100%;height:auto;border:1px solid #eee}}
 </style></head><body>
 <h1>{args.title}</h1><small>Generated: {ts}</small>
 {table.to_html(index=False, escape=False)}
+{perf}
 </body></html>"""
     args.out.parent.mkdir(parents=True, exist_ok=True)
     args.out.write_text(html, encoding="utf-8")
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""Sliding-window order statistics in O(log w) per sample.
+
+:class:`IndexableSkiplist` keeps the finite values of the window sorted. Every
+link records how many bottom-level nodes it skips, so inserting, removing and
+reading the ``i``-th smallest value each walk O(log w) nodes. This is the
+structure pandas' rolling median uses internally. :class:`RollingOrder` slides it
+over a stream and answers quantiles, the median and the median absolute
+deviation of the last ``window`` samples. The MAD needs no second structure,
+because the ``k`` values closest to the median are contiguous in sorted order.
+"""
+from __future__ import annotations
+import math
+import random
+from collections import deque
+
+_INF = float("inf")
+
+
+class _Node:
+    __slots__ = ("value", "next", "width")
+
+    def __init__(self, value: float, levels: int):
+        self.value = value
+        self.next: list = [None] * levels
+        self.width = [1] * levels
+
+
+class IndexableSkiplist:
+    """Sorted multiset of floats with O(log n) ``insert``, ``remove`` and ``[i]``.
+
+    ``expected_size`` sets the number of levels; it should be the largest size
+    the list reaches (the window length).
+    """
+
+    def __init__(self, expected_size: int = 100, seed: int = 0):
+        self.size = 0
+        self.levels = max(1, int(math.log2(max(expected_size, 2))) + 1)
+        self._nil = _Node(_INF, 0)
+        self.head = _Node(-_INF, self.levels)
+        self.head.next = [self._nil] * self.levels
+        self._down = range(self.levels - 1, -1, -1)
+        # node heights are random but fixed by the seed; they never affect results
+        self._rng = random.Random(seed)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, i: int) -> float:
+        if not 0 <= i < self.size:
+            raise IndexError(i)
+        node = self.head
+        i += 1
+        for level in self._down:
+            width = node.width[level]
+            while width <= i:
+                i -= width
+                node = node.next[level]
+                width = node.width[level]
+        return node.value
+
+    def insert(self, value: float) -> None:
+        chain = [self.head] * self.levels
+        steps = [0] * self.levels
+        node = self.head
+        for level in self._down:
+            while node.next[level].value <= value:
+                steps[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+        height = 1
+        while height < self.levels and self._rng.random() < 0.5:
+            height += 1
+        new = _Node(value, height)
+        skipped = 0
+        for level in range(height):
+            prev = chain[level]
+            new.next[level] = prev.next[level]
+            prev.next[level] = new
+            new.width[level] = prev.width[level] - skipped
+            prev.width[level] = skipped + 1
+            skipped += steps[level]
+        for level in range(height, self.levels):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, value: float) -> None:
+        chain = [self.head] * self.levels
+        node = self.head
+        for level in self._down:
+            while node.next[level].value < value:
+                node = node.next[level]
+            chain[level] = node
+        target = chain[0].next[0]
+        if target.value != value:
+            raise KeyError(value)
+        for level in range(len(target.next)):
+            prev = chain[level]
+            prev.width[level] += target.width[level] - 1
+            prev.next[level] = target.next[level]
+        for level in range(len(target.next), self.levels):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+
+def lerp(a: float, b: float, t: float) -> float:
+    """``a + (b - a) * t`` rounded as ``np.quantile``'s linear method rounds it."""
+    return b - (b - a) * (1 - t) if t >= 0.5 else a + (b - a) * t
+
+
+class RollingOrder:
+    """Order statistics of the last ``window`` samples of a stream; NaNs take a slot but are skipped."""
+
+    def __init__(self, window: int):
+        if window < 1:
+            raise ValueError("window must be >= 1")
+        self.window = window
+        self.values: deque = deque()
+        self.sorted = IndexableSkiplist(window)
+        self._run = 0  # start of the previous window's run of values nearest its median
+
+    def __len__(self) -> int:
+        """Finite samples in the window."""
+        return len(self.sorted)
+
+    def push(self, x: float) -> None:
+        if len(self.values) == self.window:
+            old = self.values.popleft()
+            if not math.isnan(old):
+                self.sorted.remove(old)
+        self.values.append(x)
+        if not math.isnan(x):
+            self.sorted.insert(x)
+
+    def quantile(self, q: float) -> float:
+        """Linearly interpolated ``q``-quantile, as ``np.quantile``; NaN on an empty window."""
+        n = len(self.sorted)
+        if not n:
+            return math.nan
+        h = (n - 1) * q
+        lo = math.floor(h)
+        a = self.sorted[lo]
+        return a if lo + 1 >= n else lerp(a, self.sorted[lo + 1], h - lo)
+
+    def median(self) -> float:
+        n = len(self.sorted)
+        if not n:
+            return math.nan
+        s = self.sorted
+        return s[n // 2] if n % 2 else (s[n // 2 - 1] + s[n // 2]) / 2
+
+    def median_mad(self) -> tuple[float, float]:
+        """Median and median absolute deviation from it, as ``np.median`` computes both.
+
+        The ``k`` values nearest the median occupy a contiguous run of sorted
+        positions ``[a, a + k)``: ``a`` is the first position where
+        ``m - s[a] <= s[a + k] - m``. Consecutive windows move ``a`` by a few
+        positions, so it is found by galloping from the previous window's ``a``,
+        in O(log w) lookups at worst and usually three or four. The ``k``-th
+        smallest deviation is the larger of the run's end deviations; the next
+        one lies just outside the run.
+        """
+        n = len(self.sorted)
+        if not n:
+            return math.nan, math.nan
+        s = self.sorted
+        m = self.median()
+        k = (n + 1) // 2
+
+        def left_of_run(a: int) -> bool:
+            return m - s[a] > s[a + k] - m
+
+        lo, hi = 0, n - k  # the answer lies in [lo, hi]
+        g = min(max(self._run, lo), hi)
+        step = 1
+        if g < hi and left_of_run(g):
+            lo = g + 1
+            while lo + step - 1 < hi and left_of_run(lo + step - 1):
+                lo += step
+                step *= 2
+            hi = min(lo + step - 1, hi)
+        else:
+            hi = g
+            while hi - step >= lo and not left_of_run(hi - step):
+                hi -= step
+                step *= 2
+            lo = max(hi - step + 1, lo)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if left_of_run(mid):
+                lo = mid + 1
+            else:
+                hi = mid
+        self._run = lo
+        kth = max(m - s[lo], s[lo + k - 1] - m)
+        if n % 2:
+            return m, kth
+        left = m - s[lo - 1] if lo > 0 else _INF
+        right = s[lo + k] - m if lo + k < n else _INF
+        return m, (kth + min(left, right)) / 2
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""Mergeable quantile sketch for tail metrics over traces larger than memory.
+
+A log-bucketed histogram in the style of DDSketch: a value ``x > 0`` falls in bucket
+``ceil(log_gamma(x))`` with ``gamma = (1 + a) / (1 - a)``, and every bucket is
+represented by a value within relative error ``a`` of anything it holds. Quantiles
+are therefore accurate to ``a`` relative to the exact order statistic, whatever the
+data size. Two sketches with the same ``a`` merge by adding bucket counts, so shards,
+chunks or seeds can be sketched independently and combined later.
+
+Negative values are bucketed by magnitude in a mirrored store; values with
+``|x| < min_value`` are counted as zero.
+"""
+from __future__ import annotations
+import argparse
+import json
+from pathlib import Path
+import numpy as np
+
+DEFAULT_REL_ERROR = 0.01
+DEFAULT_MIN_VALUE = 1e-9
+MAX_BUCKETS = 1 << 14
+
+
+class _Store:
+    """Dense bucket counts for keys ``offset .. offset + len(counts) - 1``."""
+
+    def __init__(self, offset: int = 0, counts: np.ndarray | None = None):
+        self.offset = offset
+        self.counts = np.zeros(0, dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+
+    def _extend(self, lo: int, hi: int) -> None:
+        if not len(self.counts):
+            self.offset, self.counts = lo, np.zeros(hi - lo + 1, dtype=np.int64)
+            return
+        new_lo, new_hi = min(lo, self.offset), max(hi, self.offset + len(self.counts) - 1)
+        if (new_lo, new_hi) != (self.offset, self.offset + len(self.counts) - 1):
+            grown = np.zeros(new_hi - new_lo + 1, dtype=np.int64)
+            grown[self.offset - new_lo:self.offset - new_lo + len(self.counts)] = self.counts
+            self.offset, self.counts = new_lo, grown
+
+    def add_keys(self, keys: np.ndarray) -> None:
+        if not len(keys):
+            return
+        lo, hi = int(keys.min()), int(keys.max())
+        self.add_counts(lo, np.bincount(keys - lo, minlength=hi - lo + 1))
+
+    def add_counts(self, offset: int, counts: np.ndarray) -> None:
+        if not len(counts):
+            return
+        self._extend(offset, offset + len(counts) - 1)
+        self.counts[offset - self.offset:offset - self.offset + len(counts)] += counts
+        self._collapse()
+
+    def _collapse(self) -> None:
+        # fold the lowest buckets together so memory stays bounded; the upper tail keeps full accuracy
+        extra = len(self.counts) - MAX_BUCKETS
+        if extra > 0:
+            self.counts[extra] += self.counts[:extra].sum()
+            self.counts = self.counts[extra:].copy()
+            self.offset += extra
+
+    def keys(self) -> np.ndarray:
+        return self.offset + np.arange(len(self.counts))
+
+
+class QuantileSketch:
+    """Relative-error quantile sketch; see the module docstring."""
+
+    def __init__(self, rel_error: float = DEFAULT_REL_ERROR, min_value: float = DEFAULT_MIN_VALUE):
+        if not 0 < rel_error < 1:
+            raise ValueError("rel_error must be in (0, 1)")
+        self.rel_error = float(rel_error)
+        self.min_value = float(min_value)
+        self.gamma = (1 + self.rel_error) / (1 - self.rel_error)
+        self.log_gamma = np.log(self.gamma)
+        self.pos = _Store()
+        self.neg = _Store()
+        self.zero = 0
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.sum = 0.0
+
+    def _key(self, x: np.ndarray) -> np.ndarray:
+        return np.ceil(np.log(x) / self.log_gamma).astype(np.int64)
+
+    def _value(self, keys: np.ndarray) -> np.ndarray:
+        return 2 * np.power(self.gamma, keys.astype(float)) / (self.gamma + 1)
+
+    def add(self, values) -> "QuantileSketch":
+        """Add an array of values; NaNs are skipped."""
+        x = np.asarray(values, dtype=float).ravel()
+        x = x[~np.isnan(x)]
+        if not len(x):
+            return self
+        self.count += len(x)
+        self.sum += float(x.sum())
+        self.min = min(self.min, float(x.min()))
+        self.max = max(self.max, float(x.max()))
+        pos = x > self.min_value
+        neg = x < -self.min_value
+        self.pos.add_keys(self._key(x[pos]))
+        self.neg.add_keys(self._key(-x[neg]))
+        self.zero += int(len(x) - pos.sum() - neg.sum())
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        if (other.rel_error, other.min_value) != (self.rel_error, self.min_value):
+            raise ValueError("cannot merge sketches with different rel_error/min_value")
+        self.pos.add_counts(other.pos.offset, other.pos.counts)
+        self.neg.add_counts(other.neg.offset, other.neg.counts)
+        self.zero += other.zero
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """Quantile(s) ``q`` in [0, 1], interpolated between order statistics like ``np.percentile``."""
+        q = np.asarray(q, dtype=float)
+        if self.count == 0:
+            return np.full(q.shape, np.nan) if q.ndim else float("nan")
+        values = np.concatenate([-self._value(self.neg.keys())[::-1], [0.0], self._value(self.pos.keys())])
+        counts = np.concatenate([self.neg.counts[::-1], [self.zero], self.pos.counts])
+        cum = np.cumsum(counts)
+        rank = q * (self.count - 1)
+        lo = np.floor(rank)
+        v_lo = values[np.searchsorted(cum, lo, side="right")]
+        v_hi = values[np.searchsorted(cum, np.minimum(lo + 1, self.count - 1), side="right")]
+        out = np.clip(v_lo + (rank - lo) * (v_hi - v_lo), self.min, self.max)
+        return out if q.ndim else float(out)
+
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else float("nan")
+
+    def to_dict(self) -> dict:
+        return {
+            "rel_error": self.rel_error, "min_value": self.min_value,
+            "count": self.count, "zero": self.zero, "sum": self.sum, "min": self.min, "max": self.max,
+            "pos": {"offset": self.pos.offset, "counts": self.pos.counts.tolist()},
+            "neg": {"offset": self.neg.offset, "counts": self.neg.counts.tolist()},
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "QuantileSketch":
+        s = cls(d["rel_error"], d["min_value"])
+        s.count, s.zero, s.sum = int(d["count"]), int(d["zero"]), float(d["sum"])
+        s.min, s.max = float(d["min"]), float(d["max"])
+        s.pos = _Store(d["pos"]["offset"], d["pos"]["counts"])
+        s.neg = _Store(d["neg"]["offset"], d["neg"]["counts"])
+        return s
+
+
+def save_sketches(sketches: dict[str, QuantileSketch], path: Path, meta: dict | None = None) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    doc = {**(meta or {}), "sketches": {k: s.to_dict() for k, s in sketches.items()}}
+    path.write_text(json.dumps(doc), encoding="utf-8")
+
+
+def load_sketches(path: Path) -> dict[str, QuantileSketch]:
+    doc = json.loads(path.read_text(encoding="utf-8"))
+    return {k: QuantileSketch.from_dict(d) for k, d in doc["sketches"].items()}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Merge tail sketches written by evaluate.py --sketch-out")
+    ap.add_argument("sketches", type=Path, nargs="+")
+    ap.add_argument("--quantiles", "-q", type=float, nargs="+", default=[0.99, 0.999])
+    ap.add_argument("--out", "-o", type=Path, help="Write the merged sketches here")
+    args = ap.parse_args()
+
+    merged: dict[str, QuantileSketch] = {}
+    for p in args.sketches:
+        for metric, s in load_sketches(p).items():
+            if metric in merged:
+                merged[metric].merge(s)
+            else:
+                merged[metric] = s
+    for metric, s in merged.items():
+        qs = ", ".join(f"q{q:g}={v:.3f}" for q, v in zip(args.quantiles, s.quantile(args.quantiles)))
+        print(f"{metric}: n={s.count} {qs}")
+    if args.out:
+        save_sketches(merged, args.out, {"sources": [str(p) for p in args.sketches]})
+
+
+if __name__ == "__main__":
+    main()
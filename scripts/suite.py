@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""Scenario x detector x seed benchmark matrix as an incremental task graph.
+
+:func:`expand` turns the matrix into ``gen``, ``detect``, ``eval`` and ``plot``
+tasks. A task's key hashes what it reads (the scenario with its seed, detector
+parameters, the code it runs) together with the keys of the tasks it depends on, so
+editing a scenario or a detector invalidates exactly the tasks downstream of it.
+Ready tasks run on a process pool. The key of every finished task is written to the
+state file as it completes. A later run skips tasks whose key is recorded and whose
+outputs exist, so it repeats only changed work, and an interrupted run resumes where
+it stopped.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from importlib.metadata import version
+from pathlib import Path
+import pandas as pd
+from cache import content_key, file_digest
+from generate import generation_inputs
+from pipeline import (ALGOS, DEFAULT_PARAMS, baseline_file, evaluate, generate, load_params, load_yaml, plot,
+                      with_seed)
+from traceio import read_trace
+
+HERE = Path(__file__).resolve().parent
+# sources each kind of task runs; editing one reruns those tasks
+CODE = {
+    "detect": ["defaults.py", "detect.py", "detectors.py", "rolling.py", "iforest.py", "pipeline.py", "traceio.py"],
+    "eval": ["evaluate.py", "intervals.py", "traceio.py"],
+    "plot": ["plot.py", "intervals.py", "traceio.py"],
+}
+
+
+def code_digest(kind: str) -> dict[str, str]:
+    return {name: file_digest(HERE / name) for name in CODE[kind]}
+
+
+def scenario_metric(sc: dict, default: str, overrides: dict[str, str]) -> str:
+    """Metric the detectors watch: a per-scenario override, the fault's target metric, then ``default``."""
+    target = (sc.get("failure") or {}).get("parameters", {}).get("target_metric")
+    return overrides.get(sc["id"]) or target or default
+
+
+def expand(scenarios: list[Path], detectors: list[str], seeds: list[int] | None, out: Path, params: dict,
+           metric: str = "latency_ms", metric_overrides: dict[str, str] | None = None,
+           plots: bool = True) -> list[dict]:
+    """The task graph of the matrix, in dependency order.
+
+    A task is ``{"id", "kind", "deps", "key", "outputs", "spec"}``; ``spec`` is what
+    :func:`run_task` needs to run it in a worker. Recorded traces are not seeded, so
+    they get one run at the scenario's own seed.
+    """
+    tasks = []
+    keys: dict[str, str] = {}
+
+    def add(kind: str, name: str, deps: list[str], inputs: dict, outputs: list[Path], spec: dict) -> str:
+        tid = f"{kind}:{name}"
+        keys[tid] = content_key({"kind": kind, "inputs": inputs, "deps": [keys[d] for d in deps]})
+        tasks.append({"id": tid, "kind": kind, "deps": deps, "key": keys[tid],
+                      "outputs": [str(p) for p in outputs], "spec": spec})
+        return tid
+
+    code = {kind: code_digest(kind) for kind in CODE}
+    for path in scenarios:
+        base = load_yaml(path)
+        prof = load_yaml((path.parent / base["system_profile"]).resolve())
+        trace = base["dataset"].get("source") == "trace"
+        run_seeds = [int(base["reproducibility"]["seed"])] if trace or not seeds else seeds
+        m = scenario_metric(base, metric, metric_overrides or {})
+        for seed in run_seeds:
+            sc = with_seed(base, seed)
+            run = f"{path.stem}_s{seed}"
+            data = out / "data" / f"{run}.csv"
+            gen = add("gen", run, [], generation_inputs(sc, prof, path), [data],
+                      {"scenario": str(path), "seed": seed, "out": str(data)})
+            if plots:
+                png = out / "plots" / f"{run}.png"
+                add("plot", run, [gen], {"scenario": sc, "code": code["plot"]}, [png],
+                    {"scenario": str(path), "seed": seed, "data": str(data), "out": str(png)})
+            for algo in detectors:
+                pred = out / "pred" / f"{run}_{algo}.csv"
+                report = out / "reports" / f"{run}_{algo}_report.csv"
+                p = params[algo]
+                inputs = {"scenario": sc, "algo": algo, "params": p, "metric": m, "code": code["detect"]}
+                if algo == "isoforest":
+                    inputs["sklearn"] = version("scikit-learn")
+                det = add("detect", f"{run}:{algo}", [gen], inputs, [pred],
+                          {"scenario": str(path), "seed": seed, "data": str(data), "out": str(pred),
+                           "algo": algo, "metric": m, "params": p})
+                add("eval", f"{run}:{algo}", [gen, det], {"scenario": sc, "code": code["eval"]}, [report],
+                    {"scenario": str(path), "seed": seed, "data": str(data), "pred": str(pred),
+                     "out": str(report), "algo": algo})
+    return tasks
+
+
+def run_task(kind: str, spec: dict) -> None:
+    """Run one task; inputs and outputs are files, so any worker process can take it."""
+    scenario = Path(spec["scenario"])
+    if kind == "gen":
+        generate(scenario, Path(spec["out"]), seed=spec["seed"])
+        return
+    sc = with_seed(load_yaml(scenario), spec["seed"])
+    out = Path(spec["out"])
+    out.parent.mkdir(parents=True, exist_ok=True)
+    if kind == "detect":
+        baseline_file(Path(spec["data"]), out, spec["algo"], sc, spec["metric"], spec["params"])
+    elif kind == "eval":
+        df = read_trace(Path(spec["data"]))
+        pred = read_trace(Path(spec["pred"]), ["pred"])["pred"].to_numpy()
+        if len(pred) != len(df):
+            raise ValueError(f"{spec['pred']}: {len(pred)} rows, trace {spec['data']} has {len(df)}")
+        pd.DataFrame([evaluate(sc, df, pred, {"detector": spec["algo"]})]).to_csv(out, index=False)
+    else:
+        plot(sc, read_trace(Path(spec["data"])), out)
+
+
+def load_state(path: Path) -> dict[str, str]:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8")).get("done", {})
+
+
+def save_state(path: Path, done: dict[str, str]) -> None:
+    # replaced atomically, so an interruption leaves the previous state intact
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps({"done": done}, indent=1, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def up_to_date(task: dict, done: dict[str, str]) -> bool:
+    return done.get(task["id"]) == task["key"] and all(Path(p).exists() for p in task["outputs"])
+
+
+def execute(tasks: list[dict], state: Path, workers: int = 1, force: bool = False) -> dict[str, list[str]]:
+    """Run the stale tasks of the graph, each once its dependencies are done.
+
+    Returns task ids by outcome: ``run``, ``skipped`` (up to date), ``failed`` and
+    ``blocked`` (a dependency failed).
+    """
+    done = {} if force else load_state(state)
+    outcome: dict[str, list[str]] = {"run": [], "skipped": [], "failed": [], "blocked": []}
+    todo = {}
+    for t in tasks:
+        if not force and up_to_date(t, done):
+            outcome["skipped"].append(t["id"])
+        else:
+            done.pop(t["id"], None)
+            todo[t["id"]] = t
+    finished = set(outcome["skipped"])
+
+    def ready() -> list[dict]:
+        return [t for t in todo.values() if all(d in finished for d in t["deps"])]
+
+    def settle(t: dict, error: BaseException | None) -> None:
+        del todo[t["id"]]
+        if error is None:
+            finished.add(t["id"])
+            done[t["id"]] = t["key"]
+            save_state(state, done)
+            outcome["run"].append(t["id"])
+            print(f"done     {t['id']}", flush=True)
+            return
+        outcome["failed"].append(t["id"])
+        print(f"FAILED   {t['id']}: {error}", file=sys.stderr, flush=True)
+        # everything downstream of a failure is blocked
+        blocked = {t["id"]}
+        for other in list(todo.values()):
+            if any(d in blocked for d in other["deps"]):
+                blocked.add(other["id"])
+                outcome["blocked"].append(other["id"])
+                del todo[other["id"]]
+
+    if workers <= 1:
+        while todo:
+            t = ready()[0]
+            try:
+                run_task(t["kind"], t["spec"])
+            except Exception as e:  # one bad task must not stop the rest of the matrix
+                settle(t, e)
+            else:
+                settle(t, None)
+        return outcome
+
+    pool = ProcessPoolExecutor(max_workers=workers)
+    running: dict = {}
+    try:
+        while todo or running:
+            for t in ready():
+                if t["id"] not in running.values():
+                    running[pool.submit(run_task, t["kind"], t["spec"])] = t["id"]
+            complete, _ = wait(running, return_when=FIRST_COMPLETED)
+            for f in complete:
+                settle(todo[running.pop(f)], f.exception())
+    except KeyboardInterrupt:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise SystemExit(f"Interrupted; {len(done)} finished tasks are recorded in {state}, rerun to resume")
+    pool.shutdown()
+    return outcome
+
+
+def collect(tasks: list[dict], out: Path) -> pd.DataFrame:
+    """Every evaluation row of the matrix in one table, in task order."""
+    frames = [pd.read_csv(t["outputs"][0]) for t in tasks if t["kind"] == "eval" and Path(t["outputs"][0]).exists()]
+    table = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    table.to_csv(out, index=False)
+    return table
+
+
+def parse_overrides(items: list[str]) -> dict[str, str]:
+    out = {}
+    for item in items:
+        sid, sep, metric = item.partition("=")
+        if not sep:
+            raise SystemExit(f"--scenario-metric expects SCENARIO_ID=METRIC, got {item!r}")
+        out[sid] = metric
+    return out
+
+
+def main(argv: list[str] | None = None):
+    ap = argparse.ArgumentParser(description="Run the scenario x detector x seed matrix as an incremental task graph")
+    ap.add_argument("--scenarios", "-s", type=Path, nargs="+",
+                    help="Scenario files (default: benchmarks/scenarios/*.yaml without _template)")
+    ap.add_argument("--detectors", "-d", nargs="+", choices=ALGOS, default=ALGOS)
+    ap.add_argument("--seeds", type=int, nargs="+", help="Generate every scenario at these seeds (default: its own)")
+    ap.add_argument("--params", type=Path,
+                    help="YAML of per-baseline parameters overriding the defaults, e.g. zscore: {window: 30}")
+    ap.add_argument("--metric", "-m", default="latency_ms",
+                    help="Metric the detectors watch, unless the fault names a target_metric")
+    ap.add_argument("--scenario-metric", nargs="+", default=[], metavar="SCENARIO_ID=METRIC",
+                    help="Per-scenario metric, e.g. corruption_silent=error_rate_pct")
+    ap.add_argument("--out", "-o", type=Path, default=Path("eval/suite"),
+                    help="Directory for data/, pred/, reports/, plots/ and suite_report.csv")
+    ap.add_argument("--state", type=Path, help="State file of finished tasks (default: OUT/suite_state.json)")
+    ap.add_argument("--workers", "-j", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    ap.add_argument("--force", action="store_true", help="Rerun every task")
+    ap.add_argument("--no-plot", action="store_true", help="Skip the plot tasks")
+    ap.add_argument("--dry-run", "-n", action="store_true", help="List the tasks that would run and exit")
+    args = ap.parse_args(argv)
+
+    scenarios = args.scenarios or sorted(p for p in Path("benchmarks/scenarios").glob("*.yaml")
+                                         if not p.name.startswith("_"))
+    state = args.state or args.out / "suite_state.json"
+    tasks = expand(scenarios, args.detectors, args.seeds, args.out, load_params(args.params, DEFAULT_PARAMS),
+                   args.metric, parse_overrides(args.scenario_metric), not args.no_plot)
+
+    if args.dry_run:
+        done = {} if args.force else load_state(state)
+        stale = [t for t in tasks if args.force or not up_to_date(t, done)]
+        for t in stale:
+            print(f"run      {t['id']}")
+        print(f"{len(stale)} of {len(tasks)} tasks would run")
+        return
+
+    outcome = execute(tasks, state, args.workers, args.force)
+    table = collect(tasks, args.out / "suite_report.csv")
+    print(f"{len(tasks)} tasks: {len(outcome['run'])} run, {len(outcome['skipped'])} up to date, "
+          f"{len(outcome['failed'])} failed, {len(outcome['blocked'])} blocked")
+    print(f"Wrote {args.out / 'suite_report.csv'} ({len(table)} rows)")
+    if outcome["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
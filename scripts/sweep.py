@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""Grid search over baseline detector parameters, scored against ground truth.
+
+Each trace is loaded once. Cumulative counts, sums and sums of squares of the
+metric are computed once and every z-score window's rolling mean and std are
+differences of them. For a fixed window (or EWMA span) the detector is a threshold
+on one score, so sorting the score once gives TP/FP/FN for every ``k`` (or
+threshold) with ``searchsorted``. CUSUM alarms depend on the threshold through the
+resets, so all ``(drift, threshold)`` pairs run in one :class:`CusumBank` pass and
+are scored with a matrix product. Scores are sample-level precision/recall/F1
+against ground truth dilated by the detection tolerance, as in ``evaluate.py``.
+"""
+from __future__ import annotations
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import yaml
+from detectors import CusumBank
+from intervals import dilate_runs, ground_truth_intervals, index_runs
+from traceio import read_trace
+
+DEFAULT_GRID = {
+    "zscore": {"window": [15, 30, 60, 120, 300], "k": [1.5, 2.0, 2.5, 3.0, 3.5, 4.0, 5.0]},
+    "ewma": {"span": [10, 20, 30, 60, 120], "threshold": [1.5, 2.0, 2.5, 3.0, 3.5, 4.0, 5.0]},
+    "cusum": {"drift": [0.25, 0.5, 1.0, 1.5], "threshold": [2.0, 3.0, 4.0, 5.0, 8.0, 12.0]},
+}
+PARAM_COLUMNS = ["window", "k", "span", "drift", "threshold"]
+
+
+def load_yaml(p: Path) -> dict:
+    return yaml.safe_load(p.read_text(encoding="utf-8"))
+
+
+class Prefix:
+    """Cumulative count, sum and sum of squares of a series, NaNs skipped.
+
+    Values are shifted by the first finite sample before accumulating, so window
+    differences do not cancel a large common level.
+    """
+
+    def __init__(self, v: np.ndarray):
+        ok = ~np.isnan(v)
+        self.ref = float(v[ok][0]) if ok.any() else 0.0
+        d = np.where(ok, v - self.ref, 0.0)
+        self.n = len(v)
+        self.count = np.concatenate([[0], np.cumsum(ok)])
+        self.s1 = np.concatenate([[0.0], np.cumsum(d)])
+        self.s2 = np.concatenate([[0.0], np.cumsum(d * d)])
+
+    def window(self, w: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Count, mean and variance (ddof=0) of the last ``w`` samples at every position."""
+        hi = np.arange(1, self.n + 1)
+        lo = np.maximum(hi - int(w), 0)
+        c = self.count[hi] - self.count[lo]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            m = (self.s1[hi] - self.s1[lo]) / c
+            var = np.maximum((self.s2[hi] - self.s2[lo]) / c - m * m, 0.0)
+        return c, m + self.ref, var
+
+
+def threshold_counts(score: np.ndarray, gt: np.ndarray, thresholds) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """``(tp, fp, fn)`` of ``score > t`` for every threshold ``t``; NaN scores never alarm."""
+    ok = ~np.isnan(score)
+    alarms = np.sort(score[ok])
+    hits = np.sort(score[ok & gt])
+    t = np.asarray(thresholds, dtype=float)
+    predicted = len(alarms) - np.searchsorted(alarms, t, side="right")
+    tp = len(hits) - np.searchsorted(hits, t, side="right")
+    return tp, predicted - tp, int(gt.sum()) - tp
+
+
+def scores(tp, fp, fn) -> dict[str, np.ndarray]:
+    tp, fp, fn = (np.asarray(a, dtype=float) for a in (tp, fp, fn))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        recall = np.where(tp + fn > 0, tp / (tp + fn), 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    return {"precision": precision.round(4), "recall": recall.round(4), "f1": f1.round(4)}
+
+
+def rolling_score(x: np.ndarray, prefix: Prefix, window: int, center: bool = True) -> np.ndarray:
+    """``|x - rolling mean| / rolling std`` (``|x| / rolling std`` without ``center``) as the
+    streaming detectors threshold it; NaN where they cannot alarm."""
+    count, mean, var = prefix.window(window)
+    std = np.sqrt(var)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = np.abs(x - mean if center else x) / np.where(std > 0, std, np.nan)
+    z[count < max(2, window // 4)] = np.nan
+    return z
+
+
+def sweep_zscore(run: dict, window: int, ks) -> list[dict]:
+    z = rolling_score(run["v"], run["prefix"], window)[run["post"]]
+    tp, fp, fn = threshold_counts(z, run["gt"], ks)
+    return [{"window": window, "k": k, **s} for k, s in zip(ks, _rows(scores(tp, fp, fn)))]
+
+
+def sweep_ewma(run: dict, span: int, thresholds) -> list[dict]:
+    v = run["v"]
+    smooth = pd.Series(v).ewm(alpha=2.0 / (span + 1), adjust=False).mean().to_numpy()
+    residual = v - smooth
+    z = rolling_score(residual, Prefix(residual), span, center=False)[run["post"]]
+    tp, fp, fn = threshold_counts(z, run["gt"], thresholds)
+    return [{"span": span, "threshold": h, **s} for h, s in zip(thresholds, _rows(scores(tp, fp, fn)))]
+
+
+def sweep_cusum(run: dict, drift: float, thresholds) -> list[dict]:
+    v = run["v"]
+    bank = CusumBank(float(np.mean(v)), float(np.std(v, ddof=0)), [(drift, h) for h in thresholds])
+    pred = bank.update(v)[:, run["post"]]
+    gt = run["gt"].astype(np.int64)
+    tp = pred @ gt
+    predicted = pred.sum(axis=1, dtype=np.int64)
+    return [{"drift": drift, "threshold": h, **s}
+            for h, s in zip(thresholds, _rows(scores(tp, predicted - tp, gt.sum() - tp)))]
+
+
+def _rows(cols: dict[str, np.ndarray]) -> list[dict]:
+    return [dict(zip(cols, vals)) for vals in zip(*(c.tolist() for c in cols.values()))]
+
+
+SWEEPS = {"zscore": sweep_zscore, "ewma": sweep_ewma, "cusum": sweep_cusum}
+
+
+def prepare_run(scenario: Path, data: Path, metric: str) -> dict:
+    """Metric, post-warmup mask and dilated ground truth of one trace."""
+    sc = load_yaml(scenario)
+    df = read_trace(data, ["t_s", metric])
+    warmup = int(sc["dataset"].get("warmup_s", 0))
+    tol = int(sc.get("evaluation", {}).get("detection", {}).get("window_tolerance_s", 0))
+    post = df["t_s"].to_numpy() >= warmup
+    t = df["t_s"].to_numpy()[post]
+    gt = np.zeros(len(t), dtype=bool)
+    for s, e in dilate_runs(index_runs(t, ground_truth_intervals(sc)), tol, len(t)):
+        gt[s:e] = True
+    v = df[metric].to_numpy(dtype=float)
+    return {"scenario_id": sc["id"], "metric": metric, "v": v, "post": post, "gt": gt, "prefix": Prefix(v)}
+
+
+_worker_runs: list = []
+
+
+def _init_worker(runs: list) -> None:
+    # traces are sent once per process rather than once per grid task
+    _worker_runs[:] = runs
+
+
+def _worker_task(i: int, detector: str, first, rest) -> list[dict]:
+    return run_task(_worker_runs[i], detector, first, rest)
+
+
+def run_task(run: dict, detector: str, first, rest) -> list[dict]:
+    rows = SWEEPS[detector](run, first, rest)
+    return [{"scenario_id": run["scenario_id"], "metric": run["metric"], "detector": detector, **r} for r in rows]
+
+
+def tasks(grid: dict, detectors: list[str], n_runs: int) -> list[tuple]:
+    """One task per (trace, detector, first grid parameter); the second is scored inside the task."""
+    out = []
+    for i in range(n_runs):
+        for d in detectors:
+            first, second = (grid[d][p] for p in DEFAULT_GRID[d])
+            out += [(i, d, v, list(second)) for v in first]
+    return out
+
+
+def sweep(runs: list[dict], grid: dict, detectors: list[str], workers: int = 1) -> pd.DataFrame:
+    jobs = tasks(grid, detectors, len(runs))
+    if workers <= 1:
+        parts = [run_task(runs[i], d, a, b) for i, d, a, b in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(runs,)) as pool:
+            parts = list(pool.map(_worker_task, *zip(*jobs)))
+    surface = pd.DataFrame([r for part in parts for r in part])
+    cols = ["scenario_id", "metric", "detector"] + [c for c in PARAM_COLUMNS if c in surface]
+    return surface[cols + ["precision", "recall", "f1"]]
+
+
+def best_configs(surface: pd.DataFrame) -> pd.DataFrame:
+    """Highest-F1 grid point per scenario, metric and detector (the first in grid order on ties)."""
+    best = surface.loc[surface.groupby(["scenario_id", "metric", "detector"], sort=False)["f1"].idxmax()].copy()
+    best["args"] = [f"--metric {row['metric']} " + " ".join(f"--{p} {row[p]:g}" for p in DEFAULT_GRID[row["detector"]])
+                    for _, row in best.iterrows()]
+    return best.reset_index(drop=True)
+
+
+def load_grid(path: Path | None) -> dict:
+    grid = {d: dict(g) for d, g in DEFAULT_GRID.items()}
+    if path:
+        for d, g in load_yaml(path).items():
+            if d not in grid:
+                raise SystemExit(f"{path}: unknown detector {d!r} (expected one of {', '.join(grid)})")
+            unknown = set(g) - set(grid[d])
+            if unknown:
+                raise SystemExit(f"{path}: {d} has no parameter {sorted(unknown)}")
+            grid[d].update(g)
+    return grid
+
+
+def main(argv: list[str] | None = None):
+    ap = argparse.ArgumentParser(description="Sweep baseline detector parameters against ground truth")
+    ap.add_argument("--scenario", "-s", type=Path)
+    ap.add_argument("--data", "-d", type=Path)
+    ap.add_argument("--manifest", "-m", type=Path,
+                    help="YAML with a runs list of {scenario, data[, metric]}, as for evaluate.py --manifest")
+    ap.add_argument("--metric", default="latency_ms", help="Metric the detectors run on (per-run 'metric' overrides)")
+    ap.add_argument("--detectors", nargs="+", choices=list(DEFAULT_GRID), default=list(DEFAULT_GRID))
+    ap.add_argument("--grid", type=Path,
+                    help="YAML of per-detector parameter lists overriding the defaults, e.g. zscore: {window: [30, 60]}")
+    ap.add_argument("--workers", "-j", type=int, default=1, help="Score grid tasks on this many processes")
+    ap.add_argument("--out", "-o", type=Path, default=Path("eval/reports/sweep"),
+                    help="Directory for sweep_surface.csv and sweep_best.csv")
+    args = ap.parse_args(argv)
+
+    if args.manifest:
+        base = args.manifest.parent
+        pairs = [((base / r["scenario"]).resolve(), (base / r["data"]).resolve(), r.get("metric", args.metric))
+                 for r in load_yaml(args.manifest)["runs"]]
+    elif args.scenario and args.data:
+        pairs = [(args.scenario, args.data, args.metric)]
+    else:
+        ap.error("--scenario and --data are required unless --manifest is given")
+
+    runs = [prepare_run(*p) for p in dict.fromkeys(pairs)]
+    surface = sweep(runs, load_grid(args.grid), args.detectors, args.workers)
+    best = best_configs(surface)
+
+    args.out.mkdir(parents=True, exist_ok=True)
+    surface.to_csv(args.out / "sweep_surface.csv", index=False)
+    best.to_csv(args.out / "sweep_best.csv", index=False)
+    for _, row in best.iterrows():
+        print(f"{row['scenario_id']:28s} {row['detector']:7s} f1={row['f1']:.4f}  {row['args']}")
+    print(f"Wrote {args.out / 'sweep_surface.csv'} ({len(surface)} grid points) and {args.out / 'sweep_best.csv'}")
+
+
+if __name__ == "__main__":
+    main()
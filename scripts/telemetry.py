@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Wall time, CPU time, peak memory and throughput of pipeline stages.
+
+A stage runs inside :func:`profiled` and sets ``rows`` to the samples it
+processed. When a manifest path is given, the stage's record is appended to that
+JSON run manifest, so the stages of one run, each a separate script or one
+in-process pipeline, collect into one file next to the report CSV. ``report.py``
+renders every ``*_run.json`` manifest as a performance table.
+
+CPU time includes worker processes the stage waited for. Peak RSS is the stage's own
+high-water mark: on Linux the kernel's mark (VmHWM) is reset when the stage starts, and a
+worker process counts if it set a new high during the stage. Where the mark cannot be
+reset, only the first stage of a process reports a peak (the process peak so far);
+later stages leave it empty rather than repeat an earlier stage's peak.
+"""
+from __future__ import annotations
+import json
+import os
+import platform
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MANIFEST_SUFFIX = "_run.json"
+# ru_maxrss is in KiB on Linux and in bytes on macOS
+MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+_stages_started = 0
+
+
+def _children() -> tuple[float, float]:
+    """CPU seconds and peak RSS in MiB of the finished worker processes so far."""
+    if resource is None:
+        return 0.0, 0.0
+    kids = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return kids.ru_utime + kids.ru_stime, kids.ru_maxrss * MAXRSS_UNIT / 2**20
+
+
+def _reset_peak() -> bool:
+    """Reset this process's peak-RSS mark to its current RSS; False where the kernel does not allow it."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_since_reset() -> float | None:
+    """VmHWM of this process in MiB."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class Stage:
+    """Measurements of one stage; ``rows`` and any ``info`` fields are set by the stage itself."""
+
+    def __init__(self, name: str):
+        global _stages_started
+        self.name = name
+        self.rows = 0
+        self.info: dict = {}
+        self.started = datetime.now(timezone.utc)
+        self._first = _stages_started == 0
+        _stages_started += 1
+        self._reset = _reset_peak()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._child_cpu, self._child_peak = _children()
+        self.record: dict = {}
+
+    def peak_rss(self) -> float | None:
+        """Peak RSS in MiB of this stage and the workers it ran, or None if it cannot be told apart."""
+        own = None
+        if self._reset:
+            own = _peak_since_reset()
+        elif self._first and resource is not None:
+            own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * MAXRSS_UNIT / 2**20
+        if own is None:
+            return None
+        child_peak = _children()[1]
+        return max(own, child_peak if child_peak > self._child_peak else 0.0)
+
+    def finish(self) -> dict:
+        wall = time.perf_counter() - self._wall
+        child_cpu = _children()[0]
+        peak = self.peak_rss()
+        self.record = {
+            "stage": self.name,
+            "started": self.started.isoformat(timespec="seconds"),
+            "rows": int(self.rows),
+            "wall_s": round(wall, 4),
+            "cpu_s": round(time.process_time() - self._cpu + child_cpu - self._child_cpu, 4),
+            "peak_rss_mb": None if peak is None else round(peak, 1),
+            "rows_per_s": round(self.rows / wall, 1) if wall > 0 else None,
+            **self.info,
+        }
+        return self.record
+
+
+def host() -> dict:
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()}
+
+
+def append_stage(manifest: Path, record: dict) -> None:
+    """Add ``record`` to the run manifest at ``manifest``, creating it if needed."""
+    doc = {"host": host(), "stages": []}
+    if manifest.exists():
+        doc = json.loads(manifest.read_text(encoding="utf-8"))
+    doc["stages"].append(record)
+    manifest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = manifest.with_name(f".{manifest.name}.tmp")
+    tmp.write_text(json.dumps(doc, indent=2), encoding="utf-8")
+    os.replace(tmp, manifest)
+
+
+@contextmanager
+def profiled(manifest: Path | None, name: str) -> Iterator[Stage]:
+    """Measure the enclosed stage; on success append it to ``manifest`` unless that is None."""
+    stage = Stage(name)
+    yield stage
+    record = stage.finish()
+    if manifest is not None:
+        append_stage(manifest, record)
+
+
+def manifest_for(report: Path) -> Path:
+    """The run manifest next to a ``<name>_report.csv``: ``<name>_run.json``."""
+    return report.with_name(report.stem.removesuffix("_report") + MANIFEST_SUFFIX)
+
+
+def load_manifests(reports: Path) -> list[dict]:
+    """Every stage of every ``*_run.json`` in ``reports``, tagged with the run name."""
+    rows = []
+    for p in sorted(reports.glob(f"*{MANIFEST_SUFFIX}")):
+        doc = json.loads(p.read_text(encoding="utf-8"))
+        run = p.name.removesuffix(MANIFEST_SUFFIX)
+        rows += [{"run": run, **s} for s in doc.get("stages", [])]
+    return rows
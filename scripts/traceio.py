@@ -0,0 +1,282 @@
+"""Trace and prediction file I/O shared by every pipeline stage.
+
+The format is picked from the file extension on write and detected from the file's
+magic bytes on read:
+
+- ``.csv`` (default): text, ``ts`` as ISO-8601.
+- ``.npz``: uncompressed NumPy archive, one ``.npy`` member per column, ``ts`` stored
+  as int64 nanoseconds since the Unix epoch (UTC) and categorical columns (e.g. the
+  per-node ``node`` id) as integer codes with their labels in the archive metadata.
+- ``.parquet`` / ``.pq``: Apache Parquet, requires ``pyarrow``.
+"""
+from __future__ import annotations
+import json
+import shutil
+import tempfile
+import zipfile
+from contextlib import ExitStack
+from pathlib import Path
+from typing import IO, Iterable, Iterator
+import numpy as np
+import pandas as pd
+
+NPZ_META = "__meta__"
+NPZ_FORMAT = "resbench-trace/1"
+PARQUET_SUFFIXES = {".parquet", ".pq"}
+
+
+def format_for(path: Path) -> str:
+    """Return ``csv``, ``npz`` or ``parquet`` from the file extension."""
+    suffix = Path(path).suffix.lower()
+    if suffix == ".npz":
+        return "npz"
+    if suffix in PARQUET_SUFFIXES:
+        return "parquet"
+    return "csv"
+
+
+def detect_format(path: Path) -> str:
+    """Return the format of an existing file from its magic bytes."""
+    with open(path, "rb") as fh:
+        magic = fh.read(4)
+    if magic == b"PAR1":
+        return "parquet"
+    if magic == b"PK\x03\x04":
+        return "npz"
+    return "csv"
+
+
+def date_format_for(hz: int) -> str | None:
+    # Sub-second grids get a fixed-width fraction so every chunk renders the same way. ``ts`` is always
+    # UTC; the offset is spelled "+00:00" as to_csv writes it, since strftime's %z would give "+0000".
+    return None if hz == 1 else "%Y-%m-%d %H:%M:%S.%f+00:00"
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as e:
+        raise SystemExit("Parquet traces require pyarrow: pip install pyarrow") from e
+
+
+def _ts_to_ns(ts: pd.Series) -> np.ndarray:
+    idx = pd.DatetimeIndex(ts)
+    if idx.tz is None:
+        idx = idx.tz_localize("UTC")
+    return idx.tz_convert("UTC").as_unit("ns").asi8
+
+
+def read_trace(path: Path, columns: list[str] | None = None) -> pd.DataFrame:
+    """Load a trace or prediction file in any supported format with ``ts`` parsed."""
+    path = Path(path)
+    fmt = detect_format(path)
+    if fmt == "csv":
+        head = pd.read_csv(path, nrows=0).columns
+        parse = ["ts"] if "ts" in head and (columns is None or "ts" in columns) else None
+        return pd.read_csv(path, usecols=columns, parse_dates=parse)
+    if fmt == "parquet":
+        _require_pyarrow()
+        return pd.read_parquet(path, columns=columns)
+
+    with np.load(path, allow_pickle=False) as z:
+        meta = json.loads(str(z[NPZ_META])) if NPZ_META in z.files else {}
+        categories = meta.get("categories", {})
+        names = meta.get("columns") or [k for k in z.files if k != NPZ_META]
+        if columns is not None:
+            missing = [c for c in columns if c not in names]
+            if missing:
+                raise KeyError(f"{path}: missing columns {missing}")
+            names = [c for c in names if c in columns]
+        data = {}
+        for name in names:
+            arr = z[name]
+            if name == "ts":
+                data[name] = pd.to_datetime(arr, unit="ns", utc=True)
+            elif name in categories:
+                data[name] = pd.Categorical.from_codes(arr, categories=categories[name])
+            else:
+                data[name] = arr
+    return pd.DataFrame(data)
+
+
+def iter_trace(path: Path, columns: list[str] | None = None,
+               chunk_rows: int = 1 << 20) -> Iterator[pd.DataFrame]:
+    """Yield a trace as DataFrames of at most ``chunk_rows`` rows, holding one chunk at a time.
+
+    CSV is read with a chunked parser, Parquet batch by batch and NPZ members are
+    streamed straight out of the (uncompressed) archive.
+    """
+    path = Path(path)
+    fmt = detect_format(path)
+    if fmt == "csv":
+        head = pd.read_csv(path, nrows=0).columns
+        parse = ["ts"] if "ts" in head and (columns is None or "ts" in columns) else None
+        yield from pd.read_csv(path, usecols=columns, parse_dates=parse, chunksize=chunk_rows)
+        return
+    if fmt == "parquet":
+        _require_pyarrow()
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+        return
+
+    with zipfile.ZipFile(path) as zf:
+        meta = {}
+        if f"{NPZ_META}.npy" in zf.namelist():
+            with zf.open(f"{NPZ_META}.npy") as fh:
+                meta = json.loads(str(np.lib.format.read_array(fh)))
+        categories = meta.get("categories", {})
+        names = meta.get("columns") or [n[:-4] for n in zf.namelist() if n != f"{NPZ_META}.npy"]
+        if columns is not None:
+            missing = [c for c in columns if c not in names]
+            if missing:
+                raise KeyError(f"{path}: missing columns {missing}")
+            names = [c for c in names if c in columns]
+        members, rows = {}, None
+        try:
+            for name in names:
+                fh = zf.open(f"{name}.npy")
+                if np.lib.format.read_magic(fh) == (1, 0):
+                    shape, _, dtype = np.lib.format.read_array_header_1_0(fh)
+                else:
+                    shape, _, dtype = np.lib.format.read_array_header_2_0(fh)
+                members[name] = (fh, dtype)
+                rows = shape[0]
+            for i0 in range(0, rows or 0, chunk_rows):
+                n = min(chunk_rows, rows - i0)
+                data = {}
+                for name, (fh, dtype) in members.items():
+                    arr = np.frombuffer(fh.read(n * dtype.itemsize), dtype=dtype)
+                    if name == "ts":
+                        data[name] = pd.to_datetime(arr, unit="ns", utc=True)
+                    elif name in categories:
+                        data[name] = pd.Categorical.from_codes(arr, categories=categories[name])
+                    else:
+                        data[name] = arr
+                yield pd.DataFrame(data, index=pd.RangeIndex(i0, i0 + n))
+        finally:
+            for fh, _ in members.values():
+                fh.close()
+
+
+class TraceWriter:
+    """Append DataFrame chunks to a trace file without holding the whole trace in memory.
+
+    CSV chunks are appended as text. NPZ columns are spooled to temporary files and
+    assembled into the archive on :meth:`close`. Parquet chunks become row groups.
+    An existing file at ``path`` is unlinked first, never rewritten in place: it may be
+    a hardlink into the dataset cache. Leaving the ``with`` block on an exception, or a
+    failing :meth:`close`, closes every handle and removes the partial file.
+    """
+
+    def __init__(self, path: Path, date_format: str | None = None):
+        self.path = Path(path)
+        self.fmt = format_for(self.path)
+        self.date_format = date_format
+        self.rows = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.unlink(missing_ok=True)
+        self._fh: IO | None = None
+        self._spool: dict[str, tuple[np.dtype, IO]] = {}
+        self._categories: dict[str, list] = {}
+        self._pq = None
+        self._stack = ExitStack()  # every open handle: the output and the NPZ spool files
+        self._closed = False
+        if self.fmt == "csv":
+            self._fh = self._stack.enter_context(open(self.path, "w", newline="", encoding="utf-8"))
+        elif self.fmt == "parquet":
+            _require_pyarrow()
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.fmt == "csv":
+            df.to_csv(self._fh, index=False, header=self.rows == 0, date_format=self.date_format)
+        elif self.fmt == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._pq is None:
+                self._pq = self._stack.enter_context(pq.ParquetWriter(self.path, table.schema))
+            self._pq.write_table(table)
+        else:
+            self._spool_npz(df)
+        self.rows += len(df)
+
+    def _spool_npz(self, df: pd.DataFrame) -> None:
+        for name in df.columns:
+            col = df[name]
+            if name == "ts":
+                arr = _ts_to_ns(col)
+            elif isinstance(col.dtype, pd.CategoricalDtype):
+                cats = col.cat.categories.tolist()
+                if self._categories.setdefault(name, cats) != cats:
+                    raise ValueError(f"column {name!r} changed categories between chunks")
+                arr = col.cat.codes.to_numpy()
+            else:
+                arr = np.ascontiguousarray(col.to_numpy())
+            if arr.dtype == object:
+                raise TypeError(f"column {name!r} has object dtype; store labels as a categorical column")
+            if name not in self._spool:
+                if self.rows:
+                    raise ValueError(f"column {name!r} appeared after the first chunk")
+                self._spool[name] = (arr.dtype, self._stack.enter_context(tempfile.TemporaryFile(dir=self.path.parent)))
+            dtype, fh = self._spool[name]
+            fh.write(arr.astype(dtype, copy=False).tobytes())
+
+    def close(self) -> None:
+        """Finish the file; if that fails, :meth:`abort` and re-raise."""
+        if self._closed:
+            return
+        try:
+            if self.fmt == "npz":
+                self._finish_npz()
+            self._stack.close()
+        except BaseException:
+            self.abort()
+            raise
+        self._closed = True
+
+    def abort(self) -> None:
+        """Close every handle, spool files included, and remove the partial file at ``path``."""
+        self._closed = True
+        try:
+            self._stack.close()
+        finally:
+            self.path.unlink(missing_ok=True)
+
+    def _finish_npz(self) -> None:
+        meta = {"format": NPZ_FORMAT, "columns": list(self._spool), "ts_unit": "ns", "tz": "UTC",
+                "categories": self._categories}
+        with zipfile.ZipFile(self.path, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+            for name, (dtype, fh) in self._spool.items():
+                with zf.open(f"{name}.npy", "w", force_zip64=True) as member:
+                    header = {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False,
+                              "shape": (self.rows,)}
+                    np.lib.format.write_array_header_2_0(member, header)
+                    fh.seek(0)
+                    shutil.copyfileobj(fh, member, 1 << 22)
+                fh.close()
+            with zf.open(f"{NPZ_META}.npy", "w") as member:
+                np.lib.format.write_array(member, np.array(json.dumps(meta)))
+        self._spool = {}
+
+    def __enter__(self) -> "TraceWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_trace(df: pd.DataFrame, path: Path, date_format: str | None = None) -> None:
+    with TraceWriter(path, date_format=date_format) as w:
+        w.write(df)
+
+
+def write_trace_chunks(chunks: Iterable[pd.DataFrame], path: Path, date_format: str | None = None) -> int:
+    with TraceWriter(path, date_format=date_format) as w:
+        for df in chunks:
+            w.write(df)
+    return w.rows
@@ -16,6 +16,21 @@ class Dataset(BaseModel):
     source: Literal["synthetic", "trace", "live"]
     duration_s: int = Field(gt=0)
     warmup_s: int = Field(ge=0)
+    path: Optional[str] = None
+    format: Optional[Literal["csv", "openmetrics"]] = None
+    time_column: Optional[str] = None
+    columns: Optional[Dict[str, str]] = None
+
+    @model_validator(mode="after")
+    def require_trace_path(self):
+        if self.source == "trace" and not self.path:
+            raise ValueError("dataset.path is required when dataset.source is 'trace'")
+        return self
+
+
+class Repeat(BaseModel):
+    every_s: int = Field(gt=0)
+    count: int = Field(ge=1)
 
 
 class Failure(BaseModel):
@@ -23,11 +38,21 @@ class Failure(BaseModel):
     start_s: int = Field(ge=0)
     duration_s: int = Field(gt=0)
     parameters: Dict[str, Any]
+    repeat: Optional[Repeat] = None
 
 
 class GroundTruth(BaseModel):
     label_name: str = "fault"
-    positive_interval_s: List[int] = Field(min_length=2, max_length=2)
+    positive_interval_s: Optional[List[int]] = Field(default=None, min_length=2, max_length=2)
+    positive_intervals_s: Optional[List[List[int]]] = None
+
+    @field_validator("positive_intervals_s")
+    @classmethod
+    def check_pairs(cls, v):
+        for iv in v or []:
+            if len(iv) != 2 or iv[0] > iv[1]:
+                raise ValueError(f"interval {iv} must be [start_s, end_s] with start_s <= end_s")
+        return v
 
 
 class Availability(BaseModel):
@@ -58,7 +83,8 @@ class Scenario(BaseModel):
     tags: List[str] = Field(min_length=1)
     system_profile: str
     dataset: Dataset
-    failure: Failure
+    failure: Optional[Failure] = None
+    failures: Optional[List[Failure]] = None
     ground_truth: GroundTruth
     evaluation: Evaluation
     reproducibility: Dict[str, Any]
@@ -71,20 +97,27 @@ class Scenario(BaseModel):
             raise ValueError("reproducibility.seed is required")
         return v
 
+    @model_validator(mode="after")
+    def require_failure(self):
+        if self.failure is None and not self.failures:
+            raise ValueError("either failure or failures is required")
+        return self
+
     @model_validator(mode="after")
     def check_slo_rules(self):
         slo = self.evaluation.slo or {}
-        f = self.failure.type
-        req = set()
-        if f in ("latency_spike", "slowdown"):
-            req.add("latency_ms_p99")
-        if f in ("node_crash", "network_partition", "corruption"):
-            req.add("error_rate_pct")
-        if f == "network_partition":
-            req.add("latency_ms_p99")
-        missing = [k for k in req if k not in slo]
-        if missing:
-            raise ValueError(f"evaluation.slo missing for {f}: {', '.join(missing)}")
+        faults = ([self.failure] if self.failure else []) + list(self.failures or [])
+        for f in sorted({x.type for x in faults}):
+            req = set()
+            if f in ("latency_spike", "slowdown"):
+                req.add("latency_ms_p99")
+            if f in ("node_crash", "network_partition", "corruption"):
+                req.add("error_rate_pct")
+            if f == "network_partition":
+                req.add("latency_ms_p99")
+            missing = [k for k in req if k not in slo]
+            if missing:
+                raise ValueError(f"evaluation.slo missing for {f}: {', '.join(missing)}")
         return self
 
     @model_validator(mode="after")